@@ -39,18 +39,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # dependencies
-    'debug_toolbar',
     'corsheaders',
     'rest_framework',
 
     # project
-    'app.main',
+    'app.main.apps.MainConfig',
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'app.main.middleware.MetricsMiddleware',
+    'app.main.middleware.TrafficCaptureMiddleware',
+    'app.main.middleware.ProfilingMiddleware',
 
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,6 +66,28 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# debug toolbar тормозит каждый запрос, поэтому подключается только для разработки
+if DEBUG:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('corsheaders'), 'debug_toolbar')
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+
+# Профилирование запросов (см. app.main.middleware.ProfilingMiddleware): доля запросов, которые пишутся в лог,
+# и профилирование по заголовку X-Profile (по умолчанию только при DEBUG)
+
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', default=0))
+PROFILING_HEADER_ENABLED = int(os.getenv('PROFILING_HEADER_ENABLED', default=DEBUG))
+PROFILING_DUMP_DIR = os.getenv('PROFILING_DUMP_DIR', default='/tmp/candy_delivery_profiles')
+
+
+# Запись запросов к API для воспроизведения нагрузки (см. app.main.middleware.TrafficCaptureMiddleware
+# и benchmarks.replay). Значения полей из TRAFFIC_CAPTURE_REDACT_FIELDS в записанных телах заменяются на "***"
+
+TRAFFIC_CAPTURE = int(os.getenv('TRAFFIC_CAPTURE', default=0))
+TRAFFIC_CAPTURE_FILE = os.getenv('TRAFFIC_CAPTURE_FILE', default=os.path.join(BASE_DIR, 'traffic.jsonl'))
+TRAFFIC_CAPTURE_MAX_BODY = int(os.getenv('TRAFFIC_CAPTURE_MAX_BODY', default=1024 * 1024))
+TRAFFIC_CAPTURE_REDACT_FIELDS = set(filter(None, os.getenv('TRAFFIC_CAPTURE_REDACT_FIELDS', default='').split(',')))
+
 ROOT_URLCONF = 'app.candy_delivery.urls'
 
 TEMPLATES = [
@@ -88,18 +112,95 @@ WSGI_APPLICATION = 'app.candy_delivery.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Пул соединений на процесс (см. app.main.db_backends.postgresql_pool). Размер пула воркера ограничен
+# DB_POOL_MAX_SIZE и долей DB_POOL_HOST_BUDGET (соединений на все DB_POOL_WORKERS процессов хоста, 0 - без ограничения).
+# DB_POOL_MODE=transaction - режим совместимости с pgbouncer (pool_mode = transaction): без серверного состояния
+# между транзакциями (server-side курсоров и кэша подготовленных выражений asyncpg)
+
+DB_POOL = int(os.getenv('DB_POOL', default=0))
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', default='session')
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', default=1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', default=4))
+DB_POOL_HOST_BUDGET = int(os.getenv('DB_POOL_HOST_BUDGET', default=0))
+DB_POOL_WORKERS = int(os.getenv('WEB_CONCURRENCY', default=1))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', default=10))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', default=5))
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', default=3600))
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', default=600))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'app.main.db_backends.postgresql_pool' if DB_POOL else 'django.db.backends.postgresql',
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_POOL_MODE == 'transaction',
     }
 }
 
 
+# Способ упаковки заказов при назначении курьеру: greedy или optimal (см. app.main.models.enums.PackingMode).
+# Может быть переопределен в запросе POST /orders/assign параметром packing
+
+ORDERS_PACKING_MODE = os.getenv('ORDERS_PACKING_MODE', default='greedy')
+
+
+# Реализация выбора заказов курьеру: python или numpy (см. app.main.models.enums.OrdersEngine)
+
+ORDERS_ENGINE = os.getenv('ORDERS_ENGINE', default='python')
+
+
+# Размер куска (количество объектов), которыми валидируется и записывается в базу потоковая загрузка
+# POST /couriers?stream=true и POST /orders?stream=true
+
+BULK_IMPORT_CHUNK_SIZE = int(os.getenv('BULK_IMPORT_CHUNK_SIZE', default=1000))
+
+
+# Количество процессов массового назначения заказов по компонентам районов (см. app.main.dispatch),
+# 0 - по числу ядер
+
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', default=0))
+
+
+# Асинхронные view для POST /orders/assign, POST /orders/complete и GET /couriers/<id> (см. app.main.async_views).
+# Включаются только при запуске через ASGI (uvicorn), запросы к базе выполняются через пул asyncpg на воркер
+
+ASYNC_VIEWS = int(os.getenv('ASYNC_VIEWS', default=0))
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv('ASYNC_DB_POOL_MIN_SIZE', default=2))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv('ASYNC_DB_POOL_MAX_SIZE', default=10))
+
+
+# Кеш ответа GET /couriers/<id> по версии курьера (см. app.main.courier_cache): LRU в памяти процесса
+# и общий кеш воркеров (COURIER_CACHE_BACKEND - бэкенд кеша django, например django_redis.cache.RedisCache
+# или django.core.cache.backends.filebased.FileBasedCache для одного хоста), время жизни версии в общем кеше
+
+COURIER_CACHE_SIZE = int(os.getenv('COURIER_CACHE_SIZE', default=10000))
+COURIER_CACHE_VERSION_TTL = float(os.getenv('COURIER_CACHE_VERSION_TTL', default=60))
+COURIER_CACHE_ALIAS = 'couriers'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+if os.getenv('COURIER_CACHE_BACKEND'):
+    CACHES[COURIER_CACHE_ALIAS] = {
+        'BACKEND': os.getenv('COURIER_CACHE_BACKEND'),
+        'LOCATION': os.getenv('COURIER_CACHE_LOCATION'),
+        # ответ для версии не устаревает, время жизни только освобождает память от старых версий
+        'TIMEOUT': 24 * 60 * 60,
+    }
+
+
+# Кеш свободных заказов по районам в памяти процесса для POST /orders/assign (см. app.main.order_pool),
+# поддерживается уведомлениями LISTEN/NOTIFY, поэтому не работает с DB_POOL_MODE=transaction.
+# Триггеры уведомлений ставятся отдельно: manage.py order_pool_triggers install
+
+ORDER_POOL_CACHE = int(os.getenv('ORDER_POOL_CACHE', default=0))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -193,6 +294,10 @@ logging.config.dictConfig({
             'formatter': 'django.server',
             'filters': ['require_debug_true'],
         },
+        'structured': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'only_msg',
+        },
     },
 
     'loggers': {
@@ -215,5 +320,10 @@ logging.config.dictConfig({
             'handlers': ['django.server'],
             'propagate': False
         },
+        'app.main.middleware': {
+            'level': 'INFO',
+            'handlers': ['structured'],
+            'propagate': False
+        },
     }
 })
@@ -4,6 +4,7 @@ from django.apps import apps
 
 from rest_framework.test import APIClient
 
+from app.main import courier_cache
 from app.main.utils import reverse
 
 
@@ -22,6 +23,24 @@ def django_db_setup(django_db_setup, django_db_createdb, django_db_blocker):
                 model._default_manager.all().delete()
 
 
+@pytest.fixture(autouse=True)
+def clear_courier_cache():
+    # в тестах курьеры с одними и теми же id создаются заново с версией 1
+    courier_cache.clear()
+    yield
+    courier_cache.clear()
+
+
+@pytest.fixture
+def shared_cache_settings(settings):
+    settings.CACHES = {
+        **settings.CACHES,
+        settings.COURIER_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'couriers'},
+    }
+    courier_cache.clear()
+    return settings
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
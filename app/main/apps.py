@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class MainConfig(AppConfig):
     name = 'app.main'
+
+    def ready(self):
+        from .profiling import install_query_recorder
+
+        # запросы к базе считаются в профиле запроса (см. ProfilingMiddleware)
+        connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
@@ -0,0 +1,55 @@
+"""
+Пул асинхронных соединений с postgres (asyncpg) для асинхронных view (см. app.main.async_views).
+Пул создается лениво, один на event loop процесса (при запуске через uvicorn - один на воркер)
+"""
+import asyncio
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover
+    asyncpg = None
+
+
+__all__ = ['asyncpg', 'get_pool', 'close_pool']
+
+
+_state = {'loop': None, 'lock': None, 'pool': None}
+
+
+async def get_pool() -> 'asyncpg.Pool':
+    """Возвращает пул соединений текущего event loop, при первом вызове создает его"""
+    if asyncpg is None:
+        raise ImproperlyConfigured('asyncpg is required for ASYNC_VIEWS')
+
+    loop = asyncio.get_running_loop()
+    if _state['loop'] is not loop:
+        _state.update(loop=loop, lock=asyncio.Lock(), pool=None)
+
+    async with _state['lock']:
+        if _state['pool'] is None:
+            # настройки берутся из соединения django, поэтому в тестах используется тестовая база
+            db_settings = connections['default'].settings_dict
+            _state['pool'] = await asyncpg.create_pool(
+                host=db_settings['HOST'] or None,
+                port=db_settings['PORT'] or None,
+                user=db_settings['USER'] or None,
+                password=db_settings['PASSWORD'] or None,
+                database=db_settings['NAME'],
+                min_size=settings.ASYNC_DB_POOL_MIN_SIZE,
+                max_size=settings.ASYNC_DB_POOL_MAX_SIZE,
+                # pgbouncer в режиме transaction не сохраняет подготовленные выражения между транзакциями
+                statement_cache_size=0 if settings.DB_POOL_MODE == 'transaction' else 100,
+            )
+    return _state['pool']
+
+
+async def close_pool():
+    """Закрывает пул соединений текущего event loop (например, при остановке воркера или в тестах)"""
+    pool, loop = _state['pool'], _state['loop']
+    _state.update(loop=None, lock=None, pool=None)
+    if pool is not None and loop is asyncio.get_running_loop():
+        await pool.close()
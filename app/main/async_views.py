@@ -0,0 +1,327 @@
+"""
+Асинхронные реализации OrdersAssignView, OrdersCompleteView и CourierView.get для запуска через ASGI
+(uvicorn или gunicorn с воркерами uvicorn, см. settings.ASYNC_VIEWS).
+Запросы к базе выполняются через пул asyncpg, поэтому один процесс обслуживает много запросов одновременно.
+Бизнес-логика (упаковка заказов, рейтинг, статистика) та же, что и в синхронных view: используются те же методы
+моделей, а SQL повторяет запросы ORM. Формат ответов и ошибок совпадает с синхронными view
+"""
+import functools
+import json
+from typing import Iterable, List, Set
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.validators import ValidationError
+
+from . import courier_cache
+from .async_db import asyncpg, get_pool
+from .exceptions import APIError, Http400
+from .metrics import CANDIDATE_POOL_SIZE, SELECTED_ORDERS
+from .models import Courier, CourierRegionStats, Order
+from .profiling import stage
+from .serializers.courier import CourierSerializerIn
+from .serializers.order import OrderArgsSerializer
+from .views import CourierView
+
+
+__all__ = ['courier_view', 'orders_assign_view', 'orders_complete_view']
+
+
+ORDER_COLUMNS = 'id, region_id, weight, delivery_minutes, courier_id, assign_time'
+
+# Courier.get_assigned_orders
+ASSIGNED_ORDERS_SQL = f'''
+    SELECT {ORDER_COLUMNS} FROM main_order
+    WHERE courier_id = $1 AND assign_time IS NOT NULL AND complete_time IS NULL
+'''
+
+# Courier._get_ini_orders
+INI_ORDERS_SQL = f'''
+    SELECT {ORDER_COLUMNS} FROM main_order
+    WHERE courier_id IS NULL AND complete_time IS NULL AND assign_time IS NULL
+      AND region_id = ANY($1::int[])
+      AND weight <= $2
+      AND EXISTS (
+          SELECT 1 FROM main_orderdeliveryinterval
+          WHERE main_orderdeliveryinterval.order_id = main_order.id
+            AND main_orderdeliveryinterval.minutes && ANY($3::int4range[])
+      )
+'''
+
+# Courier._lock_orders
+LOCK_ORDERS_SQL = '''
+    SELECT id FROM main_order
+    WHERE id = ANY($1::int[]) AND courier_id IS NULL AND complete_time IS NULL AND assign_time IS NULL
+    FOR UPDATE SKIP LOCKED
+'''
+
+# OrdersAssignSerializer.update
+ASSIGN_ORDERS_SQL = '''
+    UPDATE main_order SET courier_id = $1, assign_time = assigned.assign_time
+    FROM unnest($2::int[], $3::timestamptz[]) AS assigned(id, assign_time)
+    WHERE main_order.id = assigned.id
+'''
+
+COURIER_SQL = '''
+    SELECT id, courier_type, working_hours, working_minutes, region_ids, version FROM main_courier WHERE id = $1
+'''
+
+# Courier.bump_versions
+BUMP_VERSION_SQL = 'UPDATE main_courier SET version = version + 1 WHERE id = $1 RETURNING version'
+
+COURIER_VERSION_SQL = 'SELECT version FROM main_courier WHERE id = $1'
+
+STATS_COLUMNS = (
+    'id, courier_id, region_id, completed_orders_count, first_assign_time, first_complete_time, last_complete_time'
+)
+
+
+class CourierArgsSerializer(CourierSerializerIn):
+    """CourierSerializerIn без проверки существования курьера (она выполняется в запросе к базе)"""
+
+    def validate(self, data):
+        return data
+
+
+def _json_response(data, status: int = 200) -> JsonResponse:
+    # тот же формат, что и у rest_framework.renderers.JSONRenderer
+    return JsonResponse(
+        data, status=status, safe=False, encoder=JSONEncoder,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')}
+    )
+
+
+def _load_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError as e:
+        raise ParseError(f'JSON parse error - {e}')
+
+
+def async_api_view(methods: Iterable[str]):
+    """
+    Декоратор асинхронной view: проверяет http-метод и переводит исключения в ответы того же формата,
+    что и app.main.exceptions.exception_handler
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return _json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                return await view(request, *args, **kwargs)
+            except Http400 as e:
+                return _json_response({'details': e.details}, status=e.status_code)
+            except APIError as e:
+                return _json_response(
+                    {'validation_error': {e.objects_name: e.invalid_objects}, 'details': e.details},
+                    status=e.status_code
+                )
+            except ValidationError as e:
+                return _json_response(e.detail, status=e.status_code)
+            except APIException as e:
+                return _json_response({'detail': e.detail}, status=e.status_code)
+
+        # csrf_exempt оборачивает view в синхронную функцию, поэтому флаг выставляется напрямую
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def _cache_call(func, *args):
+    """Обращения к общему кешу (кеш django) синхронные, поэтому выполняются в отдельном потоке"""
+    if courier_cache.has_shared_tier():
+        return await sync_to_async(func, thread_sensitive=False)(*args)
+    return func(*args)
+
+
+def _to_order(record) -> Order:
+    return Order(**dict(record))
+
+
+async def _fetch_courier(connection, courier_id: int, for_update: bool = False) -> Courier:
+    record = await connection.fetchrow(COURIER_SQL + (' FOR UPDATE' if for_update else ''), courier_id)
+    if record is None:
+        raise Http400(details='Courier does not exist')
+    return Courier(**dict(record))
+
+
+async def _lock_orders(connection, orders: List[Order]) -> Set[int]:
+    if not orders:
+        return set()
+    records = await connection.fetch(LOCK_ORDERS_SQL, [order.pk for order in orders])
+    return {record['id'] for record in records}
+
+
+async def _get_suitable_orders(connection, courier: Courier, today, packing_mode: str = None) -> List[Order]:
+    """То же, что и Courier.get_suitable_orders. Вызывать нужно внутри транзакции"""
+    result = [_to_order(record) for record in await connection.fetch(ASSIGNED_ORDERS_SQL, courier.pk)]
+    if not courier.working_minutes or not courier.has_valid_working_hours(today):
+        return result
+
+    working_ranges = [
+        asyncpg.Range(working_range.lower, working_range.upper) for working_range in courier._get_working_ranges(today)
+    ]
+    with stage('candidate_fetch'):
+        ini_orders = await connection.fetch(INI_ORDERS_SQL, courier.region_ids, courier.max_weight, working_ranges)
+        filtered_orders = [order for order in map(_to_order, ini_orders) if order.is_possible_to_deliver(today)]
+    CANDIDATE_POOL_SIZE.observe(len(filtered_orders))
+
+    assigned_orders = result
+    while True:
+        result = list(assigned_orders)
+        grouped_orders = courier._group_orders_by_region(filtered_orders)
+        courier.add_order(grouped_orders, result, today, packing_mode=packing_mode)
+
+        new_orders = result[len(assigned_orders):]
+        lost_orders_ids = {order.pk for order in new_orders} - await _lock_orders(connection, new_orders)
+        if not lost_orders_ids:
+            SELECTED_ORDERS.observe(len(new_orders))
+            return result
+
+        # заказы уже забрал параллельный запрос - подбираем замену из оставшихся
+        filtered_orders = [order for order in filtered_orders if order.pk not in lost_orders_ids]
+
+
+async def _register_completed_order(connection, order: Order) -> CourierRegionStats:
+    """То же, что и CourierRegionStats.register_completed_order. Вызывать нужно внутри транзакции"""
+    select_sql = (
+        f'SELECT {STATS_COLUMNS} FROM main_courierregionstats '
+        f'WHERE courier_id = $1 AND region_id IS NOT DISTINCT FROM $2 FOR UPDATE'
+    )
+    record = await connection.fetchrow(select_sql, order.courier_id, order.region_id)
+    if record is None:
+        await connection.execute(
+            'INSERT INTO main_courierregionstats (courier_id, region_id, completed_orders_count) VALUES ($1, $2, 0) '
+            'ON CONFLICT DO NOTHING',
+            order.courier_id, order.region_id
+        )
+        record = await connection.fetchrow(select_sql, order.courier_id, order.region_id)
+
+    stats = CourierRegionStats(**dict(record))
+    stats.add_completed_order(order.assign_time, order.complete_time)
+    await connection.execute(
+        '''
+        UPDATE main_courierregionstats
+        SET completed_orders_count = $2, first_assign_time = $3, first_complete_time = $4, last_complete_time = $5
+        WHERE id = $1
+        ''',
+        stats.pk, stats.completed_orders_count, stats.first_assign_time, stats.first_complete_time,
+        stats.last_complete_time
+    )
+    return stats
+
+
+@async_api_view(['POST'])
+async def orders_assign_view(request):
+    """Асинхронный OrdersAssignView.post"""
+    validated_courier_data = CourierArgsSerializer(data=_load_json(request)).load()
+    today = timezone.now()
+
+    pool = await get_pool()
+    async with pool.acquire() as connection, connection.transaction():
+        # блокировка курьера не дает параллельно назначить ему заказы сверх грузоподъемности
+        courier = await _fetch_courier(connection, validated_courier_data['courier_id'], for_update=True)
+        courier_orders = await _get_suitable_orders(
+            connection, courier, today, packing_mode=validated_courier_data.get('packing')
+        )
+        if courier_orders:
+            with stage('bulk_update'):
+                await connection.execute(
+                    ASSIGN_ORDERS_SQL,
+                    courier.pk, [order.pk for order in courier_orders], [order.assign_time for order in courier_orders]
+                )
+            version = await connection.fetchval(BUMP_VERSION_SQL, courier.pk)
+
+    if courier_orders:
+        await _cache_call(courier_cache.set_courier_versions, {courier.pk: version})
+
+    resp = {'orders': [{'id': order.pk} for order in courier_orders]}
+    if courier_orders:
+        resp.update({'assign_time': courier_orders[-1].assign_time})
+
+    return _json_response(resp)
+
+
+@async_api_view(['POST'])
+async def orders_complete_view(request):
+    """Асинхронный OrdersCompleteView.post"""
+    lookup = OrderArgsSerializer(data=_load_json(request)).load()
+
+    pool = await get_pool()
+    async with pool.acquire() as connection, connection.transaction():
+        # курьер блокируется раньше заказа, в том же порядке, что и при назначении заказов
+        version = await connection.fetchval(BUMP_VERSION_SQL, lookup['courier_id'])
+        record = await connection.fetchrow(
+            f'''
+            SELECT {ORDER_COLUMNS} FROM main_order
+            WHERE id = $1 AND courier_id = $2 AND complete_time IS NULL AND assign_time IS NOT NULL
+            FOR UPDATE
+            ''',
+            lookup['order_id'], lookup['courier_id']
+        )
+        if record is None:
+            raise Http400(details='Order does not exist')
+
+        order = _to_order(record)
+        order.complete_time = lookup['complete_time']
+        # та же проверка, что и в Order.save
+        if order.complete_time < order.assign_time:
+            raise APIError("complete_time can't be less than assign_time")
+        await connection.execute('UPDATE main_order SET complete_time = $2 WHERE id = $1', order.pk, order.complete_time)
+        await _register_completed_order(connection, order)
+
+    await _cache_call(courier_cache.set_courier_versions, {order.courier_id: version})
+    return _json_response({'order_id': order.pk})
+
+
+@async_api_view(['GET', 'PATCH'])
+async def courier_view(request, courier_id: int):
+    """Асинхронный CourierView.get. Обновление курьера (PATCH) выполняется синхронным CourierView"""
+    if request.method == 'PATCH':
+        return await sync_to_async(CourierView.as_view())(request, courier_id=courier_id)
+
+    version = None
+    if not courier_cache.has_shared_tier():
+        # без общего кеша версия курьера читается из базы, см. CourierView.get
+        pool = await get_pool()
+        async with pool.acquire() as connection:
+            version = await connection.fetchval(COURIER_VERSION_SQL, courier_id)
+
+    version, courier_info = await _cache_call(courier_cache.get_courier_info, courier_id, version)
+    if courier_info is None:
+        pool = await get_pool()
+        async with pool.acquire() as connection:
+            courier = await _fetch_courier(connection, courier_id)
+            stats = await connection.fetch(
+                f'SELECT {STATS_COLUMNS} FROM main_courierregionstats '
+                f'WHERE courier_id = $1 AND completed_orders_count > 0',
+                courier.pk
+            )
+
+        # статистика подставляется вместо запроса в Courier.completed_orders_stats
+        courier.completed_orders_stats = [CourierRegionStats(**dict(record)) for record in stats]
+
+        courier_info = {
+            'courier_id': courier.pk,
+            'courier_type': courier.courier_type,
+            'working_hours': courier.working_hours,
+            'regions': courier.region_ids,
+        }
+        if courier.has_completed_orders:
+            courier_info = {
+                **courier_info, 'rating': courier.rating, 'earnings': courier.earnings
+            }
+        version = courier.version
+        await _cache_call(courier_cache.set_courier_info, courier_id, version, courier_info)
+
+    etag = courier_cache.courier_etag(courier_id, version)
+    if courier_cache.etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+    else:
+        response = _json_response(courier_info)
+    response['ETag'] = etag
+    return response
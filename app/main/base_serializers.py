@@ -1,5 +1,11 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+
 from rest_framework import serializers
 
+from .fast_validation import validate_items
+from .profiling import stage
+
 
 class UintListField(serializers.ListField):
     child = serializers.IntegerField(min_value=0)
@@ -22,7 +28,8 @@ class FluentAPIMixin:
         Examples:
             validated_data = Serializer(data=request.data).load()
         """
-        self.is_valid(raise_exception=True)
+        with stage('parsing'):
+            self.is_valid(raise_exception=True)
         return self.validated_data
 
     def load_and_save(self):
@@ -36,10 +43,29 @@ class FluentAPIMixin:
             Update:
                 updated_obj = Serializer(instance=old_to_update, data=request.data, partial=False).load_and_save()
         """
-        self.is_valid(raise_exception=True)
+        with stage('parsing'):
+            self.is_valid(raise_exception=True)
         return self.save()
 
 
+class FastItemsValidationMixin:
+    """
+    Mixin для сериализаторов загрузки объектов ({"data": [...]}).
+    Сначала все объекты проверяются быстрой проверкой fast_item_validator (см. app.main.fast_validation),
+    и только если какой-то объект ее не прошел, payload валидируется полями DRF (которые и формируют ошибки)
+    """
+    fast_item_validator = None
+
+    def to_internal_value(self, data):
+        items = data.get('data') if isinstance(data, Mapping) else None
+        if isinstance(items, list) and items:
+            validated_items = validate_items(items, self.fast_item_validator)
+            if validated_items is not None:
+                return OrderedDict([('data', validated_items)])
+
+        return super().to_internal_value(data)
+
+
 class Serializer(FluentAPIMixin, serializers.Serializer):
     pass
 
@@ -58,3 +84,17 @@ class ModelSerializer(FluentAPIMixin, serializers.ModelSerializer):
             existing = set(self.fields)
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
+
+
+class BulkImportArgsSerializer(Serializer):
+    """
+    Параметры загрузки объектов (query string):
+        stream - потоковая загрузка: payload разбирается и валидируется кусками, объекты пишутся в базу через COPY
+        atomic - все или ничего: если хотя бы один объект невалиден, то в базу ничего не записывается
+                 (при atomic=false невалидные объекты пропускаются, а валидные записываются)
+    """
+    stream = serializers.BooleanField(default=False)
+    atomic = serializers.BooleanField(default=True)
+
+    class Meta:
+        fields = ('stream', 'atomic')
@@ -0,0 +1,180 @@
+"""
+Кеш ответа GET /couriers/<id> по версии курьера (Courier.version).
+Версия увеличивается в той же транзакции, что и изменения, которые меняют ответ (см. Courier.bump_versions),
+поэтому закешированный ответ для версии никогда не устаревает, а ETag строится по id и версии курьера.
+
+Два уровня:
+    - LRU в памяти процесса (COURIER_CACHE_SIZE записей, 0 - выключен)
+    - общий кеш воркеров - кеш django с алиасом COURIER_CACHE_ALIAS, если он задан в CACHES (например, redis)
+С общим кешем в нем хранится и текущая версия курьера (не дольше COURIER_CACHE_VERSION_TTL секунд), после коммита
+изменений туда записывается новая версия, поэтому пока версия в кеше, ответ (в том числе 304 на If-None-Match)
+отдается без запросов к базе. Без общего кеша версия не кешируется (воркер не узнал бы об изменениях в других
+воркерах), а читается из базы, и из кеша берется только ответ для нее.
+
+Версии в общий кеш пишутся без чтения (запрос, прочитавший курьера до коммита изменений, может записать старую
+версию поверх новой), поэтому вместе с новой версией записывается отметка, что предыдущая версия устарела,
+и версия с такой отметкой считается неизвестной
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+
+
+__all__ = [
+    'LRUCache', 'courier_etag', 'etag_matches', 'get_courier_info', 'set_courier_info', 'set_courier_versions',
+    'invalidate_couriers', 'has_shared_tier', 'clear',
+]
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кеш с ограничением количества записей и необязательным временем жизни записи"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value, ttl: float = None):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local = LRUCache(settings.COURIER_CACHE_SIZE)
+
+
+def _shared():
+    return caches[settings.COURIER_CACHE_ALIAS] if has_shared_tier() else None
+
+
+def _version_key(courier_id: int) -> str:
+    return f'courier:{courier_id}:version'
+
+
+def _info_key(courier_id: int, version: int) -> str:
+    return f'courier:{courier_id}:v{version}'
+
+
+def _superseded_key(courier_id: int, version: int) -> str:
+    return f'courier:{courier_id}:v{version}:superseded'
+
+
+def has_shared_tier() -> bool:
+    return settings.COURIER_CACHE_ALIAS in settings.CACHES
+
+
+def courier_etag(courier_id: int, version: int) -> str:
+    return f'"courier-{courier_id}-v{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 7232)"""
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags or f'W/{etag}' in etags
+
+
+def get_courier_info(courier_id: int, version: int = None) -> Tuple[Optional[int], Optional[dict]]:
+    """
+    Закешированный ответ GET /couriers/<id> для версии курьера version (None - версия из общего кеша).
+    (None, None) - версия неизвестна, (version, None) - версия известна, но ответа для нее в кеше нет
+    """
+    _local.max_size = settings.COURIER_CACHE_SIZE
+    shared = _shared()
+
+    if version is None and shared is not None:
+        version = shared.get(_version_key(courier_id))
+        if version is not None and shared.get(_superseded_key(courier_id, version)):
+            # в кеш записали версию, прочитанную до коммита более новой
+            version = None
+    if version is None:
+        return None, None
+
+    info_key = _info_key(courier_id, version)
+    courier_info = _local.get(info_key)
+    if courier_info is None and shared is not None:
+        courier_info = shared.get(info_key)
+        if courier_info is not None:
+            _local.set(info_key, courier_info)
+    return version, courier_info
+
+
+def set_courier_info(courier_id: int, version: int, courier_info: dict):
+    """Кеширует ответ GET /couriers/<id> для версии курьера, прочитанной из базы"""
+    _local.max_size = settings.COURIER_CACHE_SIZE
+    shared = _shared()
+    info_key = _info_key(courier_id, version)
+
+    _local.set(info_key, courier_info)
+    if shared is not None:
+        shared.set(info_key, courier_info)
+        shared.set(_version_key(courier_id), version, timeout=settings.COURIER_CACHE_VERSION_TTL)
+
+
+def set_courier_versions(versions: Dict[int, int]):
+    """
+    Записывает в общий кеш новые версии курьеров после коммита их увеличения (без общего кеша версии
+    не кешируются). Сначала отмечает предыдущие версии устаревшими: если запрос, прочитавший курьера до коммита,
+    запишет старую версию поверх новой, get_courier_info ее не вернет.
+    Отметки живут со временем жизни кеша по умолчанию - дольше любой версии в кеше
+    """
+    shared = _shared()
+    if shared is None or not versions:
+        return
+
+    shared.set_many({_superseded_key(courier_id, version - 1): True for courier_id, version in versions.items()})
+    shared.set_many(
+        {_version_key(courier_id): version for courier_id, version in versions.items()},
+        timeout=settings.COURIER_CACHE_VERSION_TTL
+    )
+
+
+def invalidate_couriers(courier_ids: Optional[Iterable[int]]):
+    """
+    Сбрасывает закешированные версии курьеров (None - всех курьеров и весь кеш), следующий запрос прочитает версию
+    из базы. Вызывать нужно после коммита изменений, иначе запрос между сбросом и коммитом закеширует старую версию
+    """
+    shared = _shared()
+    if courier_ids is None:
+        _local.clear()
+        if shared is not None:
+            shared.clear()
+        return
+
+    if shared is not None:
+        shared.delete_many([_version_key(courier_id) for courier_id in courier_ids])
+
+
+def clear():
+    invalidate_couriers(None)
@@ -0,0 +1,72 @@
+"""
+Бэкенд postgresql с пулом соединений на процесс (ENGINE = 'app.main.db_backends.postgresql_pool').
+Django по-прежнему "закрывает" соединение в конце запроса (CONN_MAX_AGE = 0), но вместо закрытия
+соединение возвращается в пул. Параметры пула задаются настройками DB_POOL_* (см. settings.base)
+"""
+import psycopg2.extras
+from django.conf import settings
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+
+from .pool import ConnectionPool, close_pools, get_pool, per_worker_max_size
+
+
+__all__ = ['DatabaseWrapper']
+
+
+def _connect(conn_params: dict, isolation_level=None):
+    connection = base.Database.connect(**conn_params)
+    if isolation_level is not None and isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+    # так же, как в django.db.backends.postgresql: без лишнего json.loads для JSONField
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # свободные соединения пула не дают удалить тестовую базу
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    pool = None
+
+    def get_pool(self, conn_params: dict) -> ConnectionPool:
+        """Пул процесса для данных параметров подключения (тестовая база получает свой пул)"""
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        key = (self.alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+        return get_pool(key, lambda: ConnectionPool(
+            lambda: _connect(conn_params, isolation_level),
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=per_worker_max_size(settings.DB_POOL_MAX_SIZE, settings.DB_POOL_HOST_BUDGET, settings.DB_POOL_WORKERS),
+            timeout=settings.DB_POOL_TIMEOUT,
+            health_check_interval=settings.DB_POOL_HEALTH_CHECK_INTERVAL,
+            max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+            max_idle=settings.DB_POOL_MAX_IDLE,
+            name=self.alias,
+        ))
+
+    def get_new_connection(self, conn_params):
+        # служебные соединения без базы (создание и удаление тестовой базы) не переиспользуются
+        if self.alias == NO_DB_ALIAS:
+            return super().get_new_connection(conn_params)
+
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # после закрытия внутри транзакции django продолжает ссылаться на соединение, отдавать его нельзя
+                self.pool.discard(self.connection)
+            else:
+                self.pool.putconn(self.connection)
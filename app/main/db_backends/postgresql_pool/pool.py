@@ -0,0 +1,291 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Hashable, Optional
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from ... import metrics
+
+
+__all__ = ['PoolTimeout', 'ConnectionPool', 'get_pool', 'close_pools', 'pools_stats', 'per_worker_max_size']
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Свободное соединение не появилось за timeout секунд (django превращает его в django.db.OperationalError)"""
+
+
+class _PooledConnection:
+    __slots__ = ('connection', 'created_at', 'returned_at')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.returned_at = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений psycopg2 одного процесса.
+    Держит не меньше min_size и не больше max_size соединений, при исчерпании ждет освобождения соединения
+    не дольше timeout секунд. Перед выдачей соединение, простоявшее дольше health_check_interval, проверяется
+    запросом SELECT 1, соединения старше max_lifetime пересоздаются, а лишние (сверх min_size) закрываются
+    после max_idle секунд простоя. Пул с именем name (алиас базы) пишет счетчики в метрики prometheus
+    """
+
+    def __init__(
+            self,
+            connect: Callable[[], 'psycopg2.extensions.connection'],
+            min_size: int = 0,
+            max_size: int = 10,
+            timeout: float = 30,
+            health_check_interval: float = 0,
+            max_lifetime: float = 3600,
+            max_idle: float = 600,
+            name: Optional[str] = None,
+    ):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(f'invalid pool size: min_size={min_size}, max_size={max_size}')
+
+        self.connect = connect
+        self.min_size, self.max_size = min_size, max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.name = name
+
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._in_use = {}
+        self._opening = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            'connections_opened': 0, 'connections_closed': 0, 'checkouts': 0, 'waits': 0,
+            'wait_time_total': 0.0, 'wait_time_max': 0.0, 'timeouts': 0, 'health_check_failures': 0,
+        }
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def stats(self) -> Dict[str, float]:
+        """Счетчики пула: размер, занятые/свободные соединения, ожидания свободного соединения и их длительность"""
+        with self._condition:
+            return {
+                **self._stats,
+                'size': self.size, 'idle': len(self._idle), 'in_use': len(self._in_use), 'max_size': self.max_size,
+            }
+
+    def getconn(self):
+        """Выдает проверенное соединение, при необходимости открывает новое или ждет освобождения"""
+        self._fill()
+        deadline = None
+        while True:
+            with self._condition:
+                pooled = self._take_idle()
+                if pooled is None and self.size >= self.max_size:
+                    deadline = self._wait(deadline)
+                    continue
+                if deadline is not None:
+                    self._record_wait(deadline - self.timeout)
+                    deadline = None
+                if pooled is None:
+                    self._opening += 1
+                else:
+                    # соединение сразу считается занятым, чтобы на время проверки не открылось лишнее
+                    self._mark_in_use(pooled)
+
+            if pooled is None:
+                pooled = self._open(self._mark_in_use)
+            elif not self._is_healthy(pooled):
+                self.discard(pooled.connection)
+                continue
+            with self._condition:
+                self._stats['checkouts'] += 1
+            return pooled.connection
+
+    def putconn(self, connection):
+        """Возвращает соединение в пул. Незавершенная транзакция откатывается, сломанное соединение закрывается"""
+        # до возврата в _idle соединение остается в _in_use, чтобы на время отката не открылось лишнее
+        with self._condition:
+            pooled = self._in_use.get(id(connection))
+        if pooled is None:
+            raise ValueError('connection does not belong to this pool')
+
+        reusable = not connection.closed and time.monotonic() - pooled.created_at < self.max_lifetime
+        if reusable and connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        if not reusable:
+            self.discard(connection)
+            return
+
+        pooled.returned_at = time.monotonic()
+        with self._condition:
+            del self._in_use[id(connection)]
+            self._idle.append(pooled)
+            self._update_in_use()
+            self._condition.notify()
+
+    def discard(self, connection):
+        """Закрывает выданное соединение, не возвращая его в пул (например, если оно закрыто внутри транзакции)"""
+        with self._condition:
+            pooled = self._in_use.pop(id(connection), None)
+            self._update_in_use()
+        if pooled is not None:
+            self._discard(pooled)
+
+    def close(self):
+        """Закрывает свободные соединения, выданные соединения закроются при возврате"""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self.max_lifetime = 0
+        for pooled in idle:
+            self._discard(pooled)
+
+    def _take_idle(self) -> Optional[_PooledConnection]:
+        # соединения выдаются в порядке LIFO, чтобы лишние соединения простаивали и закрывались по max_idle
+        now = time.monotonic()
+        while self._idle:
+            if len(self._idle) + len(self._in_use) > self.min_size and now - self._idle[0].returned_at > self.max_idle:
+                self._discard(self._idle.popleft())
+                continue
+            return self._idle.pop()
+        return None
+
+    def _fill(self):
+        while True:
+            with self._condition:
+                if self.size >= self.min_size:
+                    return
+                self._opening += 1
+            self._open(self._idle.appendleft)
+
+    def _open(self, register: Callable[[_PooledConnection], None]) -> _PooledConnection:
+        # соединение учитывается в _opening, пока не попадет в _idle или _in_use, чтобы не превысить max_size
+        pooled = None
+        try:
+            pooled = _PooledConnection(self.connect())
+        finally:
+            with self._condition:
+                self._opening -= 1
+                if pooled is not None:
+                    self._stats['connections_opened'] += 1
+                    register(pooled)
+                self._condition.notify()
+        return pooled
+
+    def _mark_in_use(self, pooled: _PooledConnection):
+        self._in_use[id(pooled.connection)] = pooled
+        self._update_in_use()
+
+    def _update_in_use(self):
+        if self.name is not None:
+            metrics.DB_POOL_IN_USE.labels(self.name).set(len(self._in_use))
+
+    def _wait(self, deadline: Optional[float]) -> float:
+        """Ждет освобождения соединения (вызывается под self._condition), возвращает срок ожидания"""
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+            self._stats['waits'] += 1
+            if self.name is not None:
+                metrics.DB_POOL_WAITS.labels(self.name).inc()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            self._stats['timeouts'] += 1
+            if self.name is not None:
+                metrics.DB_POOL_TIMEOUTS.labels(self.name).inc()
+            self._record_wait(deadline - self.timeout)
+            logger.warning('db pool exhausted: no free connection for %.1f s (%s)', self.timeout, self._stats)
+            raise PoolTimeout(f'no free connection in pool (max_size={self.max_size}) for {self.timeout} s')
+        self._condition.wait(remaining)
+        return deadline
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        connection = pooled.connection
+        if connection.closed or time.monotonic() - pooled.created_at >= self.max_lifetime:
+            return False
+        if time.monotonic() - pooled.returned_at < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            with self._condition:
+                self._stats['health_check_failures'] += 1
+            logger.warning('db pool: dropping broken connection', exc_info=True)
+            return False
+        return True
+
+    def _discard(self, pooled: _PooledConnection):
+        try:
+            pooled.connection.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._stats['connections_closed'] += 1
+            self._condition.notify()
+
+    def _record_wait(self, wait_started: float):
+        waited = time.monotonic() - wait_started
+        self._stats['wait_time_total'] += waited
+        self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        if self.name is not None:
+            metrics.DB_POOL_WAIT_TIME.labels(self.name).observe(waited)
+            metrics.DB_POOL_WAIT_TIME_MAX.labels(self.name).set(self._stats['wait_time_max'])
+
+
+_pools: Dict[Hashable, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key: Hashable, factory: Callable[[], ConnectionPool]) -> ConnectionPool:
+    """
+    Возвращает пул по ключу, при первом обращении создает его через factory.
+    После fork (воркеры gunicorn с --preload) пулы родителя забываются без закрытия соединений:
+    их сокеты общие с родителем
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            if pool is not None:
+                _pools.clear()
+            pool = _pools[key] = factory()
+        return pool
+
+
+def close_pools():
+    """Закрывает свободные соединения всех пулов процесса и забывает пулы"""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pools_stats() -> Dict[Hashable, Dict[str, float]]:
+    """Счетчики всех пулов текущего процесса (ключ пула - алиас базы)"""
+    with _pools_lock:
+        pools = [(key, pool) for key, pool in _pools.items() if pool.pid == os.getpid()]
+    return {key[0] if isinstance(key, tuple) else key: pool.stats() for key, pool in pools}
+
+
+def per_worker_max_size(max_size: int, host_budget: int, workers: int) -> int:
+    """
+    Размер пула одного воркера: не больше max_size и не больше доли бюджета соединений хоста
+    (host_budget соединений на все workers процессов хоста, 0 - без ограничения)
+    """
+    if host_budget <= 0:
+        return max_size
+    return max(1, min(max_size, host_budget // max(workers, 1)))
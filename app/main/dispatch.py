@@ -0,0 +1,259 @@
+"""
+Массовое назначение заказов (например, всем курьерам города в начале смены) по компонентам районов.
+Курьер, работающий в нескольких районах, связывает их, а районы, не связанные ни одним курьером, распределяются
+независимо. Поэтому свободные заказы и курьеры разбиваются на компоненты связности районов, каждая компонента
+решается в отдельном процессе (ProcessPoolExecutor) той же логикой, что и Courier.get_suitable_orders_batch
+(курьеры компоненты по очереди в порядке id набирают заказы через Courier.add_order),
+а результаты всех компонент записываются в базу одним запросом.
+Компоненты решаются по снимку данных без блокировок, курьеры и заказы блокируются только на время записи:
+компоненты, курьеров которых за это время изменил (или заказы которых забрал) параллельный запрос,
+решаются заново по новому снимку.
+Результат такой же, как у Courier.get_suitable_orders_batch для тех же курьеров в порядке id
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Courier, Order
+from .profiling import stage
+
+
+__all__ = ['dispatch_orders', 'partition']
+
+
+# запись результата одним запросом, все заказы назначаются в один момент
+ASSIGN_ORDERS_SQL = '''
+    UPDATE main_order SET courier_id = assigned.courier_id, assign_time = %s
+    FROM unnest(%s::int[], %s::int[]) AS assigned(id, courier_id)
+    WHERE main_order.id = assigned.id
+'''
+
+# id, тип, рабочие часы в минутах, районы
+CourierRow = Tuple[int, str, List[List[int]], List[int]]
+# id, район, вес, промежутки доставки в минутах
+OrderRow = Tuple[int, int, object, List[List[int]]]
+# курьеры, уже назначенные курьерам заказы (id и вес) и свободные заказы компоненты
+Component = Tuple[List[CourierRow], Dict[int, List[Tuple[int, object]]], List[OrderRow]]
+
+
+def partition(
+        couriers: Iterable[CourierRow],
+        orders: Iterable[OrderRow]
+) -> List[Tuple[List[CourierRow], List[OrderRow]]]:
+    """
+    Разбивает курьеров и заказы на компоненты связности районов (районы связаны, если в них работает один курьер).
+    Заказы районов без курьеров отбрасываются, компоненты без заказов не возвращаются
+    """
+    parents = {}
+
+    def find(region_id: int) -> int:
+        while parents[region_id] != region_id:
+            parents[region_id] = parents[parents[region_id]]
+            region_id = parents[region_id]
+        return region_id
+
+    couriers = [courier for courier in couriers if courier[3]]
+    for _, _, _, region_ids in couriers:
+        for region_id in region_ids:
+            parents.setdefault(region_id, region_id)
+            parents[find(region_id)] = find(region_ids[0])
+
+    components = {}
+    for courier in couriers:
+        components.setdefault(find(courier[3][0]), ([], []))[0].append(courier)
+    for order in orders:
+        if order[1] in parents:
+            components[find(order[1])][1].append(order)
+    return [component for component in components.values() if component[1]]
+
+
+def solve_component(component: Component, today: datetime, packing_mode: Optional[str]) -> Dict[int, List[int]]:
+    """
+    Распределяет свободные заказы компоненты между ее курьерами (выполняется в процессе-воркере, без базы).
+    Возвращает id новых заказов по id курьера
+    """
+    couriers_rows, assigned_rows, orders_rows = component
+    couriers = [
+        Courier(id=courier_id, courier_type=courier_type, working_minutes=working_minutes, region_ids=region_ids)
+        for courier_id, courier_type, working_minutes, region_ids in couriers_rows
+    ]
+    working_couriers_ids = {
+        courier.pk for courier in couriers
+        if courier.working_minutes and courier.has_valid_working_hours(today)
+    }
+    assigned_orders = {
+        courier_id: [Order(id=order_id, weight=weight) for order_id, weight in orders]
+        for courier_id, orders in assigned_rows.items()
+    }
+    pool = [
+        Order(id=order_id, region_id=region_id, weight=weight, delivery_minutes=delivery_minutes)
+        for order_id, region_id, weight, delivery_minutes in orders_rows
+    ]
+    pool = [order for order in pool if order.is_possible_to_deliver(today)]
+
+    result, _ = Courier._distribute_pool(
+        couriers, assigned_orders, working_couriers_ids, pool, today, packing_mode=packing_mode
+    )
+    return {
+        courier_id: [order.pk for order in orders[len(assigned_orders.get(courier_id, [])):]]
+        for courier_id, orders in result.items()
+    }
+
+
+def _solve_components(
+        components: List[Component],
+        today: datetime,
+        packing_mode: Optional[str],
+        workers: int
+) -> List[Dict[int, List[int]]]:
+    if workers <= 1 or len(components) <= 1:
+        return [solve_component(component, today, packing_mode) for component in components]
+
+    # fork копировал бы соединение с базой и потоки процесса (слушатель кеша свободных заказов, пулы),
+    # поэтому воркеры запускаются через spawn и django в них настраивается заново. К базе воркеры не обращаются
+    with ProcessPoolExecutor(
+            max_workers=min(workers, len(components)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+    ) as executor:
+        return list(executor.map(
+            solve_component, components, [today] * len(components), [packing_mode] * len(components)
+        ))
+
+
+def _snapshot(
+        today: datetime,
+        courier_ids: Optional[List[int]]
+) -> Tuple[Dict[int, int], Dict[int, OrderRow], List[Component]]:
+    """
+    Читает без блокировок курьеров courier_ids (None - всех), их назначенные заказы и свободные заказы их районов.
+    Возвращает версии курьеров компонент, свободные заказы по id и компоненты
+    """
+    couriers_query = Courier.objects.order_by('pk')
+    if courier_ids is not None:
+        couriers_query = couriers_query.filter(id__in=courier_ids)
+    couriers = list(couriers_query.only('id', 'courier_type', 'working_minutes', 'region_ids', 'version'))
+    if not couriers:
+        return {}, {}, []
+
+    with stage('candidate_fetch'):
+        assigned_rows = {}
+        for courier_id, order_id, weight in (
+            Order.objects
+            .filter(courier_id__in=[courier.pk for courier in couriers])
+            .filter(assign_time__isnull=False)
+            .filter(complete_time__isnull=True)
+            .values_list('courier_id', 'id', 'weight')
+        ):
+            assigned_rows.setdefault(courier_id, []).append((order_id, weight))
+
+        # порядок заказов влияет на выбор среди равных по весу и сроку, поэтому он фиксируется
+        pool = {
+            row[0]: row for row in Courier._get_pool(couriers, today).order_by('id').values_list(
+                'id', 'region_id', 'weight', 'delivery_minutes'
+            )
+        }
+
+    couriers_rows = [
+        (courier.pk, courier.courier_type, courier.working_minutes, courier.region_ids) for courier in couriers
+    ]
+    components = [
+        (
+            component_couriers,
+            {courier[0]: assigned_rows[courier[0]] for courier in component_couriers if courier[0] in assigned_rows},
+            orders
+        )
+        for component_couriers, orders in partition(couriers_rows, pool.values())
+    ]
+    # самые большие компоненты отправляются в воркеры первыми
+    components.sort(key=lambda component: len(component[2]), reverse=True)
+
+    versions = {courier.pk: courier.version for courier in couriers}
+    versions = {courier[0]: versions[courier[0]] for component in components for courier in component[0]}
+    return versions, pool, components
+
+
+def dispatch_orders(
+        today: datetime,
+        courier_ids: Optional[List[int]] = None,
+        packing_mode: Optional[str] = None,
+        workers: Optional[int] = None
+) -> Dict[int, List[Order]]:
+    """
+    Назначает свободные заказы курьерам courier_ids (None - всем курьерам) и возвращает новые заказы по id курьера.
+    workers - количество процессов (по умолчанию settings.DISPATCH_WORKERS, 0 - по числу ядер)
+    """
+    workers = workers if workers is not None else settings.DISPATCH_WORKERS
+    workers = workers or os.cpu_count() or 1
+
+    result = {}
+    while True:
+        versions, pool, components = _snapshot(today, courier_ids)
+        if not components:
+            return result
+
+        with stage('packing'):
+            solutions = _solve_components(components, today, packing_mode, workers)
+
+        with transaction.atomic():
+            # курьеры блокируются в порядке id, как и в OrdersBatchAssignView
+            locked_versions = dict(
+                Courier.objects.select_for_update(of=('self',)).filter(id__in=list(versions)).order_by('pk')
+                .values_list('id', 'version')
+            )
+            # курьеры, измененные параллельным запросом (назначение, выполнение заказов, обновление), решаются заново
+            accepted = [
+                (component, solution) for component, solution in zip(components, solutions)
+                if all(locked_versions.get(courier[0]) == versions[courier[0]] for courier in component[0])
+            ]
+
+            new_orders_ids = {
+                order_id
+                for _, solution in accepted
+                for orders_ids in solution.values()
+                for order_id in orders_ids
+            }
+            lost_orders_ids = new_orders_ids - Courier._lock_orders(Order(id=order_id) for order_id in new_orders_ids)
+            # как и компоненты, заказы которых уже забрал параллельный запрос
+            accepted = [
+                (component, solution) for component, solution in accepted
+                if not lost_orders_ids.intersection(
+                    order_id for orders_ids in solution.values() for order_id in orders_ids
+                )
+            ]
+
+            assigned = {}
+            for _, solution in accepted:
+                for courier_id, orders_ids in solution.items():
+                    if orders_ids:
+                        assigned[courier_id] = [
+                            Order(
+                                id=order_id, courier_id=courier_id, region_id=pool[order_id][1],
+                                weight=pool[order_id][2], delivery_minutes=pool[order_id][3], assign_time=today
+                            )
+                            for order_id in orders_ids
+                        ]
+
+            # bulk_update строит CASE на каждый заказ, что на десятках тысяч заказов дольше самого распределения
+            orders = [order for orders in assigned.values() for order in orders]
+            with stage('bulk_update'), connection.cursor() as cursor:
+                cursor.execute(
+                    ASSIGN_ORDERS_SQL,
+                    [today, [order.pk for order in orders], [order.courier_id for order in orders]]
+                )
+            if assigned:
+                Courier.bump_versions(list(assigned))
+        result.update(assigned)
+
+        if len(accepted) == len(components):
+            return result
+        accepted_ids = {id(component) for component, _ in accepted}
+        courier_ids = [
+            courier[0] for component in components if id(component) not in accepted_ids for courier in component[0]
+        ]
@@ -0,0 +1,111 @@
+"""
+Быстрая проверка объектов из payload загрузки курьеров и заказов без полей DRF.
+
+Проверки намеренно строже, чем в CourierSerializer и OrderSerializer: объект принимается только в самом частом
+(каноническом) виде, например id - только int, время - только HH:MM. Если проверка не прошла, то возвращается None,
+и объект валидируется сериализатором DRF, который и формирует ошибки. Поэтому решения (принять/отклонить)
+и формат ошибок совпадают с DRF, а быстрая проверка лишь пропускает DRF для валидных объектов
+"""
+import re
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Callable, Iterable, List, Optional
+
+from .models import CourierType
+from .packing import WEIGHT_UNITS_IN_KG
+
+
+__all__ = ['validate_order', 'validate_courier', 'validate_items']
+
+
+TIME_INTERVAL = re.compile(r'([01][0-9]|2[0-3]):([0-5][0-9])-([01][0-9]|2[0-3]):([0-5][0-9])')
+
+# вес с не более чем 2 знаками до и после точки (так же его ограничивает DecimalField(max_digits=4, decimal_places=2))
+WEIGHT = re.compile(r'[0-9]{1,2}(\.[0-9]{1,2})?')
+WEIGHT_PRECISION = Decimal('0.01')
+MIN_WEIGHT_UNITS, MAX_WEIGHT_UNITS = 1, 50 * WEIGHT_UNITS_IN_KG
+
+COURIER_TYPES = frozenset(field.name for field in CourierType)
+
+
+def _is_int(value: Any) -> bool:
+    # bool - подкласс int, но IntegerField его не принимает
+    return type(value) is int
+
+
+def _is_time_intervals(value: Any) -> bool:
+    """Список строк HH:MM-HH:MM, в каждой из которых время начала не больше времени окончания"""
+    if type(value) is not list:
+        return False
+    for time_interval in value:
+        if type(time_interval) is not str:
+            return False
+        match = TIME_INTERVAL.fullmatch(time_interval)
+        if match is None:
+            return False
+        start_hours, start_minutes, end_hours, end_minutes = match.groups()
+        if (start_hours, start_minutes) > (end_hours, end_minutes):
+            return False
+    return True
+
+
+def _to_weight(value: Any) -> Optional[Decimal]:
+    """Вес в кг с точностью до 0.01 в пределах 0.01 - 50 или None"""
+    if type(value) not in (int, float):
+        return None
+    text = str(value)
+    if WEIGHT.fullmatch(text) is None:
+        return None
+    weight = Decimal(text).quantize(WEIGHT_PRECISION)
+    if not (MIN_WEIGHT_UNITS <= weight * WEIGHT_UNITS_IN_KG <= MAX_WEIGHT_UNITS):
+        return None
+    return weight
+
+
+def validate_order(item: Any) -> Optional[OrderedDict]:
+    """Возвращает validated_data заказа, как у OrderSerializer, или None, если заказ нужно проверить через DRF"""
+    if type(item) is not dict:
+        return None
+
+    order_id, region = item.get('order_id'), item.get('region')
+    delivery_hours = item.get('delivery_hours')
+    if not (_is_int(order_id) and _is_int(region) and _is_time_intervals(delivery_hours)):
+        return None
+
+    weight = _to_weight(item.get('weight'))
+    if weight is None:
+        return None
+
+    return OrderedDict([
+        ('id', order_id), ('weight', weight), ('region', region), ('delivery_hours', list(delivery_hours))
+    ])
+
+
+def validate_courier(item: Any) -> Optional[OrderedDict]:
+    """Возвращает validated_data курьера, как у CourierSerializer, или None, если курьера нужно проверить через DRF"""
+    if type(item) is not dict:
+        return None
+
+    courier_id, courier_type = item.get('courier_id'), item.get('courier_type')
+    regions, working_hours = item.get('regions'), item.get('working_hours')
+    if not (_is_int(courier_id) and type(courier_type) is str and courier_type in COURIER_TYPES):
+        return None
+    if not (type(regions) is list and regions and all(_is_int(region) and region >= 0 for region in regions)):
+        return None
+    if not _is_time_intervals(working_hours):
+        return None
+
+    return OrderedDict([
+        ('id', courier_id), ('courier_type', courier_type), ('regions', list(regions)), ('working_hours', list(working_hours))
+    ])
+
+
+def validate_items(items: Iterable[Any], validate_item: Callable[[Any], Optional[OrderedDict]]) -> Optional[List]:
+    """Быстро проверяет все объекты. Если хотя бы один объект не прошел проверку, то возвращает None"""
+    validated_items = []
+    for item in items:
+        validated_item = validate_item(item)
+        if validated_item is None:
+            return None
+        validated_items.append(validated_item)
+    return validated_items
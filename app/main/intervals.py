@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import Iterable, List
+
+
+__all__ = [
+    'MINUTES_IN_DAY', 'parse_time', 'parse_time_intervals', 'merge_intervals',
+    'minute_of_day', 'remove_expired_intervals', 'to_bitmap', 'is_overlap',
+]
+
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def parse_time(value: str) -> int:
+    """Преобразует время из строки HH:MM в количество минут от начала суток"""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def merge_intervals(intervals: Iterable[List[int]]) -> List[List[int]]:
+    """
+    Сортирует интервалы по времени начала и объединяет пересекающиеся и соприкасающиеся.
+    Например: [[600, 720], [540, 600], [900, 960]] -> [[540, 720], [900, 960]]
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def parse_time_intervals(time_intervals: Iterable[str]) -> List[List[int]]:
+    """
+    Преобразует список строковых временных интервалов HH:MM-HH:MM
+    в отсортированный список непересекающихся интервалов [start, end] в минутах от начала суток.
+    Строки должны быть предварительно провалидированы через validate_time_intervals
+    """
+    intervals = []
+    for time_interval in time_intervals:
+        start, end = time_interval.split('-')
+        intervals.append([parse_time(start), parse_time(end)])
+    return merge_intervals(intervals)
+
+
+def minute_of_day(moment: datetime) -> float:
+    """Возвращает время moment в минутах от начала суток (с учетом секунд)"""
+    return moment.hour * 60 + moment.minute + (moment.second + moment.microsecond / 1_000_000) / 60
+
+
+def remove_expired_intervals(intervals: Iterable[List[int]], today: datetime) -> List[List[int]]:
+    """Убирает интервалы, время окончания которых <= текущего времени"""
+    current_minute = minute_of_day(today)
+    return [interval for interval in intervals if interval[1] > current_minute]
+
+
+def to_bitmap(intervals: Iterable[List[int]]) -> int:
+    """
+    Преобразует интервалы в битовую маску на 1440 минут суток: бит i выставлен, если минута [i, i + 1) входит в интервал.
+    Конец интервала не включается, поэтому соприкасающиеся интервалы (09:00-18:00 и 18:00-19:00) не пересекаются
+    """
+    bitmap = 0
+    for start, end in intervals:
+        if end > start:
+            bitmap |= ((1 << (end - start)) - 1) << start
+    return bitmap
+
+
+def is_overlap(bitmap: int, other_bitmap: int) -> bool:
+    """Проверяет, пересекаются ли два набора интервалов хотя бы на одну минуту"""
+    return bool(bitmap & other_bitmap)
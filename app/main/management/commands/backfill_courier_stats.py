@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.main.models import CourierRegionStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает накопленную статистику курьеров (CourierRegionStats) по истории выполненных заказов'
+
+    def handle(self, *args, **options):
+        rows_count = CourierRegionStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Courier region stats rebuilt: {rows_count} rows'))
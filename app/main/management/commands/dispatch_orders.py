@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.main.dispatch import dispatch_orders
+from app.main.models.enums import PackingMode
+
+
+class Command(BaseCommand):
+    help = (
+        'Назначает свободные заказы сразу всем курьерам (или курьерам из --couriers), '
+        'компоненты районов распределяются параллельно в нескольких процессах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, nargs='+', help='id курьеров (по умолчанию все курьеры)')
+        parser.add_argument('--packing', choices=[mode.name for mode in PackingMode])
+        parser.add_argument('--workers', type=int, help='количество процессов (по умолчанию DISPATCH_WORKERS)')
+
+    def handle(self, *args, **options):
+        result = dispatch_orders(
+            today=timezone.now(),
+            courier_ids=options['couriers'],
+            packing_mode=options['packing'],
+            workers=options['workers']
+        )
+        orders_count = sum(len(orders) for orders in result.values())
+        self.stdout.write(self.style.SUCCESS(f'Orders dispatched: {orders_count} orders to {len(result)} couriers'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from app.main.order_pool import drop_triggers, install_triggers
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит (install) или удаляет (drop) триггеры уведомлений об изменениях свободных заказов, '
+        'которые нужны кешу ORDER_POOL_CACHE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['install', 'drop'])
+
+    def handle(self, *args, **options):
+        if options['action'] == 'install':
+            install_triggers()
+            self.stdout.write(self.style.SUCCESS('Open orders triggers installed'))
+        else:
+            drop_triggers()
+            self.stdout.write(self.style.SUCCESS('Open orders triggers dropped'))
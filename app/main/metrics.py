@@ -0,0 +1,95 @@
+"""
+Метрики prometheus (GET /metrics).
+Под gunicorn каждый воркер пишет метрики в файлы каталога PROMETHEUS_MULTIPROC_DIR (см. gunicorn.conf),
+а /metrics собирает их со всех воркеров через MultiProcessCollector. Без PROMETHEUS_MULTIPROC_DIR
+(runserver, тесты) метрики хранятся в памяти процесса
+"""
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+
+__all__ = [
+    'REQUEST_LATENCY', 'REQUEST_DB_QUERIES', 'CANDIDATE_POOL_SIZE', 'SELECTED_ORDERS', 'BULK_IMPORT_ROWS',
+    'DB_POOL_IN_USE', 'DB_POOL_WAITS', 'DB_POOL_WAIT_TIME', 'DB_POOL_WAIT_TIME_MAX', 'DB_POOL_TIMEOUTS',
+    'CONTENT_TYPE_LATEST', 'collect',
+]
+
+
+REQUEST_LATENCY = Histogram(
+    'candy_delivery_request_duration_seconds',
+    'Время обработки запроса',
+    ['endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+REQUEST_DB_QUERIES = Histogram(
+    'candy_delivery_request_db_queries',
+    'Количество запросов к базе на один запрос к API',
+    ['endpoint', 'method'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+CANDIDATE_POOL_SIZE = Histogram(
+    'candy_delivery_assign_candidate_orders',
+    'Количество подходящих курьеру свободных заказов, из которых выбираются назначаемые',
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+
+SELECTED_ORDERS = Histogram(
+    'candy_delivery_assign_selected_orders',
+    'Количество заказов, назначенных курьеру за одно назначение',
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+
+BULK_IMPORT_ROWS = Counter(
+    'candy_delivery_bulk_import_rows',
+    'Количество объектов в загрузках POST /couriers и POST /orders',
+    ['objects', 'mode', 'result'],
+)
+
+# пул соединений app.main.db_backends.postgresql_pool (по алиасу базы), значения обновляются самим пулом,
+# поэтому под gunicorn складываются по всем воркерам
+DB_POOL_IN_USE = Gauge(
+    'candy_delivery_db_pool_in_use',
+    'Количество выданных соединений пула',
+    ['alias'],
+    multiprocess_mode='livesum',
+)
+
+DB_POOL_WAITS = Counter(
+    'candy_delivery_db_pool_waits',
+    'Количество ожиданий свободного соединения пула',
+    ['alias'],
+)
+
+DB_POOL_WAIT_TIME = Histogram(
+    'candy_delivery_db_pool_wait_seconds',
+    'Время ожидания свободного соединения пула (в том числе закончившегося таймаутом)',
+    ['alias'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+DB_POOL_WAIT_TIME_MAX = Gauge(
+    'candy_delivery_db_pool_wait_max_seconds',
+    'Максимальное время ожидания свободного соединения пула',
+    ['alias'],
+    multiprocess_mode='max',
+)
+
+DB_POOL_TIMEOUTS = Counter(
+    'candy_delivery_db_pool_timeouts',
+    'Количество ожиданий свободного соединения пула, закончившихся таймаутом',
+    ['alias'],
+)
+
+
+def collect() -> bytes:
+    """Метрики в текстовом формате prometheus (со всех воркеров, если задан PROMETHEUS_MULTIPROC_DIR)"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -0,0 +1,255 @@
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import REQUEST_DB_QUERIES, REQUEST_LATENCY
+from .profiling import RequestProfile, StackSampler, current_profile, profile_request
+
+
+__all__ = ['MetricsMiddleware', 'ProfilingMiddleware', 'TrafficCaptureMiddleware']
+
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """
+    Метрики запросов к API (см. app.main.metrics): время обработки и количество запросов к базе по endpoint
+    (имени url из app.main.urls). Запросы вне app.main (admin, 404) не учитываются
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        profile = RequestProfile(detailed=False)
+        with profile_request(profile):
+            response = self.get_response(request)
+        self.observe(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        profile = RequestProfile(detailed=False)
+        with profile_request(profile):
+            response = await self.get_response(request)
+        self.observe(request, response, profile)
+        return response
+
+    @staticmethod
+    def observe(request, response, profile: RequestProfile):
+        resolver_match = request.resolver_match
+        if resolver_match is None or resolver_match.namespace != 'main' or resolver_match.url_name == 'metrics':
+            return
+
+        profile.finish()
+        endpoint = resolver_match.url_name
+        REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(profile.wall_time)
+        REQUEST_DB_QUERIES.labels(endpoint, request.method).observe(profile.db_queries)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование запросов: время запроса, количество и время запросов к базе, время этапов (см. profiling.stage).
+    Профилируется доля PROFILING_SAMPLE_RATE запросов, результат пишется в лог одной json-строкой.
+    Если PROFILING_HEADER_ENABLED, профилирование можно запросить заголовком X-Profile:
+        - X-Profile: 1 - только запись в лог
+        - X-Profile: cprofile - дамп cProfile (pstats)
+        - X-Profile: stack - дамп семплирующего профайлера (collapsed stacks для flamegraph)
+    Дамп сохраняется в PROFILING_DUMP_DIR, имя файла возвращается в заголовке ответа X-Profile-Dump
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            # так django понимает, что middleware работает в асинхронном режиме
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        mode = self.get_profile_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        profile, profile_context = self.start_profile()
+        with profile_context, self.instrument(mode) as dump:
+            response = self.get_response(request)
+            profile.finish()
+        return self.emit(request, response, profile, dump)
+
+    async def __acall__(self, request):
+        mode = self.get_profile_mode(request)
+        if mode is None:
+            return await self.get_response(request)
+
+        profile, profile_context = self.start_profile()
+        with profile_context, self.instrument(mode) as dump:
+            response = await self.get_response(request)
+            profile.finish()
+        return self.emit(request, response, profile, dump)
+
+    @staticmethod
+    def get_profile_mode(request):
+        """Режим профилирования запроса (None - запрос не профилируется)"""
+        if settings.PROFILING_HEADER_ENABLED and 'X-Profile' in request.headers:
+            return request.headers['X-Profile']
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return 'sample'
+        return None
+
+    @staticmethod
+    def start_profile():
+        """Профиль запроса. Если его уже завел MetricsMiddleware, профилирование продолжает его профиль"""
+        profile = current_profile()
+        if profile is not None:
+            profile.detailed = True
+            return profile, nullcontext()
+
+        profile = RequestProfile()
+        return profile, profile_request(profile)
+
+    @contextmanager
+    def instrument(self, mode: str):
+        """Запускает cProfile или семплирующий профайлер, если они запрошены. Дамп сохраняется при выходе"""
+        dump = {}
+        with ExitStack() as stack:
+            if mode == 'cprofile':
+                profiler = cProfile.Profile()
+                stack.callback(self.save_dump, dump, 'prof', profiler.dump_stats)
+                stack.callback(profiler.disable)
+                profiler.enable()
+            elif mode == 'stack':
+                sampler = StackSampler()
+                stack.callback(self.save_dump, dump, 'stacks', lambda path: _write(path, sampler.collapsed()))
+                stack.callback(sampler.stop)
+                sampler.start()
+
+            yield dump
+
+    @staticmethod
+    def save_dump(dump: dict, extension: str, write):
+        os.makedirs(settings.PROFILING_DUMP_DIR, exist_ok=True)
+        dump['file'] = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}.{extension}'
+        write(os.path.join(settings.PROFILING_DUMP_DIR, dump['file']))
+
+    @staticmethod
+    def emit(request, response, profile: RequestProfile, dump: dict):
+        resolver_match = request.resolver_match
+        logger.info(json.dumps({
+            'event': 'request_profile',
+            'method': request.method,
+            'path': request.path,
+            'view': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            **profile.as_dict(),
+            'dump': dump.get('file'),
+        }))
+        if dump:
+            response['X-Profile-Dump'] = dump['file']
+        return response
+
+
+class TrafficCaptureMiddleware:
+    """
+    Запись запросов к API в jsonl-файл TRAFFIC_CAPTURE_FILE для воспроизведения нагрузки (см. benchmarks.replay).
+    Включается TRAFFIC_CAPTURE=1, иначе django не подключает middleware (MiddlewareNotUsed).
+    Пишутся метод, путь, query string, тело запроса, время запроса, статус и время ответа, заголовки не пишутся.
+    Тело пишется только json-ом не больше TRAFFIC_CAPTURE_MAX_BODY байт, значения полей
+    TRAFFIC_CAPTURE_REDACT_FIELDS заменяются на "***"
+    """
+    sync_capable = True
+    async_capable = True
+
+    REDACTED = '***'
+
+    def __init__(self, get_response):
+        if not settings.TRAFFIC_CAPTURE:
+            raise MiddlewareNotUsed
+
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        record = self.start_record(request)
+        response = self.get_response(request)
+        self.finish_record(request, response, record)
+        return response
+
+    async def __acall__(self, request):
+        record = self.start_record(request)
+        response = await self.get_response(request)
+        self.finish_record(request, response, record)
+        return response
+
+    def start_record(self, request) -> dict:
+        """Тело читается до view: потоковая загрузка читает request.stream, после нее тела уже не получить"""
+        record = {
+            'ts': round(time.time(), 6),
+            'method': request.method,
+            'path': request.path,
+            'query': request.META.get('QUERY_STRING', ''),
+            'body': None,
+        }
+        body_size = int(request.META.get('CONTENT_LENGTH') or 0)
+        if body_size > settings.TRAFFIC_CAPTURE_MAX_BODY:
+            record['body_skipped'] = 'too_large'
+        elif body_size:
+            try:
+                record['body'] = self.sanitize(json.loads(request.body))
+            except ValueError:
+                record['body_skipped'] = 'not_json'
+        record['started'] = time.perf_counter()
+        return record
+
+    def finish_record(self, request, response, record: dict):
+        duration = time.perf_counter() - record.pop('started')
+        resolver_match = request.resolver_match
+        if resolver_match is None or resolver_match.namespace != 'main' or resolver_match.url_name == 'metrics':
+            return
+
+        record.update(
+            endpoint=resolver_match.url_name, status=response.status_code, duration_ms=round(duration * 1000, 3)
+        )
+        # O_APPEND и одна запись на строку: строки потоков и воркеров gunicorn не перемешиваются
+        fd = os.open(settings.TRAFFIC_CAPTURE_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record, ensure_ascii=False) + '\n').encode())
+        finally:
+            os.close(fd)
+
+    @classmethod
+    def sanitize(cls, data):
+        redact_fields = settings.TRAFFIC_CAPTURE_REDACT_FIELDS
+        if isinstance(data, dict):
+            return {key: cls.REDACTED if key in redact_fields else cls.sanitize(value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [cls.sanitize(value) for value in data]
+        return data
+
+
+def _write(path: str, content: str):
+    with open(path, 'w') as f:
+        f.write(content)
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.7 on 2026-10-18 02:25
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+from app.main.intervals import parse_time_intervals
+
+
+def fill_intervals_in_minutes(apps, schema_editor):
+    Courier = apps.get_model('main', 'Courier')
+    Order = apps.get_model('main', 'Order')
+
+    couriers = list(Courier.objects.only('id', 'working_hours'))
+    for courier in couriers:
+        courier.working_minutes = parse_time_intervals(courier.working_hours)
+    Courier.objects.bulk_update(couriers, ['working_minutes'], batch_size=1000)
+
+    orders = list(Order.objects.only('id', 'delivery_hours'))
+    for order in orders:
+        order.delivery_minutes = parse_time_intervals(order.delivery_hours)
+    Order.objects.bulk_update(orders, ['delivery_minutes'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_auto_20210328_1945'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courier',
+            name='working_minutes',
+            field=django.contrib.postgres.fields.ArrayField(base_field=django.contrib.postgres.fields.ArrayField(base_field=models.PositiveSmallIntegerField(), size=2), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_minutes',
+            field=django.contrib.postgres.fields.ArrayField(base_field=django.contrib.postgres.fields.ArrayField(base_field=models.PositiveSmallIntegerField(), size=2), blank=True, default=list, size=None),
+        ),
+        migrations.RunPython(fill_intervals_in_minutes, migrations.RunPython.noop),
+    ]
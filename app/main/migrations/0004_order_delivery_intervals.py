@@ -0,0 +1,44 @@
+# Generated by Django 3.1.7 on 2026-10-18 02:27
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+from psycopg2.extras import NumericRange
+
+
+def fill_order_delivery_intervals(apps, schema_editor):
+    Order = apps.get_model('main', 'Order')
+    OrderDeliveryInterval = apps.get_model('main', 'OrderDeliveryInterval')
+
+    OrderDeliveryInterval.objects.bulk_create(
+        [
+            OrderDeliveryInterval(order_id=order_id, minutes=NumericRange(start, end))
+            for order_id, delivery_minutes in Order.objects.values_list('id', 'delivery_minutes').iterator()
+            for start, end in delivery_minutes
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_intervals_in_minutes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDeliveryInterval',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minutes', django.contrib.postgres.fields.ranges.IntegerRangeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_ranges', to='main.order')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='orderdeliveryinterval',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['minutes'], name='order_delivery_minutes_gist'),
+        ),
+        migrations.RunPython(fill_order_delivery_intervals, migrations.RunPython.noop),
+    ]
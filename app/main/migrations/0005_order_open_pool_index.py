@@ -0,0 +1,33 @@
+# Generated by Django 3.1.7 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_order_delivery_intervals'),
+    ]
+
+    operations = [
+        # Django 3.1 не умеет INCLUDE в индексах, поэтому покрывающий индекс создается через RunSQL,
+        # а в состояние миграций попадает обычный частичный индекс
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX "order_open_pool_idx" ON "main_order" ("region_id", "weight") '
+                'INCLUDE ("id", "delivery_minutes") '
+                'WHERE ("assign_time" IS NULL AND "complete_time" IS NULL AND "courier_id" IS NULL)'
+            ),
+            reverse_sql='DROP INDEX IF EXISTS "order_open_pool_idx"',
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='order',
+                    index=models.Index(condition=models.Q(('assign_time__isnull', True), ('complete_time__isnull', True), ('courier__isnull', True)), fields=['region', 'weight'], name='order_open_pool_idx'),
+                ),
+            ]
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('assign_time__isnull', False), ('complete_time__isnull', True)), fields=['courier'], name='order_assigned_idx'),
+        ),
+    ]
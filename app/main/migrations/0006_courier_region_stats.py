@@ -0,0 +1,50 @@
+# Generated by Django 3.1.7 on 2026-10-18 02:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_order_open_pool_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierRegionStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed_orders_count', models.PositiveIntegerField(default=0)),
+                ('first_assign_time', models.DateTimeField(null=True)),
+                ('first_complete_time', models.DateTimeField(null=True)),
+                ('last_complete_time', models.DateTimeField(null=True)),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='region_stats', to='main.courier')),
+                ('region', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='couriers_stats', to='main.region')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='courierregionstats',
+            constraint=models.UniqueConstraint(fields=('courier', 'region'), name='courier_region_stats_unique'),
+        ),
+        # заполнение статистики по уже выполненным заказам (то же самое делает команда backfill_courier_stats)
+        migrations.RunSQL(
+            sql='''
+                INSERT INTO main_courierregionstats (
+                    courier_id, region_id, completed_orders_count,
+                    first_assign_time, first_complete_time, last_complete_time
+                )
+                SELECT
+                    courier_id,
+                    region_id,
+                    count(*),
+                    (array_agg(assign_time ORDER BY complete_time, assign_time))[1],
+                    min(complete_time),
+                    max(complete_time)
+                FROM main_order
+                WHERE courier_id IS NOT NULL AND assign_time IS NOT NULL AND complete_time IS NOT NULL
+                GROUP BY courier_id, region_id
+            ''',
+            reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.7 on 2026-10-18 02:58
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_courier_region_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courier',
+            name='region_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        # заполнение районов уже существующих курьеров из связи regions
+        migrations.RunSQL(
+            sql='''
+                UPDATE main_courier
+                SET region_ids = courier_regions.region_ids
+                FROM (
+                    SELECT courier_id, array_agg(DISTINCT region_id ORDER BY region_id) AS region_ids
+                    FROM main_region_m2m_courier
+                    GROUP BY courier_id
+                ) courier_regions
+                WHERE courier_regions.courier_id = main_courier.id
+            ''',
+            reverse_sql=migrations.RunSQL.noop
+        ),
+        migrations.AddIndex(
+            model_name='courier',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['region_ids'], name='courier_region_ids_gin'),
+        ),
+    ]
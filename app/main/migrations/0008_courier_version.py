@@ -0,0 +1,23 @@
+# Generated by Django 3.1.7 on 2026-10-18 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_courier_region_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courier',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        # default на стороне базы для вставок мимо ORM (COPY при потоковой загрузке)
+        migrations.RunSQL(
+            sql='ALTER TABLE main_courier ALTER COLUMN version SET DEFAULT 1',
+            reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
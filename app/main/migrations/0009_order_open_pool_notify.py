@@ -0,0 +1,105 @@
+from django.db import migrations
+
+
+# Уведомления об изменениях свободных заказов для кеша app.main.order_pool (канал main_open_orders).
+# Триггеры уровня выражения с transition tables: одна загрузка, назначение или снятие заказов - несколько
+# уведомлений на выражение, а не на каждую строку. NOTIFY доставляется слушателям только после коммита
+#   - reload: в районах появились или изменились свободные заказы (создание, снятие с курьера)
+#   - remove: заказы перестали быть свободными (назначение, выполнение, удаление), по 500 id на уведомление
+#   - reset: таблица заказов очищена (TRUNCATE)
+NOTIFY_FUNCTION_SQL = '''
+CREATE FUNCTION main_order_notify_open_pool() RETURNS trigger AS $$
+DECLARE
+    payload text;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('main_open_orders', '{"op": "reset"}');
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        SELECT json_build_object('op', 'reload', 'regions', array_agg(DISTINCT region_id))::text INTO payload
+        FROM new_rows
+        WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+        HAVING count(*) > 0;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT json_build_object('op', 'reload', 'regions', array_agg(DISTINCT n.region_id))::text INTO payload
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE n.courier_id IS NULL AND n.assign_time IS NULL AND n.complete_time IS NULL
+          AND (
+              o.courier_id IS NOT NULL OR o.assign_time IS NOT NULL OR o.complete_time IS NOT NULL
+              OR o.region_id IS DISTINCT FROM n.region_id OR o.weight <> n.weight
+              OR o.delivery_minutes IS DISTINCT FROM n.delivery_minutes
+          )
+        HAVING count(*) > 0;
+    END IF;
+    IF payload IS NOT NULL THEN
+        PERFORM pg_notify('main_open_orders', payload);
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'remove', 'ids', array_agg(id))::text
+            FROM (
+                SELECT o.id, (row_number() OVER (ORDER BY o.id) - 1) / 500 AS chunk
+                FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE o.courier_id IS NULL AND o.assign_time IS NULL AND o.complete_time IS NULL
+                  AND (
+                      n.courier_id IS NOT NULL OR n.assign_time IS NOT NULL OR n.complete_time IS NOT NULL
+                      OR n.region_id IS DISTINCT FROM o.region_id
+                  )
+            ) removed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    ELSIF TG_OP = 'DELETE' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'remove', 'ids', array_agg(id))::text
+            FROM (
+                SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500 AS chunk
+                FROM old_rows
+                WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+            ) removed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+TRIGGERS_SQL = '''
+CREATE TRIGGER main_order_open_pool_insert AFTER INSERT ON main_order
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+CREATE TRIGGER main_order_open_pool_update AFTER UPDATE ON main_order
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+CREATE TRIGGER main_order_open_pool_delete AFTER DELETE ON main_order
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+CREATE TRIGGER main_order_open_pool_truncate AFTER TRUNCATE ON main_order
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+'''
+
+DROP_SQL = '''
+DROP TRIGGER main_order_open_pool_insert ON main_order;
+DROP TRIGGER main_order_open_pool_update ON main_order;
+DROP TRIGGER main_order_open_pool_delete ON main_order;
+DROP TRIGGER main_order_open_pool_truncate ON main_order;
+DROP FUNCTION main_order_notify_open_pool();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_courier_version'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=NOTIFY_FUNCTION_SQL + TRIGGERS_SQL, reverse_sql=DROP_SQL),
+    ]
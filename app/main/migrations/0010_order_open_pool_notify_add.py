@@ -0,0 +1,108 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+# Новые свободные заказы приходят в кеш app.main.order_pool самими строками, а не перечитыванием районов:
+#   - add: новые свободные заказы [[id, район, вес, промежутки доставки], ...] пачками, чтобы уведомление
+#     не превысило ограничение NOTIFY в 8000 байт (строки короче 3500 байт, пачка - не больше 7000 байт строк)
+#   - reload: районы заказов, строка которых сама не помещается в пачку, и районы, где свободные заказы
+#     появились или изменились при обновлении (снятие с курьера)
+# remove и reset - как в 0009_order_open_pool_notify
+NOTIFY_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION main_order_notify_open_pool() RETURNS trigger AS $$
+DECLARE
+    payload text;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('main_open_orders', '{"op": "reset"}');
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'add', 'orders', json_agg(order_row ORDER BY id))::text
+            FROM (
+                SELECT id, order_row, sum(octet_length(order_row::text) + 1) OVER (ORDER BY id) / 3500 AS chunk
+                FROM (
+                    SELECT id, json_build_array(id, region_id, weight, delivery_minutes) AS order_row
+                    FROM new_rows
+                    WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+                ) order_rows
+                WHERE octet_length(order_row::text) < 3500
+            ) added
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+
+        SELECT json_build_object('op', 'reload', 'regions', array_agg(DISTINCT region_id))::text INTO payload
+        FROM new_rows
+        WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+          AND octet_length(json_build_array(id, region_id, weight, delivery_minutes)::text) >= 3500
+        HAVING count(*) > 0;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT json_build_object('op', 'reload', 'regions', array_agg(DISTINCT n.region_id))::text INTO payload
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE n.courier_id IS NULL AND n.assign_time IS NULL AND n.complete_time IS NULL
+          AND (
+              o.courier_id IS NOT NULL OR o.assign_time IS NOT NULL OR o.complete_time IS NOT NULL
+              OR o.region_id IS DISTINCT FROM n.region_id OR o.weight <> n.weight
+              OR o.delivery_minutes IS DISTINCT FROM n.delivery_minutes
+          )
+        HAVING count(*) > 0;
+    END IF;
+    IF payload IS NOT NULL THEN
+        PERFORM pg_notify('main_open_orders', payload);
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'remove', 'ids', array_agg(id))::text
+            FROM (
+                SELECT o.id, (row_number() OVER (ORDER BY o.id) - 1) / 500 AS chunk
+                FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE o.courier_id IS NULL AND o.assign_time IS NULL AND o.complete_time IS NULL
+                  AND (
+                      n.courier_id IS NOT NULL OR n.assign_time IS NOT NULL OR n.complete_time IS NOT NULL
+                      OR n.region_id IS DISTINCT FROM o.region_id
+                  )
+            ) removed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    ELSIF TG_OP = 'DELETE' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'remove', 'ids', array_agg(id))::text
+            FROM (
+                SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500 AS chunk
+                FROM old_rows
+                WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+            ) removed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+# имя модуля миграции начинается с цифры, поэтому он импортируется через import_module
+previous_migration = import_module('app.main.migrations.0009_order_open_pool_notify')
+PREVIOUS_NOTIFY_FUNCTION_SQL = previous_migration.NOTIFY_FUNCTION_SQL.replace(
+    'CREATE FUNCTION', 'CREATE OR REPLACE FUNCTION'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_order_open_pool_notify'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=NOTIFY_FUNCTION_SQL, reverse_sql=PREVIOUS_NOTIFY_FUNCTION_SQL),
+    ]
@@ -0,0 +1,27 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+# Триггеры уведомлений для кеша свободных заказов замедляют загрузку и массовое обновление заказов даже без кеша,
+# поэтому они удаляются и ставятся только вместе с включением кеша: manage.py order_pool_triggers install.
+# Функция main_order_notify_open_pool остается
+previous_migration = import_module('app.main.migrations.0009_order_open_pool_notify')
+
+DROP_TRIGGERS_SQL = '''
+DROP TRIGGER IF EXISTS main_order_open_pool_insert ON main_order;
+DROP TRIGGER IF EXISTS main_order_open_pool_update ON main_order;
+DROP TRIGGER IF EXISTS main_order_open_pool_delete ON main_order;
+DROP TRIGGER IF EXISTS main_order_open_pool_truncate ON main_order;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_order_open_pool_notify_add'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=DROP_TRIGGERS_SQL, reverse_sql=DROP_TRIGGERS_SQL + previous_migration.TRIGGERS_SQL),
+    ]
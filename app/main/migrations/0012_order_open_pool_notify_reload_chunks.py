@@ -0,0 +1,120 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+# reload тоже отправляется пачками по 500 районов, как remove: уведомление про обновление или загрузку заказов
+# многих районов превышало ограничение NOTIFY в 8000 байт, и pg_notify отменял само изменение заказов.
+# Остальные уведомления - как в 0010_order_open_pool_notify_add
+NOTIFY_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION main_order_notify_open_pool() RETURNS trigger AS $$
+DECLARE
+    payload text;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('main_open_orders', '{"op": "reset"}');
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'add', 'orders', json_agg(order_row ORDER BY id))::text
+            FROM (
+                SELECT id, order_row, sum(octet_length(order_row::text) + 1) OVER (ORDER BY id) / 3500 AS chunk
+                FROM (
+                    SELECT id, json_build_array(id, region_id, weight, delivery_minutes) AS order_row
+                    FROM new_rows
+                    WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+                ) order_rows
+                WHERE octet_length(order_row::text) < 3500
+            ) added
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+
+        FOR payload IN
+            SELECT json_build_object('op', 'reload', 'regions', array_agg(region_id))::text
+            FROM (
+                SELECT region_id, (row_number() OVER (ORDER BY region_id) - 1) / 500 AS chunk
+                FROM (
+                    SELECT DISTINCT region_id
+                    FROM new_rows
+                    WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+                      AND octet_length(json_build_array(id, region_id, weight, delivery_minutes)::text) >= 3500
+                ) regions
+            ) reloaded
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    ELSIF TG_OP = 'UPDATE' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'reload', 'regions', array_agg(region_id))::text
+            FROM (
+                SELECT region_id, (row_number() OVER (ORDER BY region_id) - 1) / 500 AS chunk
+                FROM (
+                    SELECT DISTINCT n.region_id
+                    FROM old_rows o JOIN new_rows n ON n.id = o.id
+                    WHERE n.courier_id IS NULL AND n.assign_time IS NULL AND n.complete_time IS NULL
+                      AND (
+                          o.courier_id IS NOT NULL OR o.assign_time IS NOT NULL OR o.complete_time IS NOT NULL
+                          OR o.region_id IS DISTINCT FROM n.region_id OR o.weight <> n.weight
+                          OR o.delivery_minutes IS DISTINCT FROM n.delivery_minutes
+                      )
+                ) regions
+            ) reloaded
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'remove', 'ids', array_agg(id))::text
+            FROM (
+                SELECT o.id, (row_number() OVER (ORDER BY o.id) - 1) / 500 AS chunk
+                FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE o.courier_id IS NULL AND o.assign_time IS NULL AND o.complete_time IS NULL
+                  AND (
+                      n.courier_id IS NOT NULL OR n.assign_time IS NOT NULL OR n.complete_time IS NOT NULL
+                      OR n.region_id IS DISTINCT FROM o.region_id
+                  )
+            ) removed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    ELSIF TG_OP = 'DELETE' THEN
+        FOR payload IN
+            SELECT json_build_object('op', 'remove', 'ids', array_agg(id))::text
+            FROM (
+                SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500 AS chunk
+                FROM old_rows
+                WHERE courier_id IS NULL AND assign_time IS NULL AND complete_time IS NULL
+            ) removed
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('main_open_orders', payload);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+'''
+
+
+# имя модуля миграции начинается с цифры, поэтому он импортируется через import_module
+previous_migration = import_module('app.main.migrations.0010_order_open_pool_notify_add')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_order_open_pool_triggers_optional'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=NOTIFY_FUNCTION_SQL, reverse_sql=previous_migration.NOTIFY_FUNCTION_SQL),
+    ]
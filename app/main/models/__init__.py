@@ -1,12 +1,14 @@
 from .courier import *
 from .order import *
 from .enums import *
+from .stats import *
 
 
 __all__ = [
     *courier.__all__,
     *order.__all__,
     *enums.__all__,
+    *stats.__all__,
 ]
 
 assert len(__all__) == len(set(__all__)), 'found duplicates in models'
@@ -1,35 +1,38 @@
 import logging
-import operator
+import math
 
-from collections import namedtuple
 from itertools import groupby
 from typing import (
-    Iterable, List, Dict
+    Any, Iterable, List, Dict, Optional, Set, Tuple
 )
 from datetime import datetime
 
-from django.db import models
+from django.conf import settings
+from django.db import connection, models, transaction
 from django.contrib.postgres.fields import ArrayField
-from django.db.models import Subquery
-
-from datetimerange import DateTimeRange
-
-from ..utils import (
-    cast_hours_to_objects, remove_time_intervals_over_current_time
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import Exists, OuterRef, Q
+from django.utils.functional import cached_property
+from psycopg2.extras import NumericRange
+
+from ..courier_cache import set_courier_versions
+from ..intervals import (
+    is_overlap, minute_of_day, remove_expired_intervals, to_bitmap
 )
+from ..metrics import CANDIDATE_POOL_SIZE, SELECTED_ORDERS
+from ..packing import greedy_pack, optimal_pack, to_weight_units
+from ..profiling import stage, timed
 from .enums import (
-    CourierEarningCoefficient, CourierType
+    CourierEarningCoefficient, CourierType, OrdersEngine, PackingMode
 )
-from .order import Order
+from .order import Order, OrderDeliveryInterval
+from ..order_pool import get_index as get_open_orders_index
+from ..vectorized import OrderColumns, pack_orders
 
 logger = logging.getLogger(__name__)
 
 
-__all__ = ['Courier', 'Region', 'OrderDeliveryHours', 'CourierWorkingHours']
-
-
-OrderDeliveryHours = namedtuple('OrderDeliveryHours', 'start end')
-CourierWorkingHours = namedtuple('CourierWorkingHours', 'start end')
+__all__ = ['Courier', 'Region']
 
 
 class Courier(models.Model):
@@ -38,9 +41,23 @@ class Courier(models.Model):
     Attributes:
         courier_type - тип курьера. Возможные значения: foot, bike, car
         working_hours  - график работы курьера (массив строк: [HH:MM-HH:MM, ...])
+        working_minutes - график работы курьера в минутах от начала суток,
+                          отсортированный и без пересечений (массив пар: [[start, end], ...])
+        region_ids - id районов курьера (отсортированный массив без повторов). Денормализация связи regions,
+                     которая поддерживается сериализаторами создания и обновления курьера
+        version - версия данных курьера для кеша GET /couriers/<id> (см. bump_versions)
     """
     courier_type = models.CharField(max_length=4)
     working_hours = ArrayField(models.CharField(max_length=11), blank=True, default=list)
+    working_minutes = ArrayField(ArrayField(models.PositiveSmallIntegerField(), size=2), blank=True, default=list)
+    region_ids = ArrayField(models.IntegerField(), blank=True, default=list)
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            # поиск курьеров района: Courier.get_region_couriers
+            GinIndex(fields=['region_ids'], name='courier_region_ids_gin'),
+        ]
 
     def __str__(self):
         return f'[pk: {self.pk}] [courier_type: {self.courier_type}] [working_hours: {self.working_hours}]'
@@ -54,8 +71,32 @@ class Courier(models.Model):
         где t - минимальное из средних времен доставки по районам (в секундах), t = min(td[1], td[2], ..., td[n])
         td[i] - среднее время доставки заказов по району i (в секундах)
         """
-        min_average_time_by_regions = min(self.get_average_delivery_times_by_region())
-        result = (60 * 60 - min(min_average_time_by_regions, 60 * 60)) / (60 * 60) * 5
+        return self.calculate_rating(
+            min(stats.average_delivery_time for stats in self.completed_orders_stats)
+        )
+
+    @classmethod
+    def bump_versions(cls, courier_ids: Optional[List[int]]):
+        """
+        Увеличивает версию курьеров (None - всех курьеров), после коммита записывает новые версии в кеш.
+        Вызывается в транзакции каждого изменения, от которого зависит ответ GET /couriers/<id>
+        (обновление курьера, назначение и выполнение заказов, пересчет статистики)
+        """
+        sql = f'UPDATE {cls._meta.db_table} SET version = version + 1'
+        params = []
+        if courier_ids is not None:
+            sql += ' WHERE id = ANY(%s)'
+            params.append(list(courier_ids))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql + ' RETURNING id, version', params)
+            versions = dict(cursor.fetchall())
+        transaction.on_commit(lambda: set_courier_versions(versions))
+
+    @staticmethod
+    def calculate_rating(min_average_delivery_time: float) -> float:
+        """Рассчитывает рейтинг по минимальному из средних времен доставки по районам (в секундах)"""
+        result = (60 * 60 - min(min_average_delivery_time, 60 * 60)) / (60 * 60) * 5
         return round(result, 2)
 
     @property
@@ -66,44 +107,77 @@ class Courier(models.Model):
         sum = ∑(500 * C) ,
         C — коэффициент, зависящий от типа курьера (пеший — 2, велокурьер — 5, авто — 9) на момент формирования развоза
         """
-        self.get_completed_orders().count()
-        return 500 * self.get_completed_orders().count() * getattr(CourierEarningCoefficient, self.courier_type)
+        completed_orders_count = sum(stats.completed_orders_count for stats in self.completed_orders_stats)
+        return self.calculate_earnings(completed_orders_count, self.courier_type)
 
     @staticmethod
-    def get_orders_delivery_times(orders: Iterable['Order']) -> List[float]:
+    def calculate_earnings(completed_orders_count: int, courier_type: str) -> int:
+        """Рассчитывает заработок курьера по количеству выполненных заказов"""
+        return 500 * completed_orders_count * getattr(CourierEarningCoefficient, courier_type)
+
+    @classmethod
+    def get_leaderboard(cls, region_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        Рассчитывает вреия доставки всех заказов курьера.
-        Время доставки одного заказа определяется как разница между временем окончания этого заказа
-        и временем окончания предыдущего заказа
-        (или временем назначения заказов, если вычисляется время для первого заказа)
+        Возвращает курьеров с выполненными заказами, отсортированных по убыванию рейтинга, одним запросом.
+        Время доставки каждого заказа считается оконной функцией LAG() по истории выполненных заказов курьера в районе
+        (в том же порядке, что и в CourierRegionStats), а рейтинг и заработок - теми же calculate_rating
+        и calculate_earnings, что и в Courier.rating и Courier.earnings.
+        Если задан region_id, то в рейтинг попадают только курьеры, выполнявшие заказы в этом районе
         """
-        complete_times = [
-            order.complete_time
-            for order in sorted(orders, key=lambda x: x.complete_time, reverse=True)
-        ]
-        # добавляем время назначения первого заказа
-        complete_times.append(orders[-1].assign_time)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH deliveries AS (
+                    SELECT
+                        courier_id,
+                        region_id,
+                        complete_time - coalesce(lag(complete_time) OVER region_orders, assign_time) AS delivery_time
+                    FROM {Order._meta.db_table}
+                    WHERE courier_id IS NOT NULL AND assign_time IS NOT NULL AND complete_time IS NOT NULL
+                    WINDOW region_orders AS (PARTITION BY courier_id, region_id ORDER BY complete_time, assign_time)
+                ), regions AS (
+                    SELECT
+                        courier_id,
+                        region_id,
+                        count(*) AS completed_orders_count,
+                        extract(epoch FROM sum(delivery_time)) AS delivery_seconds,
+                        extract(epoch FROM sum(delivery_time)) / count(*) AS average_delivery_time
+                    FROM deliveries
+                    GROUP BY courier_id, region_id
+                )
+                SELECT
+                    regions.courier_id,
+                    courier.courier_type,
+                    sum(regions.completed_orders_count),
+                    (array_agg(regions.delivery_seconds ORDER BY regions.average_delivery_time))[1],
+                    (array_agg(regions.completed_orders_count ORDER BY regions.average_delivery_time))[1]
+                FROM regions
+                JOIN {cls._meta.db_table} courier ON courier.id = regions.courier_id
+                GROUP BY regions.courier_id, courier.courier_type
+                HAVING %(region_id)s IS NULL OR bool_or(regions.region_id = %(region_id)s)
+                ORDER BY min(regions.average_delivery_time), regions.courier_id
+                LIMIT %(limit)s
+                ''',
+                {'region_id': region_id, 'limit': limit}
+            )
+            rows = cursor.fetchall()
 
+        # среднее время считается в python так же, как в CourierRegionStats.average_delivery_time,
+        # чтобы рейтинг совпадал с Courier.rating до последнего знака
         return [
-            delivery_time.total_seconds()
-            for delivery_time in map(
-                lambda x: operator.sub(*x),
-                zip(complete_times[:-1], complete_times[1:])
-            )
+            {
+                'courier_id': courier_id,
+                'courier_type': courier_type,
+                'rating': cls.calculate_rating(float(delivery_seconds) / region_orders_count),
+                'earnings': cls.calculate_earnings(completed_orders_count, courier_type),
+            }
+            for courier_id, courier_type, completed_orders_count, delivery_seconds, region_orders_count in rows
         ]
 
-    def get_average_delivery_times_by_region(self) -> List[float]:
-        """Рассчитывает среднее время доставки (в секундах) заказов по всем районам, в которых работает курьер"""
-        result = []
-        orders_by_region = self._group_orders_by_region(
-            data=self.get_completed_orders()
-        )
-        for _, orders in orders_by_region.items():
-            orders_delivery_times = self.get_orders_delivery_times(orders)
-            result.append(
-                    sum(orders_delivery_times)/len(orders_delivery_times)
-            )
-        return result
+    @cached_property
+    def completed_orders_stats(self) -> List['CourierRegionStats']:
+        """Накопленная статистика выполненных заказов курьера по районам (см. CourierRegionStats)"""
+        return list(self.region_stats.filter(completed_orders_count__gt=0))
 
     @property
     def max_weight(self) -> int:
@@ -112,8 +186,9 @@ class Courier(models.Model):
 
     def has_valid_working_hours(self, today: datetime) -> bool:
         """Проверяет, может ли курьер в принципе выйти на работу"""
-        remove_time_intervals_over_current_time(self, 'working_hours', today=today)
-        return True if self.working_hours else False
+        self.working_intervals = remove_expired_intervals(self.working_minutes, today)
+        self.working_bitmap = to_bitmap(self.working_intervals)
+        return True if self.working_intervals else False
 
     @staticmethod
     def _group_orders_by_region(data: Iterable['Order'], key_func=lambda x: x.region_id) -> Dict[int, List['Order']]:
@@ -124,85 +199,305 @@ class Courier(models.Model):
             groped_orders[key] = list(group)
         return groped_orders
 
-    def _get_ini_orders(self) -> Iterable['Order']:
-        """Получает начальные заказы для курьера, которые подходят по весу и району"""
+    def _get_working_ranges(self, today: datetime) -> List[NumericRange]:
+        """
+        Возвращает оставшиеся на сегодня рабочие часы курьера в виде int4range.
+        Начало каждого промежутка сдвигается на текущую минуту, поэтому пересечение с такими промежутками
+        означает, что промежуток доставки заказа еще не закончился и пересекается с рабочими часами курьера
+        """
+        current_minute = math.floor(minute_of_day(today))
+        return [
+            NumericRange(max(start, current_minute), end)
+            for start, end in self.working_intervals
+        ]
+
+    def _get_ini_orders(self, today: datetime) -> Iterable['Order']:
+        """
+        Получает начальные заказы для курьера, которые подходят по весу и району,
+        и у которых есть еще не закончившийся промежуток доставки, пересекающийся с рабочими часами курьера
+        """
+        overlap_condition = Q()
+        for working_range in self._get_working_ranges(today):
+            overlap_condition |= Q(minutes__overlap=working_range)
+
         return (
-            Order.objects
-            .filter(region_id__in=Subquery(self.regions.values('id')))
+            self._get_open_orders()
+            .filter(region_id__in=self.region_ids)
             .filter(weight__lte=self.max_weight)
+            .filter(
+                Exists(
+                    OrderDeliveryInterval.objects
+                    .filter(order_id=OuterRef('pk'))
+                    .filter(overlap_condition)
+                )
+            )
+        )
+
+    def _get_cached_ini_orders(self, today: datetime) -> Optional[List['Order']]:
+        """
+        То же, что и _get_ini_orders, но из кеша свободных заказов процесса (см. app.main.order_pool).
+        None - кеш недоступен, заказы нужно выбирать из базы
+        """
+        candidates = get_open_orders_index().candidates(self.region_ids, self.max_weight)
+        if candidates is None:
+            return None
+
+        # то же условие, что и пересечение int4range в _get_ini_orders, но по битовым маскам
+        working_bitmap = to_bitmap(
+            [working_range.lower, working_range.upper] for working_range in self._get_working_ranges(today)
+        )
+        return [
+            order for order in candidates
+            if is_overlap(working_bitmap, to_bitmap(order.delivery_minutes))
+        ]
+
+    @staticmethod
+    def _get_open_orders():
+        """Возвращает свободные (не назначенные и не выполненные) заказы"""
+        return (
+            Order.objects
             .filter(courier_id__isnull=True)
             .filter(complete_time__isnull=True)
             .filter(assign_time__isnull=True)
+            # достаточно полей, которые покрывает индекс order_open_pool_idx
+            .only('id', 'region_id', 'weight', 'delivery_minutes')
         )
 
-    def _is_working_hours_overlap(self, delivery_hours: Iterable['OrderDeliveryHours']) -> bool:
-        """Проверяет пересечение рабочих часов курьера с часами доставки заказов"""
-        for order_interval in delivery_hours:
-            for courier_interval in self.working_hours:
-                courier_time = DateTimeRange(courier_interval.start, courier_interval.end)
-                order_time = DateTimeRange(order_interval.start, order_interval.end)
-                time_delta = courier_time.intersection(order_time)
-
-                # т.е.проверяем существует ли пересечение в принципе
-                if time_delta.is_valid_timerange():
-                    # подходит только, если промежутки пересекаются хотя бы на 1 секунду
-                    # например: {9:00-18:00} & {18:00-19:00} -> не подходит, {9:00-18:01} & {18:00-19:00} -> подходит
-                    if time_delta.timedelta.seconds:
-                        return True
-        return False
-
-    def get_orders_to_unassign(self, today: datetime) -> Iterable['Order']:
-        """Возвращает заказы, которые необходимо снять с курьера, вследствие изменения его атрибутов"""
-        result = []
-        current_assigned_orders = self.get_assigned_orders()
-        cast_hours_to_objects(self, 'working_hours', CourierWorkingHours, today)
-
-        if self.working_hours[-1].end.time() < today.time():
-            # т.е. рабочий день курьера уэе закончился
-            return current_assigned_orders.all()
-
-        orders_not_passed_by_weight = (
-            current_assigned_orders
-            .filter(weight__gt=self.max_weight)
-        )
-        result.extend(orders_not_passed_by_weight.all())
+    def _is_working_hours_overlap(self, delivery_intervals: Iterable[List[int]]) -> bool:
+        """
+        Проверяет пересечение рабочих часов курьера (working_bitmap) с часами доставки заказа.
+        Подходит только, если промежутки пересекаются хотя бы на 1 минуту
+        например: {9:00-18:00} & {18:00-19:00} -> не подходит, {9:00-18:01} & {18:00-19:00} -> подходит
+        """
+        return is_overlap(self.working_bitmap, to_bitmap(delivery_intervals))
 
-        for order in current_assigned_orders.all():
-            # костыль, который связан с отсутствием поддержки not in lookup в django orm
-            if order.region_id not in self.regions.values_list('id', flat=True) and order not in result:
-                result.append(order)
+    def get_orders_to_unassign(self, today: datetime) -> List['Order']:
+        """
+        Возвращает заказы, которые необходимо снять с курьера, вследствие изменения его атрибутов.
+        Назначенные заказы читаются из базы одним запросом, районы берутся из region_ids, остальные проверки - в памяти
+        """
+        assigned_orders = list(self.get_assigned_orders())
+        if not assigned_orders:
+            return []
+
+        if not self.working_minutes or self.working_minutes[-1][1] < minute_of_day(today):
+            # т.е. рабочий день курьера уже закончился
+            return assigned_orders
 
-        if current_assigned_orders:
-            for order in current_assigned_orders.all():
-                cast_hours_to_objects(order, 'delivery_hours', OrderDeliveryHours, today)
-                if not self._is_working_hours_overlap(order.delivery_hours):
-                    result.append(order)
-        return result
+        self.working_bitmap = to_bitmap(self.working_minutes)
+        region_ids = set(self.region_ids)
+        return [
+            order
+            for order in assigned_orders
+            if order.weight > self.max_weight
+            or order.region_id not in region_ids
+            or not self._is_working_hours_overlap(order.delivery_minutes)
+        ]
 
-    def get_suitable_orders(self, today: datetime) -> Iterable['Order']:
+    def get_suitable_orders(self, today: datetime, packing_mode: str = None) -> Iterable['Order']:
         """Возвращает подходящие для курьера заказы в зависимости от веса, района и времени доставки"""
         result = list(self.get_assigned_orders().all())
-        if not self.working_hours:
+        if not self.working_minutes:
             return result
 
-        cast_hours_to_objects(self, 'working_hours', CourierWorkingHours, today)
-
         # если рабочий день курьера закончился, то возвращаем []
         if not self.has_valid_working_hours(today):
             return result
 
-        ini_orders = self._get_ini_orders()
-        for order in ini_orders:
-            cast_hours_to_objects(order, 'delivery_hours', OrderDeliveryHours, today)
+        if settings.ORDERS_ENGINE == OrdersEngine.numpy.name:
+            return self._get_suitable_orders_vectorized(today, result, packing_mode)
+
+        with stage('candidate_fetch'):
+            ini_orders = self._get_cached_ini_orders(today) if settings.ORDER_POOL_CACHE else None
+            if ini_orders is None:
+                ini_orders = self._get_ini_orders(today)
+            filtered_orders = [
+                order for order in ini_orders
+                if order.is_possible_to_deliver(today)
+            ]
+        CANDIDATE_POOL_SIZE.observe(len(filtered_orders))
+
+        assigned_orders = result
+        while True:
+            result = list(assigned_orders)
+            grouped_orders = self._group_orders_by_region(filtered_orders)
+            self.add_order(grouped_orders, result, today, packing_mode=packing_mode)
+
+            new_orders = result[len(assigned_orders):]
+            lost_orders_ids = {order.pk for order in new_orders} - self._lock_orders(new_orders)
+            if not lost_orders_ids:
+                SELECTED_ORDERS.observe(len(new_orders))
+                return result
+
+            # заказы уже забрал параллельный запрос - подбираем замену из оставшихся
+            filtered_orders = [order for order in filtered_orders if order.pk not in lost_orders_ids]
+
+    def _get_suitable_orders_vectorized(
+            self,
+            today: datetime,
+            assigned_orders: List['Order'],
+            packing_mode: str = None
+    ) -> List['Order']:
+        """
+        То же, что и get_suitable_orders, но заказы-кандидаты загружаются столбцами без создания объектов Order,
+        а проверки и упаковка считаются векторно (см. app.main.vectorized). Результат совпадает с add_order
+        """
+        with stage('candidate_fetch'):
+            ini_orders = self._get_cached_ini_orders(today) if settings.ORDER_POOL_CACHE else None
+            if ini_orders is None:
+                rows = self._get_ini_orders(today).values_list('id', 'region_id', 'weight', 'delivery_minutes')
+            else:
+                rows = [(order.id, order.region_id, order.weight, order.delivery_minutes) for order in ini_orders]
+            columns = OrderColumns.from_rows(rows).possible_to_deliver(today)
+        CANDIDATE_POOL_SIZE.observe(len(columns))
+
+        space_left = to_weight_units(self.max_weight - sum([order.weight for order in assigned_orders]))
+        while True:
+            with stage('packing'):
+                packed = pack_orders(
+                    columns, self.working_intervals, space_left, packing_mode or settings.ORDERS_PACKING_MODE
+                )
+            new_orders = columns.to_orders(packed, today)
+
+            lost_orders_ids = {order.pk for order in new_orders} - self._lock_orders(new_orders)
+            if not lost_orders_ids:
+                SELECTED_ORDERS.observe(len(new_orders))
+                return assigned_orders + new_orders
+
+            # заказы уже забрал параллельный запрос - подбираем замену из оставшихся
+            columns = columns.exclude(lost_orders_ids)
+
+    @classmethod
+    def get_suitable_orders_batch(
+            cls,
+            couriers: List['Courier'],
+            today: datetime,
+            packing_mode: str = None
+    ) -> Dict[int, List['Order']]:
+        """
+        Пакетный вариант get_suitable_orders: возвращает подходящие заказы для каждого курьера (по id курьера).
+        Свободные заказы всех районов курьеров загружаются одним запросом, после чего курьеры по очереди
+        (в порядке couriers) набирают заказы из общего пула. Для каждого курьера результат такой же, как если бы
+        get_suitable_orders вызывался для курьеров по очереди
+        """
+        couriers_ids = [courier.pk for courier in couriers]
 
-        filtered_orders = [
-            order for order in ini_orders
-            if order.is_possible_to_deliver(today)
+        assigned_orders = {}
+        for order in (
+            Order.objects
+            .filter(courier_id__in=couriers_ids)
+            .filter(assign_time__isnull=False)
+            .filter(complete_time__isnull=True)
+        ):
+            assigned_orders.setdefault(order.courier_id, []).append(order)
+
+        working_couriers = [
+            courier for courier in couriers
+            if courier.working_minutes and courier.has_valid_working_hours(today)
         ]
+        working_couriers_ids = {courier.pk for courier in working_couriers}
+        if not working_couriers:
+            return {courier.pk: assigned_orders.get(courier.pk, []) for courier in couriers}
+
+        with stage('candidate_fetch'):
+            pool = [order for order in cls._get_pool(working_couriers, today) if order.is_possible_to_deliver(today)]
 
-        grouped_orders = self._group_orders_by_region(filtered_orders)
-        self.add_order(grouped_orders, result, today)
-        return result
+        while True:
+            result, new_orders = cls._distribute_pool(
+                couriers, assigned_orders, working_couriers_ids, pool, today, packing_mode=packing_mode
+            )
+
+            lost_orders_ids = {order.pk for order in new_orders} - cls._lock_orders(new_orders)
+            if not lost_orders_ids:
+                return result
+
+            # заказы уже забрал параллельный запрос - перераспределяем оставшиеся
+            pool = [order for order in pool if order.pk not in lost_orders_ids]
+
+    @classmethod
+    def _get_pool(cls, couriers: List['Courier'], today: datetime):
+        """
+        Свободные заказы районов курьеров couriers, которые по весу подходят хотя бы одному из них
+        и у которых есть еще не закончившийся промежуток доставки
+        """
+        current_minute = math.floor(minute_of_day(today))
+        return (
+            cls._get_open_orders()
+            .filter(region_id__in=set().union(*(courier.region_ids for courier in couriers)))
+            .filter(weight__lte=max(courier.max_weight for courier in couriers))
+            .filter(
+                Exists(
+                    OrderDeliveryInterval.objects
+                    .filter(order_id=OuterRef('pk'))
+                    .filter(minutes__endswith__gt=current_minute)
+                )
+            )
+        )
+
+    @classmethod
+    def _distribute_pool(
+            cls,
+            couriers: List['Courier'],
+            assigned_orders: Dict[int, List['Order']],
+            working_couriers_ids: Set[int],
+            pool: List['Order'],
+            today: datetime,
+            packing_mode: str = None
+    ) -> Tuple[Dict[int, List['Order']], List['Order']]:
+        """
+        Курьеры по очереди (в порядке couriers) набирают заказы из пула через add_order.
+        Возвращает заказы каждого курьера (уже назначенные и новые) и все новые заказы.
+        Курьеры из working_couriers_ids должны быть проверены через has_valid_working_hours, остальные заказов не набирают
+        """
+        # кандидаты курьера группируются по району в add_order, поэтому их можно собирать по районам
+        pool_by_region = cls._group_orders_by_region(pool)
+
+        result, new_orders, taken_orders_ids = {}, [], set()
+        for courier in couriers:
+            courier_orders = list(assigned_orders.get(courier.pk, []))
+            if courier.pk in working_couriers_ids:
+                max_weight = courier.max_weight
+                candidates = [
+                    order
+                    for region_id in set(courier.region_ids)
+                    for order in pool_by_region.get(region_id, [])
+                    if order.pk not in taken_orders_ids
+                    and order.weight <= max_weight
+                ]
+                courier.add_order(
+                    cls._group_orders_by_region(candidates), courier_orders, today, packing_mode=packing_mode
+                )
+                courier_new_orders = courier_orders[len(assigned_orders.get(courier.pk, [])):]
+                taken_orders_ids.update(order.pk for order in courier_new_orders)
+                new_orders.extend(courier_new_orders)
+            result[courier.pk] = courier_orders
+        return result, new_orders
+
+    @staticmethod
+    def _lock_orders(orders: Iterable['Order']) -> Set[int]:
+        """
+        Блокирует выбранные свободные заказы до конца транзакции (SELECT ... FOR UPDATE SKIP LOCKED)
+        и возвращает id заблокированных. Заказы, заблокированные или уже назначенные параллельным запросом,
+        пропускаются без ожидания. Вызывать нужно внутри transaction.atomic()
+        """
+        orders_ids = [order.pk for order in orders]
+        if not orders_ids:
+            return set()
+
+        return set(
+            Order.objects
+            .filter(id__in=orders_ids)
+            .filter(courier_id__isnull=True)
+            .filter(complete_time__isnull=True)
+            .filter(assign_time__isnull=True)
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)
+        )
+
+    @classmethod
+    def get_region_couriers(cls, region_id: int):
+        """Возвращает курьеров, работающих в районе region_id (по GIN-индексу на region_ids)"""
+        return cls.objects.filter(region_ids__contains=[region_id])
 
     def get_assigned_orders(self):
         """Возвращает заказы, которые были назначены курьеру"""
@@ -215,7 +510,7 @@ class Courier(models.Model):
     @property
     def has_completed_orders(self) -> bool:
         """Проверяет, есть ли у курьера хотя бы один завершенный заказ"""
-        return True if self.get_completed_orders() else False
+        return True if self.completed_orders_stats else False
 
     def get_completed_orders(self):
         """Возвращает завершенные заказы курьера"""
@@ -229,28 +524,51 @@ class Courier(models.Model):
             self,
             grouped_orders: Dict[int, List['Order']],
             couriers_orders: List['Order'],
-            today: datetime
+            today: datetime,
+            packing_mode: str = None
     ) -> Iterable['Order']:
         """
         Добавляет заказы курьеру, пока у него есть свободное место.
-        Если места больше нет, то возвращается текущий набор заказов
+        Если места больше нет, то возвращается текущий набор заказов.
+        couriers_orders - уже назначенные курьеру заказы, к ним добавляются новые
+        packing_mode - способ упаковки заказов (см. PackingMode), по умолчанию settings.ORDERS_PACKING_MODE
         """
-        current_weight = 0
-        current_assigned_orders = self.get_assigned_orders()
-        if current_assigned_orders:
-            current_weight = sum([order.weight for order in current_assigned_orders])
+        current_weight = sum([order.weight for order in couriers_orders])
 
         space_left = self.max_weight - current_weight
 
-        for _, orders in grouped_orders.items():
-            for order in sorted(orders, key=lambda x: (x.weight, x.delivery_hours[0].end)):
-                if space_left:
-                    if self._is_working_hours_overlap(order.delivery_hours) and order.weight <= space_left:
-                        couriers_orders.append(order)
-                        order.assign_time = today
-                        space_left -= order.weight
-                else:
-                    return couriers_orders
+        if (packing_mode or settings.ORDERS_PACKING_MODE) == PackingMode.optimal.name:
+            with stage('overlap_check'):
+                suitable_orders = [
+                    order
+                    for orders in grouped_orders.values()
+                    for order in orders
+                    if self._is_working_hours_overlap(order.delivery_intervals)
+                ]
+            with stage('packing'):
+                packed_orders = optimal_pack(
+                    suitable_orders,
+                    capacity=to_weight_units(space_left),
+                    weight=lambda x: to_weight_units(x.weight),
+                    key=lambda x: x.delivery_intervals[0][1]
+                )
+        else:
+            # в жадной упаковке проверка пересечения идет внутри упаковки, поэтому этап packing включает overlap_check
+            with stage('packing'):
+                packed_orders = greedy_pack(
+                    grouped_orders,
+                    capacity=to_weight_units(space_left),
+                    weight=lambda x: to_weight_units(x.weight),
+                    key=lambda x: x.delivery_intervals[0][1],
+                    is_suitable=timed(
+                        'overlap_check', lambda x: self._is_working_hours_overlap(x.delivery_intervals)
+                    )
+                )
+
+        for order in packed_orders:
+            couriers_orders.append(order)
+            order.assign_time = today
+        return couriers_orders
 
 
 class Region(models.Model):
@@ -265,9 +583,12 @@ class Region(models.Model):
         return f'[pk: {self.pk}]'
 
     @classmethod
-    def create_new_regions(cls, regions_to_add: set):
-        """Метод записывает в базу новые районы из json payload. Если такой район уже есть в базе, то он игнорируется"""
-        regions_from_db = cls.objects.filter(id__in=regions_to_add).values_list('id', flat=True)
-        if len(regions_to_add) != len(regions_from_db):
-            regions_to_write = regions_to_add.difference(set(regions_from_db))
-            cls.objects.bulk_create([Region(id=region_id) for region_id in regions_to_write])
+    def create_new_regions(cls, regions_to_add: Iterable[int]):
+        """
+        Метод записывает в базу новые районы из json payload одним запросом INSERT ... ON CONFLICT DO NOTHING.
+        Если такой район уже есть в базе (в т.ч. его параллельно записал другой запрос), то он игнорируется.
+        Районы вставляются в порядке id, чтобы параллельные загрузки не попадали в deadlock
+        """
+        regions_to_add = sorted(set(regions_to_add))
+        if regions_to_add:
+            cls.objects.bulk_create([Region(id=region_id) for region_id in regions_to_add], ignore_conflicts=True)
@@ -1,7 +1,7 @@
 import enum
 
 
-__all__ = ['CourierType', 'CourierEarningCoefficient']
+__all__ = ['CourierType', 'CourierEarningCoefficient', 'PackingMode', 'OrdersEngine']
 
 
 @enum.unique
@@ -16,3 +16,25 @@ class CourierEarningCoefficient(enum.IntEnum):
     foot = 2
     bike = 5
     car = 9
+
+
+@enum.unique
+class PackingMode(enum.Enum):
+    """
+    Способ упаковки заказов курьеру:
+        greedy - по районам, от легких заказов к тяжелым, пока есть место
+        optimal - максимальное количество заказов за развоз (ограниченный рюкзак по весу)
+    """
+    greedy = 'greedy'
+    optimal = 'optimal'
+
+
+@enum.unique
+class OrdersEngine(enum.Enum):
+    """
+    Реализация выбора заказов курьеру (см. Courier.get_suitable_orders):
+        python - заказы перебираются объектами Order
+        numpy - заказы обрабатываются столбцами numpy (см. app.main.vectorized), быстрее на больших пулах заказов
+    """
+    python = 'python'
+    numpy = 'numpy'
@@ -1,16 +1,21 @@
 import logging
 from datetime import datetime
+from typing import Iterable
+
+from psycopg2.extras import NumericRange
 
 from django.db import models
-from django.contrib.postgres.fields import ArrayField
+from django.db.models import Q
+from django.contrib.postgres.fields import ArrayField, IntegerRangeField
+from django.contrib.postgres.indexes import GistIndex
 
 from ..exceptions import APIError, Http400
-from ..utils import remove_time_intervals_over_current_time
+from ..intervals import remove_expired_intervals
 
 logger = logging.getLogger(__name__)
 
 
-__all__ = ['Order']
+__all__ = ['Order', 'OrderDeliveryInterval']
 
 
 class OrderQuerySet(models.QuerySet):
@@ -39,6 +44,8 @@ class Order(models.Model):
         assign_time - время назначения заказа
         complete_time - время выполнения заказа
         delivery_hours - временные промежутки, в которые клиенту удобно принять заказ (массив строк: [HH:MM-HH:MM, ...])
+        delivery_minutes - временные промежутки доставки в минутах от начала суток,
+                           отсортированные и без пересечений (массив пар: [[start, end], ...])
     """
     weight = models.DecimalField(max_digits=4, decimal_places=2)
     region = models.ForeignKey('Region', related_name='orders', on_delete=models.SET_NULL, null=True)
@@ -46,9 +53,27 @@ class Order(models.Model):
     assign_time = models.DateTimeField(null=True)
     complete_time = models.DateTimeField(null=True)
     delivery_hours = ArrayField(models.CharField(max_length=11), blank=False, default=list)
+    delivery_minutes = ArrayField(ArrayField(models.PositiveSmallIntegerField(), size=2), blank=True, default=list)
 
     objects = OrderQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # пул свободных заказов, из которого выбираются заказы для курьеров (см. Courier._get_ini_orders)
+            # в базе индекс дополнительно покрывает id и delivery_minutes (INCLUDE, см. миграцию 0005)
+            models.Index(
+                fields=['region', 'weight'],
+                name='order_open_pool_idx',
+                condition=Q(courier__isnull=True, assign_time__isnull=True, complete_time__isnull=True)
+            ),
+            # назначенные, но еще не выполненные заказы курьеров (см. Courier.get_assigned_orders)
+            models.Index(
+                fields=['courier'],
+                name='order_assigned_idx',
+                condition=Q(assign_time__isnull=False, complete_time__isnull=True)
+            ),
+        ]
+
     def __str__(self):
         return f'[pk: {self.pk}] [region: {self.region}] [courier: {self.courier}]'
 
@@ -62,5 +87,34 @@ class Order(models.Model):
         Проверяет, можно ли доставить заказ.
         Т.е., если текущее время > времени окончания доставки, то заказ уже нельзя доставить
         """
-        remove_time_intervals_over_current_time(self, 'delivery_hours', today=today)
-        return True if self.delivery_hours else False
+        self.delivery_intervals = remove_expired_intervals(self.delivery_minutes, today)
+        return True if self.delivery_intervals else False
+
+
+class OrderDeliveryInterval(models.Model):
+    """
+    Промежуток доставки заказа в виде int4range [start, end) в минутах от начала суток.
+    Дублирует Order.delivery_minutes, чтобы отбирать заказы по времени доставки на стороне базы (GiST индекс)
+    Attributes:
+        order - заказ
+        minutes - промежуток доставки
+    """
+    order = models.ForeignKey('Order', related_name='delivery_ranges', on_delete=models.CASCADE)
+    minutes = IntegerRangeField()
+
+    class Meta:
+        indexes = [
+            GistIndex(fields=['minutes'], name='order_delivery_minutes_gist'),
+        ]
+
+    def __str__(self):
+        return f'[pk: {self.pk}] [order: {self.order_id}] [minutes: {self.minutes}]'
+
+    @classmethod
+    def bulk_create_for_orders(cls, orders: Iterable['Order']):
+        """Записывает в базу промежутки доставки для новых заказов"""
+        cls.objects.bulk_create([
+            cls(order_id=order.pk, minutes=NumericRange(start, end))
+            for order in orders
+            for start, end in order.delivery_minutes
+        ])
@@ -0,0 +1,108 @@
+import logging
+from datetime import datetime
+
+from django.db import connection, models, transaction
+
+from .courier import Courier
+
+
+logger = logging.getLogger(__name__)
+
+
+__all__ = ['CourierRegionStats']
+
+
+class CourierRegionStats(models.Model):
+    """
+    Накопленная статистика выполненных заказов курьера по району.
+    Обновляется при выполнении каждого заказа (см. OrderCompleteSerializer), поэтому рейтинг и заработок
+    курьера считаются без чтения истории заказов.
+
+    Время доставки заказа - это разница между временем его выполнения и временем выполнения предыдущего заказа
+    в районе (для первого заказа - временем назначения), поэтому суммарное время доставки по району равно
+    last_complete_time - first_assign_time.
+    Attributes:
+        courier - курьер
+        region - район
+        completed_orders_count - количество выполненных заказов
+        first_assign_time - время назначения первого выполненного заказа
+                            (первым считается заказ с наименьшими complete_time, assign_time)
+        first_complete_time - время выполнения первого выполненного заказа
+        last_complete_time - время выполнения последнего выполненного заказа
+    """
+    courier = models.ForeignKey('Courier', related_name='region_stats', on_delete=models.CASCADE)
+    region = models.ForeignKey('Region', related_name='couriers_stats', on_delete=models.CASCADE, null=True)
+    completed_orders_count = models.PositiveIntegerField(default=0)
+    first_assign_time = models.DateTimeField(null=True)
+    first_complete_time = models.DateTimeField(null=True)
+    last_complete_time = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['courier', 'region'], name='courier_region_stats_unique'),
+        ]
+
+    def __str__(self):
+        return (
+            f'[pk: {self.pk}] [courier: {self.courier_id}] [region: {self.region_id}] '
+            f'[completed_orders_count: {self.completed_orders_count}]'
+        )
+
+    @property
+    def delivery_seconds(self) -> float:
+        """Суммарное время доставки заказов в районе (в секундах)"""
+        return (self.last_complete_time - self.first_assign_time).total_seconds()
+
+    @property
+    def average_delivery_time(self) -> float:
+        """Среднее время доставки заказов в районе (в секундах)"""
+        return self.delivery_seconds / self.completed_orders_count
+
+    def add_completed_order(self, assign_time: datetime, complete_time: datetime):
+        """Учитывает в статистике выполненный заказ"""
+        self.completed_orders_count += 1
+        if self.first_complete_time is None or (complete_time, assign_time) < (
+                self.first_complete_time, self.first_assign_time
+        ):
+            self.first_complete_time, self.first_assign_time = complete_time, assign_time
+        if self.last_complete_time is None or complete_time > self.last_complete_time:
+            self.last_complete_time = complete_time
+
+    @classmethod
+    def register_completed_order(cls, order):
+        """Обновляет статистику курьера по району выполненного заказа. Вызывать нужно внутри transaction.atomic()"""
+        stats, _ = (
+            cls.objects
+            .select_for_update()
+            .get_or_create(courier_id=order.courier_id, region_id=order.region_id)
+        )
+        stats.add_completed_order(order.assign_time, order.complete_time)
+        stats.save()
+        return stats
+
+    @classmethod
+    def rebuild(cls):
+        """Пересчитывает статистику всех курьеров по истории выполненных заказов"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {cls._meta.db_table}')
+            cursor.execute(
+                f'''
+                INSERT INTO {cls._meta.db_table} (
+                    courier_id, region_id, completed_orders_count,
+                    first_assign_time, first_complete_time, last_complete_time
+                )
+                SELECT
+                    courier_id,
+                    region_id,
+                    count(*),
+                    (array_agg(assign_time ORDER BY complete_time, assign_time))[1],
+                    min(complete_time),
+                    max(complete_time)
+                FROM main_order
+                WHERE courier_id IS NOT NULL AND assign_time IS NOT NULL AND complete_time IS NOT NULL
+                GROUP BY courier_id, region_id
+                '''
+            )
+            logger.info(f'rebuilt {cursor.rowcount} courier region stats')
+            Courier.bump_versions(None)
+            return cursor.rowcount
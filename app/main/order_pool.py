@@ -0,0 +1,340 @@
+"""
+Кеш свободных заказов по районам в памяти процесса (settings.ORDER_POOL_CACHE) для Courier.get_suitable_orders.
+Район загружается из базы при первом обращении, дальше поддерживается по уведомлениям LISTEN/NOTIFY
+(канал main_open_orders, см. миграции 0009_order_open_pool_notify и 0010_order_open_pool_notify_add),
+которые слушает отдельный поток процесса.
+Заказы района хранятся уже разобранными, разложенными по корзинам веса (грузоподъемности типов курьеров)
+и отсортированными внутри корзины по (вес, конец последнего промежутка доставки).
+
+Кеш может отставать от базы на время доставки уведомления, поэтому выбранные из него заказы все равно
+подтверждаются в базе (Courier._lock_orders): заказ, который уже назначен, просто не будет заблокирован.
+LISTEN требует сессионного соединения, поэтому с pgbouncer в режиме transaction (DB_POOL_MODE=transaction)
+кеш не работает.
+
+Триггеры, которые отправляют уведомления, замедляют загрузку и обновление заказов, поэтому миграции их
+не создают: они ставятся вместе с включением кеша командой `manage.py order_pool_triggers install`
+"""
+import bisect
+import json
+import logging
+import os
+import select
+import threading
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+
+from .models.enums import CourierType
+from .models.order import Order
+
+
+__all__ = [
+    'OpenOrdersIndex', 'get_index', 'reset_index', 'install_triggers', 'drop_triggers', 'triggers_installed',
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+CHANNEL = 'main_open_orders'
+
+# триггеры уровня выражения вызывают main_order_notify_open_pool (см. миграции 0009 и 0010)
+TRIGGERS_SQL = '''
+CREATE TRIGGER main_order_open_pool_insert AFTER INSERT ON main_order
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+CREATE TRIGGER main_order_open_pool_update AFTER UPDATE ON main_order
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+CREATE TRIGGER main_order_open_pool_delete AFTER DELETE ON main_order
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+CREATE TRIGGER main_order_open_pool_truncate AFTER TRUNCATE ON main_order
+    FOR EACH STATEMENT EXECUTE FUNCTION main_order_notify_open_pool();
+'''
+
+DROP_TRIGGERS_SQL = '''
+DROP TRIGGER IF EXISTS main_order_open_pool_insert ON main_order;
+DROP TRIGGER IF EXISTS main_order_open_pool_update ON main_order;
+DROP TRIGGER IF EXISTS main_order_open_pool_delete ON main_order;
+DROP TRIGGER IF EXISTS main_order_open_pool_truncate ON main_order;
+'''
+
+TRIGGERS_COUNT = 4
+
+# корзины веса: заказы корзины i может взять любой курьер с грузоподъемностью не меньше WEIGHT_BUCKETS[i]
+WEIGHT_BUCKETS = sorted(courier_type.value for courier_type in CourierType)
+
+# id, вес, промежутки доставки в минутах
+_OrderRow = Tuple[int, object, List[List[int]]]
+
+
+class _RegionOrders:
+    """Свободные заказы района: корзины веса со списками (вес, конец доставки, id) и сами заказы по id"""
+
+    def __init__(self, rows: Iterable[_OrderRow]):
+        self.orders: Dict[int, _OrderRow] = {row[0]: row for row in rows}
+        self.buckets: List[List[tuple]] = [[] for _ in WEIGHT_BUCKETS]
+        for row in self.orders.values():
+            self.buckets[bisect.bisect_left(WEIGHT_BUCKETS, row[1])].append(self._sort_key(row))
+        for bucket in self.buckets:
+            bucket.sort()
+
+    @staticmethod
+    def _sort_key(row: _OrderRow) -> tuple:
+        order_id, weight, delivery_minutes = row
+        return weight, delivery_minutes[-1][1] if delivery_minutes else 0, order_id
+
+    def add(self, row: _OrderRow):
+        self.remove(row[0])
+        self.orders[row[0]] = row
+        bisect.insort(self.buckets[bisect.bisect_left(WEIGHT_BUCKETS, row[1])], self._sort_key(row))
+
+    def remove(self, order_id: int):
+        row = self.orders.pop(order_id, None)
+        if row is not None:
+            bucket = self.buckets[bisect.bisect_left(WEIGHT_BUCKETS, row[1])]
+            del bucket[bisect.bisect_left(bucket, self._sort_key(row))]
+
+    def select(self, max_weight: int) -> Iterable[_OrderRow]:
+        for bucket in self.buckets[:bisect.bisect_right(WEIGHT_BUCKETS, max_weight)]:
+            for _, _, order_id in bucket:
+                yield self.orders[order_id]
+
+
+class OpenOrdersIndex:
+    """Свободные заказы по районам, которые поддерживаются уведомлениями базы"""
+
+    def __init__(self, listen_timeout: float = 5):
+        self.pid = os.getpid()
+        self.listen_timeout = listen_timeout
+        self._regions: Dict[int, _RegionOrders] = {}
+        self._order_regions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        # изменения, пришедшие во время загрузки районов (см. _load_regions)
+        self._loads: List[dict] = []
+        self._listening = threading.Event()
+        self._stopped = threading.Event()
+        self._listener = None
+
+    def candidates(self, region_ids: Iterable[int], max_weight: int) -> Optional[List[Order]]:
+        """
+        Свободные заказы районов region_ids весом не больше max_weight (новые объекты Order на каждый вызов).
+        None - слушатель уведомлений не запущен, заказы нужно выбирать из базы
+        """
+        if not self.start():
+            return None
+
+        missing_regions = [region_id for region_id in region_ids if region_id not in self._regions]
+        loaded_regions = self._load_regions(missing_regions) if missing_regions else {}
+
+        with self._lock:
+            regions = [
+                (region_id, self._regions.get(region_id) or loaded_regions.get(region_id)) for region_id in region_ids
+            ]
+            return [
+                Order(id=order_id, region_id=region_id, weight=weight, delivery_minutes=delivery_minutes)
+                for region_id, region in regions if region is not None
+                for order_id, weight, delivery_minutes in region.select(max_weight)
+            ]
+
+    def _load_regions(self, region_ids: List[int]) -> Dict[int, _RegionOrders]:
+        """
+        Читает свободные заказы районов из базы. Прочитанные районы попадают в кеш, если во время чтения
+        не пришло уведомление о том, что они уже изменились
+        """
+        # слушатель уже подписан на канал, поэтому все изменения после чтения придут уведомлениями,
+        # а пришедшие во время чтения собираются в changes и применяются к прочитанному
+        changes = {'added': [], 'removed': set(), 'reloaded': set(), 'reset': False}
+        with self._lock:
+            self._loads.append(changes)
+        try:
+            regions = {region_id: [] for region_id in region_ids}
+            for region_id, order_id, weight, delivery_minutes in (
+                Order.objects
+                .filter(region_id__in=region_ids)
+                .filter(courier_id__isnull=True)
+                .filter(complete_time__isnull=True)
+                .filter(assign_time__isnull=True)
+                .values_list('region_id', 'id', 'weight', 'delivery_minutes')
+            ):
+                regions[region_id].append((order_id, weight, delivery_minutes))
+        finally:
+            with self._lock:
+                self._loads.remove(changes)
+
+        # заказы, созданные во время чтения, могли не попасть в прочитанное
+        for order_id, region_id, weight, delivery_minutes in changes['added']:
+            if region_id in regions:
+                regions[region_id].append((order_id, weight, delivery_minutes))
+        loaded_regions = {
+            region_id: _RegionOrders(row for row in region_rows if row[0] not in changes['removed'])
+            for region_id, region_rows in regions.items()
+        }
+        with self._lock:
+            if changes['reset']:
+                return loaded_regions
+            for region_id, region in loaded_regions.items():
+                if region_id in changes['reloaded']:
+                    continue
+                self._drop_region(region_id)
+                self._regions[region_id] = region
+                self._order_regions.update((order_id, region_id) for order_id in region.orders)
+        return loaded_regions
+
+    def _drop_region(self, region_id: int):
+        region = self._regions.pop(region_id, None)
+        if region is not None:
+            for order_id in region.orders:
+                self._order_regions.pop(order_id, None)
+
+    def apply(self, notification: dict):
+        """Применяет уведомление канала main_open_orders (см. миграцию 0010_order_open_pool_notify_add)"""
+        with self._lock:
+            if notification['op'] == 'add':
+                # новые заказы добавляются только в уже загруженные районы
+                for order_id, region_id, weight, delivery_minutes in notification['orders']:
+                    if region_id in self._regions:
+                        self._regions[region_id].add((order_id, weight, delivery_minutes))
+                        self._order_regions[order_id] = region_id
+                for changes in self._loads:
+                    changes['added'].extend(notification['orders'])
+            elif notification['op'] == 'remove':
+                for order_id in notification['ids']:
+                    region_id = self._order_regions.pop(order_id, None)
+                    if region_id in self._regions:
+                        self._regions[region_id].remove(order_id)
+                for changes in self._loads:
+                    changes['removed'].update(notification['ids'])
+            elif notification['op'] == 'reload':
+                # район перечитывается из базы при следующем обращении
+                for region_id in notification['regions']:
+                    self._drop_region(region_id)
+                for changes in self._loads:
+                    changes['reloaded'].update(notification['regions'])
+            else:
+                self.clear()
+
+    def clear(self):
+        self._regions, self._order_regions = {}, {}
+        for changes in self._loads:
+            changes['reset'] = True
+
+    def start(self) -> bool:
+        """
+        Запускает поток-слушатель уведомлений (заново, если он завершился из-за ошибки) и возвращает,
+        подписан ли он на канал. Подписки ждет только первый запуск, а пока слушатель переподключается,
+        заказы выбираются из базы без ожидания
+        """
+        if self._stopped.is_set():
+            return False
+
+        first_start = False
+        if self._listener is None or not self._listener.is_alive():
+            with self._lock:
+                if self._listener is None or not self._listener.is_alive():
+                    first_start = self._listener is None
+                    # настройки берутся из соединения django, поэтому в тестах используется тестовая база
+                    self._listener = threading.Thread(
+                        target=self._listen, args=(dict(connections['default'].settings_dict),),
+                        name='open-orders-listener', daemon=True
+                    )
+                    self._listener.start()
+        if first_start:
+            return self._listening.wait(self.listen_timeout)
+        return self._listening.is_set()
+
+    def stop(self):
+        self._stopped.set()
+        if self._listener is not None:
+            self._listener.join()
+
+    @staticmethod
+    def _connect(db_settings: dict):
+        connection = psycopg2.connect(
+            host=db_settings['HOST'] or None,
+            port=db_settings['PORT'] or None,
+            user=db_settings['USER'] or None,
+            password=db_settings['PASSWORD'] or None,
+            dbname=db_settings['NAME'],
+        )
+        connection.autocommit = True
+        return connection
+
+    def _listen(self, db_settings: dict):
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = self._connect(db_settings)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CHANNEL}')
+                self._listening.set()
+
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        # веса заказов - Decimal, как и при чтении из базы
+                        self.apply(json.loads(connection.notifies.pop(0).payload, parse_float=Decimal))
+            except psycopg2.Error:
+                logger.exception('open orders listener failed, reconnecting')
+                self._stopped.wait(1)
+            finally:
+                # пока слушатель не подключен, уведомления теряются, поэтому кеш начинается заново
+                self._listening.clear()
+                with self._lock:
+                    self.clear()
+                if connection is not None:
+                    connection.close()
+
+
+_state = {'index': None}
+
+
+def get_index() -> OpenOrdersIndex:
+    """Кеш свободных заказов процесса (после fork в воркере gunicorn создается заново)"""
+    if settings.DB_POOL_MODE == 'transaction':
+        raise ImproperlyConfigured('ORDER_POOL_CACHE requires LISTEN, which does not work with DB_POOL_MODE=transaction')
+
+    index = _state['index']
+    if index is None or index.pid != os.getpid():
+        # без триггеров уведомлений не будет и кеш незаметно разойдется с базой
+        if not triggers_installed():
+            raise ImproperlyConfigured(
+                'ORDER_POOL_CACHE requires notification triggers on main_order, '
+                'install them with: manage.py order_pool_triggers install'
+            )
+        index = _state['index'] = OpenOrdersIndex()
+    return index
+
+
+def reset_index():
+    """Останавливает слушатель и сбрасывает кеш (например, в тестах)"""
+    index, _state['index'] = _state['index'], None
+    if index is not None and index.pid == os.getpid():
+        index.stop()
+
+
+def triggers_installed() -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM pg_trigger "
+            "WHERE tgrelid = 'main_order'::regclass AND tgname LIKE 'main_order_open_pool_%%'"
+        )
+        return cursor.fetchone()[0] == TRIGGERS_COUNT
+
+
+def install_triggers():
+    """Ставит триггеры уведомлений на таблицу заказов (повторная установка пересоздает их)"""
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_TRIGGERS_SQL + TRIGGERS_SQL)
+
+
+def drop_triggers():
+    with connection.cursor() as cursor:
+        cursor.execute(DROP_TRIGGERS_SQL)
@@ -0,0 +1,122 @@
+import operator
+from decimal import Decimal
+from itertools import groupby
+from typing import Any, Callable, Dict, List
+
+
+__all__ = ['WEIGHT_UNITS_IN_KG', 'to_weight_units', 'greedy_pack', 'optimal_pack']
+
+
+# вес хранится с точностью до 0.01 кг, поэтому упаковка считается в целых сотых долях килограмма
+WEIGHT_UNITS_IN_KG = 100
+
+
+def to_weight_units(weight) -> int:
+    """Переводит вес в кг (Decimal, int или float) в целое число сотых долей килограмма"""
+    return int(Decimal(str(weight)) * WEIGHT_UNITS_IN_KG)
+
+
+def greedy_pack(
+        grouped_items: Dict[Any, List[Any]],
+        capacity: int,
+        weight: Callable[[Any], int],
+        key: Callable[[Any], Any] = lambda x: 0,
+        is_suitable: Callable[[Any], bool] = lambda x: True
+) -> List[Any]:
+    """
+    Жадная упаковка: группы (районы) перебираются по очереди, внутри группы предметы берутся
+    от легких к тяжелым (при равном весе - по key), пока они помещаются. Как только место заканчивается,
+    упаковка прекращается
+    """
+    packed = []
+    for items in grouped_items.values():
+        for item in sorted(items, key=lambda x: (weight(x), key(x))):
+            if not capacity:
+                return packed
+            if is_suitable(item) and weight(item) <= capacity:
+                packed.append(item)
+                capacity -= weight(item)
+    return packed
+
+
+def _split_into_bundles(count: int) -> List[int]:
+    """Двоичное разбиение count одинаковых предметов на пачки 1, 2, 4, ..., остаток (ограниченный рюкзак)"""
+    bundles, size = [], 1
+    while count > 0:
+        bundle = min(size, count)
+        bundles.append(bundle)
+        count -= bundle
+        size *= 2
+    return bundles
+
+
+def optimal_pack(
+        items: List[Any],
+        capacity: int,
+        weight: Callable[[Any], int],
+        key: Callable[[Any], Any] = lambda x: 0
+) -> List[Any]:
+    """
+    Выбирает из items набор с максимальным количеством предметов, суммарный вес которого не превышает capacity.
+    Среди таких наборов выбирается набор с максимальным весом (чтобы курьер уехал максимально загруженным).
+    Предметы одинакового веса взаимозаменяемы, поэтому из них берутся первые по key.
+
+    Решается как ограниченный рюкзак по весам в целых единицах (см. to_weight_units):
+    dp[c] - максимальное количество предметов с суммарным весом ровно c.
+    Грузоподъемность курьеров не больше 50 кг, т.е. не больше 5000 единиц, поэтому таблица маленькая
+    """
+    items = sorted(
+        (item for item in items if 0 < weight(item) <= capacity),
+        key=lambda x: (weight(x), key(x))
+    )
+    if not items:
+        return []
+
+    # максимальное количество предметов дают самые легкие, а предмет тяжелее, чем capacity минус
+    # вес (max_count - 1) самых легких, не может попасть ни в один набор из max_count предметов
+    max_count, lightest_weight = 0, 0
+    for item in items:
+        if lightest_weight + weight(item) > capacity:
+            break
+        lightest_weight += weight(item)
+        max_count += 1
+    weight_limit = capacity - (lightest_weight - weight(items[max_count - 1]))
+
+    classes = []
+    for item_weight, group in groupby(items, key=weight):
+        if item_weight > weight_limit:
+            break
+        group = list(group)[:max_count]
+        classes.append((item_weight, group))
+
+    unreachable = -1
+    dp = [0] + [unreachable] * capacity
+    bundles, choices = [], []
+    for class_index, (item_weight, group) in enumerate(classes):
+        for bundle in _split_into_bundles(len(group)):
+            shift = item_weight * bundle
+            if shift > capacity:
+                break
+            candidates = [
+                count + bundle if count != unreachable else unreachable
+                for count in dp[:capacity + 1 - shift]
+            ]
+            choices.append(bytes(map(operator.gt, candidates, dp[shift:])))
+            dp[shift:] = map(max, dp[shift:], candidates)
+            bundles.append((class_index, bundle, shift))
+
+    best_count = max(dp)
+    best_weight = max(c for c, count in enumerate(dp) if count == best_count)
+
+    taken = [0] * len(classes)
+    c = best_weight
+    for (class_index, bundle, shift), choice in zip(reversed(bundles), reversed(choices)):
+        if c >= shift and choice[c - shift]:
+            taken[class_index] += bundle
+            c -= shift
+
+    return [
+        item
+        for (_, group), count in zip(classes, taken)
+        for item in group[:count]
+    ]
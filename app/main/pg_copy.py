@@ -0,0 +1,49 @@
+import csv
+import io
+from typing import Any, Iterable, Sequence
+
+from django.db import connection
+
+
+__all__ = ['to_pg_array', 'to_pg_range', 'copy_rows']
+
+
+def to_pg_array(values: Iterable[Any]) -> str:
+    """
+    Преобразует список (в т.ч. вложенный) в литерал массива postgres.
+    Например: ['09:00-11:00'] -> {"09:00-11:00"}, [[540, 660]] -> {{540,660}}
+    """
+    elements = []
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            elements.append(to_pg_array(value))
+        elif isinstance(value, str):
+            elements.append('"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"')))
+        else:
+            elements.append(str(value))
+    return '{' + ','.join(elements) + '}'
+
+
+def to_pg_range(start: int, end: int) -> str:
+    """Литерал диапазона postgres [start, end) (так же хранит диапазоны NumericRange по умолчанию)"""
+    return f'[{start},{end})'
+
+
+def copy_rows(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """
+    Записывает строки rows в таблицу table через COPY ... FROM STDIN в формате csv.
+    None записывается как NULL, массивы и диапазоны нужно заранее преобразовать в литералы (to_pg_array, to_pg_range).
+    Возвращает количество записанных строк
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(rows)
+    buffer.seek(0)
+
+    quoted_columns = ', '.join(connection.ops.quote_name(column) for column in columns)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(table)} ({quoted_columns}) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+        return cursor.rowcount
@@ -0,0 +1,155 @@
+"""
+Легковесное профилирование запросов (см. app.main.middleware.ProfilingMiddleware).
+Профиль текущего запроса хранится в contextvar, поэтому stage() работает и в синхронных, и в асинхронных view.
+Если запрос не профилируется, stage() и timed() почти ничего не стоят
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+
+__all__ = [
+    'RequestProfile', 'StackSampler', 'current_profile', 'profile_request', 'record_query',
+    'install_query_recorder', 'stage', 'timed',
+]
+
+
+class RequestProfile:
+    """
+    Время запроса по этапам (этапы могут быть вложены друг в друга) и запросы к базе.
+    detailed=False - профиль только для метрик: без timed(), который засекает каждый вызов в цикле
+    """
+
+    def __init__(self, detailed: bool = True):
+        self.detailed = detailed
+        self.started = time.perf_counter()
+        self.wall_time = None
+        self.stages: Dict[str, float] = {}
+        self.db_queries = 0
+        self.db_time = 0.0
+
+    def add_stage(self, name: str, elapsed: float):
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self.started
+
+    def as_dict(self) -> dict:
+        if self.wall_time is None:
+            self.finish()
+        return {
+            'wall_ms': round(self.wall_time * 1000, 3),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'stages_ms': {name: round(elapsed * 1000, 3) for name, elapsed in self.stages.items()},
+        }
+
+
+_current_profile = ContextVar('request_profile', default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_request(profile: RequestProfile):
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка запросов к базе (connection.execute_wrappers): считает запросы и их время в профиле текущего запроса"""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.db_queries += 1
+        profile.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Обработчик сигнала connection_created. Обертка ставится на каждое соединение процесса, а не в middleware:
+    под ASGI синхронные view выполняются в других потоках со своими соединениями
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def stage(name: str):
+    """Засекает время этапа name в профиле текущего запроса (повторные этапы суммируются)"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, time.perf_counter() - started)
+
+
+def timed(name: str, func: Callable) -> Callable:
+    """
+    Возвращает func, время вызовов которой засекается как этап name.
+    Для вызовов в цикле: если запрос не профилируется, возвращается сама func без обертки
+    """
+    profile = _current_profile.get()
+    if profile is None or not profile.detailed:
+        return func
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add_stage(name, time.perf_counter() - started)
+    return wrapper
+
+
+class StackSampler:
+    """
+    Семплирующий профайлер: отдельный поток раз в interval секунд снимает стек потока запроса.
+    Результат - стеки в формате collapsed (flamegraph.pl, speedscope): "module:func;module:func count"
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
@@ -1,3 +1,5 @@
+from typing import List
+
 from django.db import transaction
 from django.utils import timezone
 from rest_framework import serializers
@@ -5,21 +7,60 @@ from rest_framework.validators import ValidationError
 
 from .. import base_serializers
 from ..serializers.region import RegionSerializer
-from ..models import Courier, CourierType, Region, Order
-from ..utils import validate_time_intervals, get_object_or_400, cast_objects_to_hours
+from ..models import Courier, CourierType, PackingMode, Region, Order
+from ..fast_validation import validate_courier
+from ..intervals import parse_time, parse_time_intervals
+from ..pg_copy import copy_rows, to_pg_array
+from ..profiling import stage
+from ..exceptions import Http400
+from ..utils import validate_time_intervals, get_object_or_400
 
 
 class CourierSerializerIn(base_serializers.Serializer):
     courier_id = serializers.IntegerField(required=True)
+    packing = serializers.ChoiceField(required=False, choices=[field.name for field in PackingMode])
 
     class Meta:
-        fields = ('courier_id',)
+        fields = ('courier_id', 'packing')
 
     def validate(self, data):
         get_object_or_400(Courier, id=data.get('courier_id'))
         return data
 
 
+class CouriersBatchSerializerIn(base_serializers.Serializer):
+    courier_ids = base_serializers.UintListField(min_length=1, required=True)
+    packing = serializers.ChoiceField(required=False, choices=[field.name for field in PackingMode])
+
+    class Meta:
+        fields = ('courier_ids', 'packing')
+
+    def validate_courier_ids(self, courier_ids):
+        courier_ids = list(dict.fromkeys(courier_ids))
+        existing_ids = Courier.objects.filter(id__in=courier_ids).values_list('id', flat=True)
+        if len(existing_ids) != len(courier_ids):
+            raise Http400(details='Courier does not exist')
+        return courier_ids
+
+
+class CouriersLeaderboardArgsSerializer(base_serializers.Serializer):
+    region = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    class Meta:
+        fields = ('region', 'limit')
+
+
+class CourierLeaderboardSerializerOut(base_serializers.Serializer):
+    courier_id = serializers.IntegerField(read_only=True)
+    courier_type = serializers.CharField(read_only=True)
+    rating = serializers.FloatField(read_only=True)
+    earnings = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        fields = ('courier_id', 'courier_type', 'rating', 'earnings')
+
+
 class CourierSerializer(base_serializers.ModelSerializer):
     courier_id = serializers.IntegerField(source='id', required=True)
     courier_type = serializers.ChoiceField(required=True, choices=[field.name for field in CourierType])
@@ -50,7 +91,8 @@ class CourierListSerializerOut(base_serializers.Serializer):
         fields = ('id',)
 
 
-class CourierListSerializer(base_serializers.Serializer):
+class CourierListSerializer(base_serializers.FastItemsValidationMixin, base_serializers.Serializer):
+    fast_item_validator = staticmethod(validate_courier)
     data = CourierSerializer(many=True)
 
     class Meta:
@@ -62,7 +104,8 @@ class CourierListSerializer(base_serializers.Serializer):
                 id=validated_courier_data.get('id'),
                 courier_type=validated_courier_data.get('courier_type'),
                 working_hours=validated_courier_data.get('working_hours'),
-
+                working_minutes=parse_time_intervals(validated_courier_data.get('working_hours')),
+                region_ids=sorted(set(validated_courier_data.get('regions'))),
             ) for validated_courier_data in validated_couriers
         ])
 
@@ -87,6 +130,30 @@ class CourierListSerializer(base_serializers.Serializer):
             self._bulk_create_couriers_regions(validated_couriers)
         return created_couriers
 
+    @staticmethod
+    def copy_create(validated_couriers) -> List[int]:
+        """Записывает курьеров и их районы в базу через COPY (потоковая загрузка). Возвращает id курьеров"""
+        courier_ids, courier_rows, region_rows = [], [], []
+        for validated_courier_data in validated_couriers:
+            courier_id = validated_courier_data.get('id')
+            courier_ids.append(courier_id)
+            courier_rows.append((
+                courier_id,
+                validated_courier_data.get('courier_type'),
+                to_pg_array(validated_courier_data.get('working_hours')),
+                to_pg_array(parse_time_intervals(validated_courier_data.get('working_hours'))),
+                to_pg_array(sorted(set(validated_courier_data.get('regions')))),
+            ))
+            region_rows.extend((courier_id, region_id) for region_id in validated_courier_data.get('regions'))
+
+        with transaction.atomic():
+            copy_rows(
+                Courier._meta.db_table, ('id', 'courier_type', 'working_hours', 'working_minutes', 'region_ids'), courier_rows
+            )
+            RegionSerializer.bulk_create_regions(validated_couriers, obj_key='regions')
+            copy_rows(Region.couriers.through._meta.db_table, ('courier_id', 'region_id'), region_rows)
+        return courier_ids
+
 
 class UpdateCourierArgsSerializer(CourierSerializer):
     courier_type = serializers.ChoiceField(required=False, choices=[field.name for field in CourierType])
@@ -110,26 +177,28 @@ class UpdateCourierArgsSerializer(CourierSerializer):
                 if key != 'regions':
                     setattr(instance, key, value)
 
-            if regions_to_update:
-                current_regions = instance.regions.values_list('id', flat=True)
-                regions_to_add = set(regions_to_update).difference(set(current_regions))
+            if 'working_hours' in validated_data:
+                instance.working_minutes = parse_time_intervals(instance.working_hours)
 
-                Region.create_new_regions(regions_to_add)
-
-                regions_to_remove = set(current_regions).difference(set(regions_to_update))
-                regions_to_add = regions_to_add.union(set(current_regions))
+            if regions_to_update:
+                Region.create_new_regions(set(regions_to_update).difference(instance.region_ids))
 
-                instance.regions.set(regions_to_add)
-                instance.regions.through.objects.filter(region_id__in=regions_to_remove).delete()
+                # связь regions сохраняется для совместимости, region_ids - ее денормализованная копия
+                instance.regions.set(regions_to_update)
+                instance.region_ids = sorted(set(regions_to_update))
 
-            instance.save()
+            # версия обновляется отдельно (bump_versions), чтобы не затереть ее параллельное изменение
+            instance.save(update_fields=['courier_type', 'working_hours', 'working_minutes', 'region_ids'])
+            Courier.bump_versions([instance.pk])
 
             orders_to_unassign = instance.get_orders_to_unassign(today=timezone.now())
             if orders_to_unassign:
                 for order_to_unassign in orders_to_unassign:
                     order_to_unassign.courier_id, order_to_unassign.assign_time = None, None
-                Order.objects.bulk_update(orders_to_unassign, ['courier_id', 'assign_time'])
+                with stage('bulk_update'):
+                    Order.objects.bulk_update(orders_to_unassign, ['courier_id', 'assign_time'])
 
-            cast_objects_to_hours(instance, 'working_hours')
+            # в ответе интервалы отдаются отсортированными по времени начала
+            instance.working_hours = sorted(instance.working_hours, key=lambda x: parse_time(x.split('-')[0]))
 
         return instance
@@ -1,3 +1,5 @@
+from typing import List
+
 from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import ValidationError
@@ -5,7 +7,12 @@ from rest_framework.validators import ValidationError
 from .region import RegionSerializer
 from .. import base_serializers
 
-from ..models import Order
+from ..exceptions import Http400
+from ..models import Courier, CourierRegionStats, Order, OrderDeliveryInterval
+from ..fast_validation import validate_order
+from ..intervals import parse_time_intervals
+from ..pg_copy import copy_rows, to_pg_array, to_pg_range
+from ..profiling import stage
 from ..utils import validate_time_intervals
 
 
@@ -29,7 +36,8 @@ class OrderSerializer(base_serializers.ModelSerializer):
         return value
 
 
-class OrderListSerializer(base_serializers.Serializer):
+class OrderListSerializer(base_serializers.FastItemsValidationMixin, base_serializers.Serializer):
+    fast_item_validator = staticmethod(validate_order)
     data = OrderSerializer(many=True)
 
     class Meta:
@@ -42,7 +50,7 @@ class OrderListSerializer(base_serializers.Serializer):
                 weight=validated_order_data.get('weight'),
                 region_id=validated_order_data.get('region'),
                 delivery_hours=validated_order_data.get('delivery_hours'),
-
+                delivery_minutes=parse_time_intervals(validated_order_data.get('delivery_hours')),
             ) for validated_order_data in validated_orders
         ])
 
@@ -51,8 +59,34 @@ class OrderListSerializer(base_serializers.Serializer):
         with transaction.atomic():
             RegionSerializer.bulk_create_regions(validated_orders, obj_key='region')
             created_orders = self._bulk_create_orders(validated_orders)
+            OrderDeliveryInterval.bulk_create_for_orders(created_orders)
         return created_orders
 
+    @staticmethod
+    def copy_create(validated_orders) -> List[int]:
+        """Записывает заказы и их промежутки доставки в базу через COPY (потоковая загрузка). Возвращает id заказов"""
+        order_ids, order_rows, interval_rows = [], [], []
+        for validated_order_data in validated_orders:
+            order_id = validated_order_data.get('id')
+            delivery_minutes = parse_time_intervals(validated_order_data.get('delivery_hours'))
+            order_ids.append(order_id)
+            order_rows.append((
+                order_id,
+                validated_order_data.get('weight'),
+                validated_order_data.get('region'),
+                to_pg_array(validated_order_data.get('delivery_hours')),
+                to_pg_array(delivery_minutes),
+            ))
+            interval_rows.extend((order_id, to_pg_range(start, end)) for start, end in delivery_minutes)
+
+        with transaction.atomic():
+            RegionSerializer.bulk_create_regions(validated_orders, obj_key='region')
+            copy_rows(
+                Order._meta.db_table, ('id', 'weight', 'region_id', 'delivery_hours', 'delivery_minutes'), order_rows
+            )
+            copy_rows(OrderDeliveryInterval._meta.db_table, ('order_id', 'minutes'), interval_rows)
+        return order_ids
+
 
 class OrderListSerializerOut(base_serializers.Serializer):
     id = serializers.IntegerField(source='pk', read_only=True)
@@ -74,7 +108,31 @@ class OrdersAssignSerializer(base_serializers.ModelSerializer):
         with transaction.atomic():
             for instance in instances:
                 instance.courier_id = courier_id
-            Order.objects.bulk_update(instances, ['courier_id', 'assign_time'])
+            with stage('bulk_update'):
+                Order.objects.bulk_update(instances, ['courier_id', 'assign_time'])
+            if instances:
+                Courier.bump_versions([courier_id])
+        return instances
+
+
+class OrdersBatchAssignSerializer(base_serializers.Serializer):
+    courier_ids = base_serializers.UintListField(min_length=1, required=True)
+
+    class Meta:
+        fields = ('courier_ids',)
+
+    def update(self, instances, validated_data):
+        """instances - заказы по id курьера (см. Courier.get_suitable_orders_batch), записываются одним запросом"""
+        orders_to_update = []
+        for courier_id, orders in instances.items():
+            for order in orders:
+                order.courier_id = courier_id
+                orders_to_update.append(order)
+
+        with transaction.atomic():
+            with stage('bulk_update'):
+                Order.objects.bulk_update(orders_to_update, ['courier_id', 'assign_time'])
+            Courier.bump_versions([courier_id for courier_id, orders in instances.items() if orders])
         return instances
 
 
@@ -85,8 +143,16 @@ class OrderCompleteSerializer(base_serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         with transaction.atomic():
+            # курьер блокируется раньше заказа, в том же порядке, что и при назначении заказов
+            Courier.bump_versions([instance.courier_id])
+
+            # блокировка заказа не дает параллельным запросам выполнить его (и учесть в статистике) дважды
+            if not Order.objects.select_for_update().filter(pk=instance.pk, complete_time__isnull=True).exists():
+                raise Http400(details='Order does not exist')
+
             instance.complete_time = validated_data.get('complete_time')
             instance.save()
+            CourierRegionStats.register_completed_order(instance)
         return instance
 
 
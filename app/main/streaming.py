@@ -0,0 +1,139 @@
+import codecs
+import json
+import re
+from itertools import islice
+from typing import Any, BinaryIO, Iterable, Iterator, List
+
+
+__all__ = ['JSONStreamError', 'iter_json_array', 'chunked']
+
+
+READ_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+
+class JSONStreamError(ValueError):
+    """Некорректный JSON во входном потоке"""
+
+
+class _JSONStreamReader:
+    """
+    Читает JSON из байтового потока кусками по read_size и разбирает значения по одному через JSONDecoder.raw_decode,
+    поэтому в памяти одновременно находится только текущий кусок и разбираемое значение
+    """
+    decoder = json.JSONDecoder()
+
+    def __init__(self, stream: BinaryIO, read_size: int = READ_SIZE):
+        self._stream = stream
+        self._read_size = read_size
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self) -> bool:
+        """Дочитывает следующий кусок потока в буфер. Возвращает False, если поток закончился"""
+        if self._eof:
+            return False
+
+        data = self._stream.read(self._read_size)
+        self._eof = not data
+        try:
+            text = self._text_decoder.decode(data, final=self._eof)
+        except UnicodeDecodeError as e:
+            raise JSONStreamError(str(e))
+
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return not self._eof
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or not self._read_more():
+                return
+
+    def skip_if(self, char: str) -> bool:
+        """Пропускает символ char, если он следующий во входных данных"""
+        self._skip_whitespace()
+        if self._buffer.startswith(char, self._pos):
+            self._pos += 1
+            return True
+        return False
+
+    def expect(self, char: str):
+        if not self.skip_if(char):
+            raise JSONStreamError(f'Expecting {char!r}')
+
+    def expect_end(self):
+        self._skip_whitespace()
+        if self._pos < len(self._buffer):
+            raise JSONStreamError('Extra data')
+
+    def decode_value(self) -> Any:
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._read_more():
+                    continue
+                raise JSONStreamError(str(e))
+
+            # число в конце буфера могло быть обрезано на границе куска (например, 6.75 -> 6.)
+            is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if is_number and NUMBER_TAIL.fullmatch(self._buffer, end) and self._read_more():
+                continue
+
+            self._pos = end
+            return value
+
+
+def iter_json_array(stream: BinaryIO, key: str, read_size: int = READ_SIZE) -> Iterator[Any]:
+    """
+    Итерирует элементы массива payload[key], где payload - JSON-объект из байтового потока stream (например, тела запроса).
+    Элементы разбираются по мере чтения потока, поэтому payload не загружается в память целиком
+    """
+    reader = _JSONStreamReader(stream, read_size=read_size)
+    is_key_found = False
+
+    reader.expect('{')
+    if not reader.skip_if('}'):
+        while True:
+            name = reader.decode_value()
+            if not isinstance(name, str):
+                raise JSONStreamError('Expecting property name')
+            reader.expect(':')
+
+            if name == key:
+                is_key_found = True
+                reader.expect('[')
+                if not reader.skip_if(']'):
+                    while True:
+                        yield reader.decode_value()
+                        if reader.skip_if(']'):
+                            break
+                        reader.expect(',')
+            else:
+                reader.decode_value()
+
+            if reader.skip_if('}'):
+                break
+            reader.expect(',')
+    reader.expect_end()
+
+    if not is_key_found:
+        raise JSONStreamError(f'Field {key!r} is required')
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Разбивает items на списки по size элементов (последний список может быть короче)"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,150 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory
+
+from app.main.async_db import close_pool
+from app.main.async_views import courier_view, orders_assign_view, orders_complete_view
+from app.main.models import CourierRegionStats, Order
+from app.main.tests.test_order import CURRENT_DATE, COMPLETE_TIME
+from app.main.utils import reverse
+
+# асинхронные view работают с базой через отдельные соединения asyncpg, поэтому данные должны быть закоммичены
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+request_factory = AsyncRequestFactory()
+
+
+def run_views(*calls):
+    """Выполняет вызовы асинхронных view (view, method, path, data, kwargs) в одном event loop"""
+    async def run():
+        try:
+            responses = []
+            for view, method, path, data, kwargs in calls:
+                make_request = getattr(request_factory, method)
+                request = make_request(path, data=json.dumps(data), content_type='application/json') \
+                    if data is not None else make_request(path)
+                responses.append(await view(request, **kwargs))
+            return responses
+        finally:
+            await close_pool()
+
+    return [(resp.status_code, json.loads(resp.content)) for resp in async_to_sync(run)()]
+
+
+def sync_json(resp):
+    return resp.status_code, json.loads(resp.content)
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_async_views_match_sync_views(api_client, create_orders_and_couriers):
+    complete_data = {"courier_id": 1, "order_id": 1, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
+    [assign, complete, courier_info] = run_views(
+        (orders_assign_view, 'post', '/orders/assign', {'courier_id': 1}, {}),
+        (orders_complete_view, 'post', '/orders/complete', complete_data, {}),
+        (courier_view, 'get', '/couriers/1', None, {'courier_id': 1}),
+    )
+
+    assert assign == (200, {"orders": [{"id": 1}, {"id": 3}], "assign_time": '2021-03-29T11:00:00Z'})
+    assert complete == (200, {'order_id': 1})
+    assert courier_info == sync_json(api_client.get('/couriers/1')) == (200, {
+        'courier_id': 1, 'courier_type': 'foot', 'working_hours': ['11:35-14:05', '09:00-18:00'],
+        'regions': [1, 12, 22], 'rating': 2.5, 'earnings': 1000
+    })
+    assert list(Order.objects.filter(courier_id=1).order_by('id').values_list('id', 'assign_time', 'complete_time')) == [
+        (1, CURRENT_DATE, COMPLETE_TIME), (3, CURRENT_DATE, None)
+    ]
+    assert CourierRegionStats.objects.get(courier_id=1, region_id=12).completed_orders_count == 1
+
+    # повторное назначение возвращает уже назначенные заказы, как и синхронная view
+    assert run_views((orders_assign_view, 'post', '/orders/assign', {'courier_id': 1}, {})) == [
+        sync_json(api_client.post(reverse('main:orders_assign'), {'courier_id': 1}))
+    ]
+
+
+@pytest.mark.parametrize('async_view,path,data,kwargs', argvalues=[
+    (orders_assign_view, '/orders/assign', {'courier_id': 10}, {}),
+    (orders_assign_view, '/orders/assign', {'courier': 1}, {}),
+    (orders_complete_view, '/orders/complete', {"courier_id": 1, "order_id": 2, "complete_time": "2021-03-29T11:30:00"}, {}),
+    (orders_complete_view, '/orders/complete', {"courier_id": 1, "order_id": 1}, {}),
+    (courier_view, '/couriers/10', None, {'courier_id': 10}),
+])
+def test_async_views_errors_match_sync_views(async_view, path, data, kwargs, api_client, create_orders_and_couriers):
+    method = 'get' if data is None else 'post'
+    [async_resp] = run_views((async_view, method, path, data, kwargs))
+    assert async_resp == sync_json(getattr(api_client, method)(path, data))
+    assert async_resp[0] == 400
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_async_complete_before_assign_matches_sync_view(api_client, create_orders_and_couriers):
+    api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
+    data = {"courier_id": 1, "order_id": 1, "complete_time": "2021-03-29T10:00:00"}
+
+    [async_resp] = run_views((orders_complete_view, 'post', '/orders/complete', data, {}))
+    assert async_resp == sync_json(api_client.post('/orders/complete', data))
+    assert async_resp == (400, {
+        'validation_error': {"complete_time can't be less than assign_time": None}, 'details': None
+    })
+    assert Order.objects.get(pk=1).complete_time is None
+    assert not CourierRegionStats.objects.filter(courier_id=1, completed_orders_count__gt=0).exists()
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_async_assign_concurrent_couriers_get_disjoint_orders(api_client):
+    couriers_count, orders_count = 8, 100
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [
+            {"courier_id": courier_id, "courier_type": "car", "regions": [1], "working_hours": ["09:00-18:00"]}
+            for courier_id in range(1, couriers_count + 1)
+        ]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {"order_id": order_id, "weight": 2, "region": 1, "delivery_hours": ["09:00-18:00"]}
+            for order_id in range(1, orders_count + 1)
+        ]
+    })
+
+    async def assign_all():
+        try:
+            return await asyncio.gather(*(
+                orders_assign_view(request_factory.post(
+                    '/orders/assign', data=json.dumps({'courier_id': courier_id}), content_type='application/json'
+                ))
+                for courier_id in range(1, couriers_count + 1)
+            ))
+        finally:
+            await close_pool()
+
+    assigned = [
+        order['id']
+        for resp in async_to_sync(assign_all)()
+        for order in json.loads(resp.content)['orders']
+    ]
+    assert len(assigned) == len(set(assigned)) == orders_count
+
+
+def test_async_courier_view_uses_courier_cache(api_client, create_orders_and_couriers, shared_cache_settings):
+    etag = api_client.get('/couriers/1')['ETag']
+
+    async def get_courier(if_none_match=None):
+        try:
+            request = request_factory.get('/couriers/1')
+            if if_none_match:
+                request.META['HTTP_IF_NONE_MATCH'] = if_none_match
+            return await courier_view(request, courier_id=1)
+        finally:
+            await close_pool()
+
+    # ответ берется из кеша, который заполнила синхронная view, поэтому пул asyncpg даже не создается
+    with patch('app.main.async_views.get_pool', side_effect=AssertionError):
+        not_modified, cached = async_to_sync(get_courier)(etag), async_to_sync(get_courier)()
+
+    assert (not_modified.status_code, not_modified['ETag']) == (304, etag)
+    assert (cached.status_code, cached['ETag']) == (200, etag)
+    assert json.loads(cached.content) == sync_json(api_client.get('/couriers/1'))[1]
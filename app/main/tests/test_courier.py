@@ -1,7 +1,13 @@
+from datetime import timedelta
+from random import Random
 from unittest.mock import patch
 
 import pytest
 
+from django.core.management import call_command
+
+from app.main.intervals import parse_time_intervals
+from app.main.models import Courier, CourierRegionStats, Order, Region
 from app.main.tests.test_order import CURRENT_DATE, COMPLETE_TIME
 from app.main.utils import reverse
 
@@ -83,6 +89,20 @@ def test_couriers_create_failed_properly_collect_invalid_items(api_client):
     assert resp.status_code == 400
 
 
+def test_couriers_stream_create_successful(api_client, payload_to_create_couriers, settings):
+    settings.BULK_IMPORT_CHUNK_SIZE = 2
+    resp = api_client.post(reverse('main:couriers__create', query_kwargs={'stream': 'true'}), payload_to_create_couriers)
+    assert resp.data == {'couriers': [{'id': 1}, {'id': 2}, {'id': 3}]}
+    assert resp.status_code == 201
+
+    for courier_data in payload_to_create_couriers['data']:
+        courier = Courier.objects.get(id=courier_data['courier_id'])
+        assert courier.courier_type == courier_data['courier_type']
+        assert courier.working_hours == courier_data['working_hours']
+        assert courier.working_minutes == parse_time_intervals(courier_data['working_hours'])
+        assert sorted(courier.regions.values_list('id', flat=True)) == sorted(courier_data['regions'])
+
+
 @pytest.mark.parametrize('payload_to_update,updated_courier', argvalues=[
     (
             {'regions': [5, 7]},
@@ -107,6 +127,39 @@ def test_courier_patch_successful(payload_to_update, updated_courier, api_client
     assert resp.status_code == 200
 
 
+def test_courier_patch_updates_working_minutes(api_client):
+    payload_to_create = {
+        "data": [{"courier_id": 1, "courier_type": "foot", "regions": [1], "working_hours": ["09:00-18:00"]}]
+    }
+    api_client.post(reverse('main:couriers__create'), payload_to_create)
+    assert Courier.objects.get(id=1).working_minutes == [[540, 1080]]
+
+    resp = api_client.patch('/couriers/1', {'working_hours': ["16:00-19:00", "09:00-11:00"]})
+    assert resp.data['working_hours'] == ["09:00-11:00", "16:00-19:00"]
+    assert Courier.objects.get(id=1).working_minutes == [[540, 660], [960, 1140]]
+
+
+def test_courier_region_ids_follow_regions(api_client):
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [
+            {"courier_id": 1, "courier_type": "foot", "regions": [12, 1], "working_hours": ["09:00-18:00"]},
+            {"courier_id": 2, "courier_type": "foot", "regions": [1, 5], "working_hours": ["09:00-18:00"]},
+        ]
+    })
+    api_client.post(reverse('main:couriers__create', query_kwargs={'stream': 'true'}), {
+        "data": [{"courier_id": 3, "courier_type": "car", "regions": [7, 1], "working_hours": ["09:00-18:00"]}]
+    })
+    assert list(Courier.objects.order_by('id').values_list('region_ids', flat=True)) == [[1, 12], [1, 5], [1, 7]]
+
+    resp = api_client.patch('/couriers/1', {'regions': [5, 7]})
+    assert sorted(resp.data['regions']) == [5, 7]
+    assert Courier.objects.get(id=1).region_ids == [5, 7]
+    # районы других курьеров не меняются
+    assert sorted(Courier.objects.get(id=2).regions.values_list('id', flat=True)) == [1, 5]
+    assert sorted(Courier.get_region_couriers(1).values_list('id', flat=True)) == [2, 3]
+    assert sorted(Courier.get_region_couriers(5).values_list('id', flat=True)) == [1, 2]
+
+
 @pytest.mark.parametrize('payload_to_update', argvalues=[
     ({'region': [7]}), ({}), ({'courier_type': 'root'}), ({'not_described_field': 'car'})
 ])
@@ -120,7 +173,7 @@ def test_courier_patch_failed(payload_to_update, api_client):
     assert resp.status_code == 400
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_get_courier_info_successful(api_client, create_orders_and_couriers):
     courier_id = 1
     api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
@@ -138,7 +191,7 @@ def test_get_courier_info_successful(api_client, create_orders_and_couriers):
     }
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_get_courier_info_successful_without_complete_orders(api_client, create_orders_and_couriers):
     courier_id = 1
     api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
@@ -152,8 +205,146 @@ def test_get_courier_info_successful_without_complete_orders(api_client, create_
     }
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_get_courier_info_failed_not_found_courier(api_client, create_orders_and_couriers):
     courier_id = 10
     resp = api_client.get(f'/couriers/{courier_id}')
     assert resp.status_code == 400
+
+
+def naive_rating_and_earnings(courier_id):
+    """Рейтинг и заработок курьера, посчитанные напрямую по истории выполненных заказов"""
+    orders_by_region = {}
+    for order in Order.objects.filter(courier_id=courier_id, complete_time__isnull=False):
+        orders_by_region.setdefault(order.region_id, []).append(order)
+
+    average_times = []
+    for orders in orders_by_region.values():
+        orders = sorted(orders, key=lambda x: (x.complete_time, x.assign_time))
+        previous_times = [orders[0].assign_time] + [order.complete_time for order in orders[:-1]]
+        delivery_times = [
+            (order.complete_time - previous_time).total_seconds()
+            for order, previous_time in zip(orders, previous_times)
+        ]
+        average_times.append(sum(delivery_times) / len(delivery_times))
+
+    completed_count = sum(map(len, orders_by_region.values()))
+    return Courier.calculate_rating(min(average_times)), 500 * completed_count * 2
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_courier_stats_match_order_history(api_client):
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [{"courier_id": 1, "courier_type": "foot", "regions": [1, 2], "working_hours": ["09:00-18:00"]}]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {"order_id": order_id, "weight": 1, "region": order_id % 2 + 1, "delivery_hours": ["09:00-18:00"]}
+            for order_id in range(1, 9)
+        ]
+    })
+    api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
+
+    # заказы выполняются не по порядку
+    for order_id, minutes in [(3, 40), (1, 25), (2, 10), (6, 50), (4, 65), (5, 70)]:
+        complete_time = CURRENT_DATE + timedelta(minutes=minutes, seconds=order_id)
+        resp = api_client.post(reverse('main:orders_complete'), {
+            "courier_id": 1, "order_id": order_id, "complete_time": complete_time.strftime('%Y-%m-%dT%H:%M:%S')
+        })
+        assert resp.status_code == 200
+
+    resp = api_client.get('/couriers/1')
+    assert (resp.data['rating'], resp.data['earnings']) == naive_rating_and_earnings(1)
+
+    incremental_stats = list(CourierRegionStats.objects.order_by('region_id').values())
+    call_command('backfill_courier_stats')
+    rebuilt_stats = list(CourierRegionStats.objects.order_by('region_id').values())
+    assert [{**stats, 'id': None} for stats in incremental_stats] == [{**stats, 'id': None} for stats in rebuilt_stats]
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_get_courier_info_does_not_read_order_history(api_client, create_orders_and_couriers, django_assert_num_queries):
+    api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
+    complete_data = {"courier_id": 1, "order_id": 1, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
+    api_client.post(reverse('main:orders_complete'), complete_data)
+
+    # версия курьера (без общего кеша), курьер, районы курьера, статистика по районам
+    with django_assert_num_queries(4):
+        resp = api_client.get('/couriers/1')
+    assert resp.data['rating'] == 2.5
+
+
+@pytest.fixture
+def completed_orders_history():
+    random = Random(9)
+    couriers = Courier.objects.bulk_create([
+        Courier(id=courier_id, courier_type=random.choice(['foot', 'bike', 'car']), working_hours=['09:00-18:00'])
+        for courier_id in range(1, 11)
+    ])
+    regions = Region.objects.bulk_create([Region(id=region_id) for region_id in range(1, 4)])
+    orders = []
+    for courier in couriers[:-1]:
+        for _ in range(random.randint(1, 8)):
+            assign_time = CURRENT_DATE + timedelta(seconds=random.randint(0, 3600), microseconds=random.randint(0, 10 ** 6))
+            orders.append(Order(
+                weight=1, region=random.choice(regions), delivery_hours=['09:00-18:00'], courier=courier,
+                assign_time=assign_time,
+                complete_time=assign_time + timedelta(seconds=random.randint(60, 5400), microseconds=random.randint(0, 10 ** 6))
+            ))
+    Order.objects.bulk_create(orders)
+    CourierRegionStats.rebuild()
+    return couriers
+
+
+def test_couriers_leaderboard_matches_courier_rating_and_earnings(api_client, completed_orders_history):
+    resp = api_client.get(reverse('main:couriers_leaderboard'))
+    assert resp.status_code == 200
+
+    expected = []
+    for courier in Courier.objects.filter(orders__complete_time__isnull=False).distinct().order_by('pk'):
+        expected.append({
+            'courier_id': courier.pk, 'courier_type': courier.courier_type,
+            'rating': courier.rating, 'earnings': courier.earnings
+        })
+    assert sorted(resp.data['couriers'], key=lambda x: x['courier_id']) == expected
+    ratings = [courier['rating'] for courier in resp.data['couriers']]
+    assert ratings == sorted(ratings, reverse=True)
+
+
+def test_couriers_leaderboard_filtered_by_region_and_limited(api_client, completed_orders_history):
+    resp = api_client.get(reverse('main:couriers_leaderboard'))
+    region_courier_ids = set(Order.objects.filter(region_id=2).values_list('courier_id', flat=True))
+
+    resp_by_region = api_client.get(reverse('main:couriers_leaderboard'), {'region': 2, 'limit': 3})
+    assert resp_by_region.status_code == 200
+    assert resp_by_region.data['couriers'] == [
+        courier for courier in resp.data['couriers'] if courier['courier_id'] in region_courier_ids
+    ][:3]
+
+
+@pytest.mark.parametrize('params', argvalues=[{'limit': 0}, {'limit': 'ten'}, {'region': -1}])
+def test_couriers_leaderboard_failed_invalid_params(params, api_client):
+    resp = api_client.get(reverse('main:couriers_leaderboard'), params)
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize('orders_count', argvalues=[2, 40])
+def test_courier_patch_unassigns_orders_with_constant_number_of_queries(
+        orders_count, api_client, django_assert_max_num_queries
+):
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [{"courier_id": 1, "courier_type": "car", "regions": [1, 2], "working_hours": ["00:00-23:59"]}]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {"order_id": order_id, "weight": 1, "region": order_id % 2 + 1, "delivery_hours": ["00:00-23:59"]}
+            for order_id in range(1, orders_count + 1)
+        ]
+    })
+    Order.objects.update(courier_id=1, assign_time=CURRENT_DATE)
+
+    with django_assert_max_num_queries(10):
+        resp = api_client.patch('/couriers/1', {'regions': [1]})
+    assert resp.status_code == 200
+    assert set(Order.objects.filter(courier_id=1).values_list('region_id', flat=True)) == {1}
+    assert Order.objects.filter(courier__isnull=True, assign_time__isnull=True).count() == orders_count // 2
@@ -0,0 +1,126 @@
+from unittest.mock import patch
+
+import pytest
+
+from django.core.management import call_command
+from django.db.models import F
+
+from app.main import courier_cache
+from app.main.courier_cache import LRUCache
+from app.main.models import Courier
+from app.main.tests.test_order import COMPLETE_TIME, CURRENT_DATE
+from app.main.utils import reverse
+
+pytestmark = [pytest.mark.django_db]
+
+
+def get_courier(api_client, etag=None):
+    return api_client.get('/couriers/1', HTTP_IF_NONE_MATCH=etag) if etag else api_client.get('/couriers/1')
+
+
+def test_courier_info_is_cached_by_version(api_client, create_orders_and_couriers, django_assert_num_queries):
+    resp = get_courier(api_client)
+    assert resp.status_code == 200
+    assert resp['ETag'] == '"courier-1-v1"'
+
+    # без общего кеша из базы читается только версия курьера
+    with django_assert_num_queries(3):
+        cached_resp = get_courier(api_client)
+        not_modified_resp = get_courier(api_client, etag=resp['ETag'])
+        weak_match_resp = get_courier(api_client, etag=f'"courier-1-v0", W/{resp["ETag"]}')
+
+    assert (cached_resp.status_code, cached_resp.data, cached_resp['ETag']) == (200, resp.data, resp['ETag'])
+    assert (not_modified_resp.status_code, not_modified_resp.content, not_modified_resp['ETag']) == (
+        304, b'', resp['ETag']
+    )
+    assert weak_match_resp.status_code == 304
+
+
+def test_other_worker_changes_are_visible_without_shared_tier(api_client, create_orders_and_couriers):
+    etag = get_courier(api_client)['ETag']
+
+    # изменение в другом воркере: кеш этого процесса о нем не знает
+    Courier.objects.filter(pk=1).update(courier_type='car', version=F('version') + 1)
+    resp = get_courier(api_client, etag=etag)
+    assert (resp.status_code, resp['ETag'], resp.data['courier_type']) == (200, '"courier-1-v2"', 'car')
+
+
+# версия в кеше сбрасывается после коммита (transaction.on_commit), поэтому нужны настоящие транзакции
+@pytest.mark.django_db(transaction=True)
+def test_courier_writes_bump_version(api_client, create_orders_and_couriers):
+    etag = get_courier(api_client)['ETag']
+
+    with patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE):
+        api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
+    resp = get_courier(api_client, etag=etag)
+    assert (resp.status_code, resp['ETag']) == (200, '"courier-1-v2"')
+    assert 'rating' not in resp.data
+
+    complete_data = {"courier_id": 1, "order_id": 1, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
+    api_client.post(reverse('main:orders_complete'), complete_data)
+    resp = get_courier(api_client, etag=resp['ETag'])
+    assert (resp.status_code, resp['ETag'], resp.data['rating'], resp.data['earnings']) == (
+        200, '"courier-1-v3"', 2.5, 1000
+    )
+
+    api_client.patch('/couriers/1', {'courier_type': 'car'}, format='json')
+    resp = get_courier(api_client, etag=resp['ETag'])
+    assert (resp.status_code, resp['ETag'], resp.data['courier_type'], resp.data['earnings']) == (
+        200, '"courier-1-v4"', 'car', 4500
+    )
+
+    call_command('backfill_courier_stats')
+    assert get_courier(api_client, etag=resp['ETag'])['ETag'] == '"courier-1-v5"'
+    assert Courier.objects.get(pk=2).version == 2
+
+
+def test_failed_write_does_not_bump_version(api_client, create_orders_and_couriers):
+    etag = get_courier(api_client)['ETag']
+
+    complete_data = {"courier_id": 1, "order_id": 1, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
+    assert api_client.post(reverse('main:orders_complete'), complete_data).status_code == 400
+
+    assert Courier.objects.get(pk=1).version == 1
+    assert get_courier(api_client, etag=etag).status_code == 304
+
+
+@pytest.mark.django_db(transaction=True)
+def test_shared_tier_serves_other_workers(
+        api_client, create_orders_and_couriers, shared_cache_settings, django_assert_num_queries
+):
+    etag = get_courier(api_client)['ETag']
+    # другой воркер: пустой LRU, но общий кеш тот же
+    courier_cache._local.clear()
+
+    with django_assert_num_queries(0):
+        assert get_courier(api_client, etag=etag).status_code == 304
+        assert get_courier(api_client).data['courier_id'] == 1
+
+    # изменение в другом воркере сбрасывает версию в общем кеше
+    api_client.patch('/couriers/1', {'courier_type': 'car'}, format='json')
+    resp = get_courier(api_client, etag=etag)
+    assert (resp.status_code, resp['ETag'], resp.data['courier_type']) == (200, '"courier-1-v2"', 'car')
+
+
+def test_stale_version_does_not_replace_newer(shared_cache_settings):
+    # запрос прочитал курьера до коммита изменений, а сохраняет ответ уже после записи новой версии
+    courier_cache.set_courier_versions({1: 3})
+    courier_cache.set_courier_info(1, 2, {'courier_id': 1})
+    # старая версия перезаписала новую, но отмечена устаревшей, поэтому версия будет прочитана из базы
+    assert courier_cache.get_courier_info(1) == (None, None)
+
+    courier_cache.set_courier_info(1, 4, {'courier_id': 1})
+    assert courier_cache.get_courier_info(1) == (4, {'courier_id': 1})
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert (cache.get('a'), cache.get('b'), cache.get('c'), len(cache)) == (1, None, 3, 2)
+
+    cache.set('d', 4, ttl=-1)
+    assert cache.get('d') is None
@@ -0,0 +1,159 @@
+import threading
+import time
+
+import psycopg2
+import pytest
+
+from django.db import connection, connections
+from prometheus_client import REGISTRY
+
+from app.main.db_backends.postgresql_pool.base import DatabaseWrapper
+from app.main.db_backends.postgresql_pool.pool import (
+    ConnectionPool, PoolTimeout, close_pools, per_worker_max_size
+)
+
+pytestmark = [pytest.mark.django_db]
+
+
+def make_pool(**kwargs):
+    conn_params = connection.get_connection_params()
+    return ConnectionPool(lambda: psycopg2.connect(**conn_params), **kwargs)
+
+
+def backend_pid(conn):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT pg_backend_pid()')
+        return cursor.fetchone()[0]
+
+
+def test_pool_reuses_connections():
+    pool = make_pool(min_size=1, max_size=2)
+    conn = pool.getconn()
+    pid = backend_pid(conn)
+    pool.putconn(conn)
+
+    conn = pool.getconn()
+    assert backend_pid(conn) == pid
+    pool.putconn(conn)
+    assert pool.stats()['connections_opened'] == 1
+    assert pool.stats()['checkouts'] == 2
+    pool.close()
+
+
+def test_pool_waits_for_free_connection_and_times_out():
+    pool = make_pool(max_size=1, timeout=0.05)
+    conn = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    pool.timeout = 5
+    threading.Timer(0.1, pool.putconn, args=[conn]).start()
+    assert pool.getconn() is conn
+
+    stats = pool.stats()
+    assert (stats['size'], stats['in_use'], stats['waits'], stats['timeouts']) == (1, 1, 2, 1)
+    assert 0.05 <= stats['wait_time_max'] <= stats['wait_time_total'] < 5
+    pool.putconn(conn)
+    pool.close()
+
+
+def test_pool_exports_metrics():
+    def sample(name):
+        return REGISTRY.get_sample_value(name, {'alias': 'metrics_test'}) or 0
+
+    pool = make_pool(max_size=1, timeout=0.05, name='metrics_test')
+    conn = pool.getconn()
+    assert sample('candy_delivery_db_pool_in_use') == 1
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    pool.putconn(conn)
+
+    stats = pool.stats()
+    assert sample('candy_delivery_db_pool_in_use') == stats['in_use'] == 0
+    assert sample('candy_delivery_db_pool_waits_total') == stats['waits'] == 1
+    assert sample('candy_delivery_db_pool_timeouts_total') == stats['timeouts'] == 1
+    assert sample('candy_delivery_db_pool_wait_seconds_count') == 1
+    assert sample('candy_delivery_db_pool_wait_seconds_sum') == pytest.approx(stats['wait_time_total'])
+    assert sample('candy_delivery_db_pool_wait_max_seconds') == pytest.approx(stats['wait_time_max'])
+    pool.close()
+
+
+def test_pool_concurrent_checkouts_do_not_exceed_max_size():
+    pool = make_pool(max_size=3, timeout=10)
+    max_in_use, lock = [0], threading.Lock()
+
+    def work():
+        for _ in range(5):
+            conn = pool.getconn()
+            with lock:
+                max_in_use[0] = max(max_in_use[0], pool.stats()['in_use'])
+            backend_pid(conn)
+            time.sleep(0.005)
+            pool.putconn(conn)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max_in_use[0] <= 3
+    assert pool.stats()['connections_opened'] <= 3
+    pool.close()
+
+
+def test_pool_replaces_broken_connection_on_checkout():
+    pool = make_pool(max_size=1, health_check_interval=0)
+    conn = pool.getconn()
+    pid = backend_pid(conn)
+    pool.putconn(conn)
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+    conn = pool.getconn()
+    assert backend_pid(conn) != pid
+    assert pool.stats()['health_check_failures'] == 1
+    pool.putconn(conn)
+    pool.close()
+
+
+def test_pool_rolls_back_returned_connection():
+    pool = make_pool(max_size=1)
+    conn = pool.getconn()
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    assert conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    pool.close()
+
+
+@pytest.mark.parametrize('max_size,host_budget,workers,expected', argvalues=[
+    (10, 0, 9, 10),
+    (10, 90, 9, 10),
+    (10, 45, 9, 5),
+    (10, 4, 9, 1),
+])
+def test_per_worker_max_size(max_size, host_budget, workers, expected):
+    assert per_worker_max_size(max_size, host_budget, workers) == expected
+
+
+def test_pooled_backend_returns_connection_to_pool_on_close():
+    settings_dict = {**connections['default'].settings_dict, 'ENGINE': 'app.main.db_backends.postgresql_pool'}
+    try:
+        wrapper = DatabaseWrapper(settings_dict, alias='default')
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            pid = cursor.fetchone()[0]
+        wrapper.close()
+        assert wrapper.pool.stats()['idle'] == 1
+
+        other_wrapper = DatabaseWrapper(settings_dict, alias='default')
+        with other_wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            assert cursor.fetchone()[0] == pid
+        assert other_wrapper.pool is wrapper.pool
+        other_wrapper.close()
+    finally:
+        close_pools()
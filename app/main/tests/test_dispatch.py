@@ -0,0 +1,127 @@
+import random
+
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+
+from django.core.management import call_command
+
+from app.main import dispatch
+from app.main.dispatch import dispatch_orders, partition
+from app.main.models import Courier, Order
+from app.main.tests.test_order import CURRENT_DATE
+from app.main.utils import reverse
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def city(api_client):
+    rnd = random.Random(42)
+    courier_types, hours = ['foot', 'bike', 'car'], ['09:00-12:00', '10:30-11:30', '12:00-18:00', '07:00-10:00']
+    # районы 1-4 и 5-8 связаны только внутри своей группы, курьер 13 работает в районе 9 без заказов
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [
+            {
+                "courier_id": courier_id,
+                "courier_type": rnd.choice(courier_types),
+                "regions": rnd.sample(range(1, 5) if courier_id % 2 else range(5, 9), rnd.randint(1, 2)),
+                "working_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for courier_id in range(1, 13)
+        ] + [{"courier_id": 13, "courier_type": "car", "regions": [9], "working_hours": ["09:00-18:00"]}]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {
+                "order_id": order_id,
+                "weight": rnd.randint(1, 1500) / 100,
+                "region": rnd.randint(1, 8),
+                "delivery_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for order_id in range(1, 150)
+        ]
+    })
+
+
+def test_partition_by_connected_regions():
+    couriers = [
+        (1, 'foot', [], [1, 2]), (2, 'bike', [], [3]), (3, 'car', [], [2, 3]), (4, 'car', [], [7]), (5, 'car', [], []),
+    ]
+    orders = [(1, 1, 1, []), (2, 3, 1, []), (3, 7, 1, []), (4, 8, 1, [])]
+
+    components = sorted(
+        ([courier[0] for courier in couriers], [order[0] for order in orders])
+        for couriers, orders in partition(couriers, orders)
+    )
+    assert components == [([1, 2, 3], [1, 2]), ([4], [3])]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_dispatch_matches_batch_assign(workers, api_client, city):
+    # уже назначенные заказы занимают место у курьера
+    api_client.post(reverse('main:orders_assign'), {'courier_id': 3})
+    assigned_before = set(Order.objects.filter(courier_id=3).values_list('id', flat=True))
+    assert assigned_before
+
+    result = dispatch_orders(today=CURRENT_DATE, workers=workers)
+    dispatched = {courier_id: [order.id for order in orders] for courier_id, orders in result.items()}
+    assert len(dispatched) > 2
+    written = {}
+    for courier_id, order_id in (
+        Order.objects.filter(assign_time=CURRENT_DATE).exclude(id__in=assigned_before).values_list('courier_id', 'id')
+    ):
+        written.setdefault(courier_id, set()).add(order_id)
+    assert written == {courier_id: set(orders_ids) for courier_id, orders_ids in dispatched.items()}
+    assert Courier.objects.get(pk=min(dispatched.keys() - {3})).version == 2
+
+    Order.objects.exclude(id__in=assigned_before).update(courier_id=None, assign_time=None)
+    resp = api_client.post(reverse('main:orders_assign_batch'), {'courier_ids': list(range(1, 14))})
+    batch = {
+        item['courier_id']: [order['id'] for order in item['orders'] if order['id'] not in assigned_before]
+        for item in resp.data['couriers']
+    }
+    assert dispatched == {courier_id: orders_ids for courier_id, orders_ids in batch.items() if orders_ids}
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_dispatch_retries_components_changed_while_solving(api_client, city):
+    solve_components = dispatch._solve_components
+    calls = []
+
+    def assign_while_solving(components, *args):
+        # пока компоненты решаются без блокировок, курьер 3 набирает заказы обычным запросом
+        if not calls:
+            api_client.post(reverse('main:orders_assign'), {'courier_id': 3})
+        calls.append({courier[0] for component in components for courier in component[0]})
+        return solve_components(components, *args)
+
+    with patch('app.main.dispatch._solve_components', new=assign_while_solving):
+        result = dispatch_orders(today=CURRENT_DATE, workers=1)
+    assigned_concurrently = set(Order.objects.filter(courier_id=3).values_list('id', flat=True)) - {
+        order.id for order in result.get(3, [])
+    }
+    assert assigned_concurrently
+
+    # заново решается только компонента курьера 3
+    assert len(calls) == 2 and 3 in calls[1] and calls[1] < calls[0]
+
+    written = {}
+    for courier_id, order_id in (
+        Order.objects.filter(assign_time=CURRENT_DATE).exclude(id__in=assigned_concurrently)
+        .values_list('courier_id', 'id')
+    ):
+        written.setdefault(courier_id, set()).add(order_id)
+    assert written == {courier_id: {order.id for order in orders} for courier_id, orders in result.items()}
+    for courier in Courier.objects.all():
+        assert sum(Order.objects.filter(courier_id=courier.pk).values_list('weight', flat=True)) <= courier.max_weight
+
+
+@patch('app.main.management.commands.dispatch_orders.timezone.now', new=lambda: CURRENT_DATE)
+def test_dispatch_orders_command(city):
+    out = StringIO()
+    call_command('dispatch_orders', '--couriers', '1', '2', '--workers', '1', stdout=out)
+
+    assigned = Order.objects.filter(courier_id__isnull=False)
+    assert set(assigned.values_list('courier_id', flat=True)) == {1, 2}
+    assert out.getvalue().strip() == f'Orders dispatched: {assigned.count()} orders to 2 couriers'
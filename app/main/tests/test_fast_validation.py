@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from rest_framework.validators import ValidationError
+
+from app.main.fast_validation import validate_courier, validate_order
+from app.main.serializers.courier import CourierListSerializer, CourierSerializer
+from app.main.serializers.order import OrderListSerializer, OrderSerializer
+
+
+ORDER_VALUES = {
+    'order_id': [1, 0, -5, 10 ** 12, 1.0, 1.5, '7', 'a', True, None, [1]],
+    'weight': [1, 50, 51, 0, 0.01, 0.001, 0.005, 49.99, 50.0, 50.01, 12.5, -1, 1e-05, '1.5', 'x', True, None, 100.0],
+    'region': [1, 0, -3, 2.0, '12', 'x', False, None],
+    'delivery_hours': [
+        ['09:00-18:00'], [], ['00:00-23:59', '12:00-12:00'], ['9:00-18:00'], ['09:00 - 18:00'], [' 09:00-18:00'],
+        ['18:00-09:00'], ['24:00-24:30'], ['09:60-10:00'], ['0900-18:00'], ['09:00-18:00-'], '09:00-18:00',
+        [None], [900], ['09:00-18:00', 'x'], None,
+    ],
+}
+
+COURIER_VALUES = {
+    'courier_id': [1, 0, -1, 1.0, '1', 'x', True, None],
+    'courier_type': ['foot', 'bike', 'car', 'Foot', 'truck', '', 1, ['car'], None],
+    'regions': [[1], [0, 12, 22], [], [-1], [1.0], ['1'], [True], 1, None],
+    'working_hours': [['09:00-18:00'], [], ['09:00-11:00', '11:35-14:05'], ['11:00-09:00'], ['9:5-10:00'], 'x', None],
+}
+
+
+def random_item(values, rnd):
+    item = {}
+    for key, key_values in values.items():
+        if rnd.random() < 0.95:
+            item[key] = rnd.choice(key_values)
+    if rnd.random() < 0.1:
+        item['unknown'] = 1
+    return item
+
+
+def drf_validate(serializer_cls, item):
+    try:
+        return serializer_cls().run_validation(item)
+    except ValidationError:
+        return None
+
+
+@pytest.mark.parametrize('fast_validator,serializer_cls,values', argvalues=[
+    (validate_order, OrderSerializer, ORDER_VALUES),
+    (validate_courier, CourierSerializer, COURIER_VALUES),
+])
+def test_fast_validator_agrees_with_drf(fast_validator, serializer_cls, values):
+    rnd = random.Random(13)
+    fast_accepted_count = 0
+    for _ in range(3000):
+        item = random_item(values, rnd)
+        fast_validated = fast_validator(item)
+        if fast_validated is not None:
+            fast_accepted_count += 1
+            # быстрая проверка принимает только то, что принимает DRF, и с тем же результатом
+            assert fast_validated == drf_validate(serializer_cls, item), item
+    assert fast_accepted_count > 0
+
+
+@pytest.mark.parametrize('serializer_list_cls,item_serializer_cls,values', argvalues=[
+    (OrderListSerializer, OrderSerializer, ORDER_VALUES),
+    (CourierListSerializer, CourierSerializer, COURIER_VALUES),
+])
+def test_list_serializer_matches_drf_decisions_and_errors(serializer_list_cls, item_serializer_cls, values):
+    rnd = random.Random(17)
+    for _ in range(200):
+        payload = {'data': [random_item(values, rnd) for _ in range(rnd.randint(1, 4))]}
+        serializer = serializer_list_cls(data=payload)
+        drf_serializer = item_serializer_cls(data=payload['data'], many=True)
+
+        assert serializer.is_valid() == drf_serializer.is_valid()
+        if drf_serializer.errors:
+            assert serializer.errors == {'data': drf_serializer.errors}
+        else:
+            assert serializer.validated_data == {'data': drf_serializer.validated_data}
@@ -0,0 +1,97 @@
+import pytest
+
+from django.db import connection
+
+from app.main.models import Courier, Order
+from app.main.tests.test_order import CURRENT_DATE
+
+pytestmark = [pytest.mark.django_db, pytest.mark.slow]
+
+ORDERS_COUNT = 1_000_000
+COURIERS_COUNT = 1000
+REGIONS_COUNT = 100
+
+
+@pytest.fixture(scope='module')
+def million_orders(django_db_setup, django_db_blocker):
+    """
+    1M заказов, из которых ~98% выполнены, ~1% назначены и ~1% свободны.
+    Данные генерируются на стороне базы один раз на модуль и удаляются после тестов
+    """
+    with django_db_blocker.unblock(), connection.cursor() as cursor:
+        cursor.execute('INSERT INTO main_region (id) SELECT generate_series(1, %s)', [REGIONS_COUNT])
+        cursor.execute(
+            '''
+            INSERT INTO main_courier (id, courier_type, working_hours, working_minutes, region_ids)
+            SELECT g, 'car', '{"09:00-18:00"}', '{{540,1080}}', ARRAY[g %% %s + 1] FROM generate_series(1, %s) g
+            ''',
+            [REGIONS_COUNT, COURIERS_COUNT]
+        )
+        cursor.execute(
+            '''
+            INSERT INTO main_region_m2m_courier (courier_id, region_id)
+            SELECT g, g %% %s + 1 FROM generate_series(1, %s) g
+            ''',
+            [REGIONS_COUNT, COURIERS_COUNT]
+        )
+        cursor.execute(
+            '''
+            INSERT INTO main_order
+                (id, weight, region_id, courier_id, assign_time, complete_time, delivery_hours, delivery_minutes)
+            SELECT
+                g,
+                (g %% 5000 + 1) / 100.0,
+                g %% %(regions)s + 1,
+                CASE WHEN g %% 100 = 0 THEN NULL ELSE g %% %(couriers)s + 1 END,
+                CASE WHEN g %% 100 = 0 THEN NULL ELSE now() - interval '1 day' END,
+                CASE WHEN g %% 100 IN (0, 1) THEN NULL ELSE now() - interval '23 hours' END,
+                '{"09:00-18:00"}',
+                '{{540,1080}}'
+            FROM generate_series(1, %(orders)s) g
+            ''',
+            {'regions': REGIONS_COUNT, 'couriers': COURIERS_COUNT, 'orders': ORDERS_COUNT}
+        )
+        cursor.execute(
+            '''
+            INSERT INTO main_orderdeliveryinterval (order_id, minutes)
+            SELECT id, int4range(540, 1080) FROM main_order WHERE courier_id IS NULL
+            '''
+        )
+        cursor.execute('ANALYZE main_order')
+        cursor.execute('ANALYZE main_orderdeliveryinterval')
+        cursor.execute('ANALYZE main_region_m2m_courier')
+        cursor.execute('ANALYZE main_courier')
+
+        yield
+
+        cursor.execute(
+            'TRUNCATE main_orderdeliveryinterval, main_order, main_region_m2m_courier, main_courier, main_region CASCADE'
+        )
+
+
+def test_ini_orders_use_open_pool_index(million_orders):
+    courier = Courier.objects.get(id=1)
+    assert courier.has_valid_working_hours(CURRENT_DATE)
+    plan = courier._get_ini_orders(CURRENT_DATE).explain()
+
+    assert 'order_open_pool_idx' in plan
+    assert 'Seq Scan on main_order ' not in plan
+
+
+def test_assigned_orders_use_index(million_orders):
+    courier = Courier.objects.get(id=1)
+    plan = courier.get_assigned_orders().explain()
+
+    assert 'order_assigned_idx' in plan
+    assert 'Seq Scan on main_order ' not in plan
+    assert Order.objects.filter(courier_id__isnull=True).count() == ORDERS_COUNT // 100
+
+
+def test_region_couriers_use_gin_index(million_orders):
+    with connection.cursor() as cursor:
+        # таблица курьеров маленькая, поэтому проверяется, что индекс применим, а не что планировщик его выберет
+        cursor.execute('SET LOCAL enable_seqscan = off')
+    plan = Courier.get_region_couriers(5).explain()
+
+    assert 'courier_region_ids_gin' in plan
+    assert Courier.get_region_couriers(5).count() == COURIERS_COUNT // REGIONS_COUNT
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+from app.main.intervals import (
+    is_overlap, merge_intervals, parse_time_intervals, remove_expired_intervals, to_bitmap
+)
+
+
+@pytest.mark.parametrize('time_intervals,expected', argvalues=[
+    ([], []),
+    (['09:00-18:00'], [[540, 1080]]),
+    (['16:00-21:30', '09:00-12:00'], [[540, 720], [960, 1290]]),
+    (['11:35-14:05', '09:00-18:00'], [[540, 1080]]),
+    (['09:00-12:00', '12:00-15:00'], [[540, 900]]),
+    (['9:5-10:00'], [[545, 600]]),
+])
+def test_parse_time_intervals(time_intervals, expected):
+    assert parse_time_intervals(time_intervals) == expected
+
+
+def test_merge_intervals_keeps_disjoint_intervals():
+    assert merge_intervals([[900, 960], [540, 600], [601, 700]]) == [[540, 600], [601, 700], [900, 960]]
+
+
+@pytest.mark.parametrize('courier_hours,order_hours,expected', argvalues=[
+    (['09:00-18:00'], ['18:00-19:00'], False),
+    (['09:00-18:01'], ['18:00-19:00'], True),
+    (['09:00-11:00', '14:00-18:00'], ['11:00-14:00'], False),
+    (['09:00-11:00', '14:00-18:00'], ['10:00-10:01'], True),
+    (['00:00-23:59'], ['10:00-10:00'], False),
+    ([], ['10:00-12:00'], False),
+])
+def test_is_overlap(courier_hours, order_hours, expected):
+    courier_bitmap = to_bitmap(parse_time_intervals(courier_hours))
+    order_bitmap = to_bitmap(parse_time_intervals(order_hours))
+    assert is_overlap(courier_bitmap, order_bitmap) is expected
+
+
+@pytest.mark.parametrize('today,expected', argvalues=[
+    (datetime(2021, 3, 29, 11, 0, 0), [[960, 1290]]),
+    (datetime(2021, 3, 29, 21, 29, 59), [[960, 1290]]),
+    (datetime(2021, 3, 29, 21, 30, 0), []),
+    (datetime(2021, 3, 29, 10, 59, 59), [[540, 660], [960, 1290]]),
+])
+def test_remove_expired_intervals(today, expected):
+    assert remove_expired_intervals([[540, 660], [960, 1290]], today) == expected
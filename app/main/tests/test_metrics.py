@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import textwrap
+from unittest.mock import patch
+
+import pytest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from prometheus_client import REGISTRY
+
+from app.main.tests.test_order import CURRENT_DATE
+from app.main.utils import reverse
+
+pytestmark = [pytest.mark.django_db]
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_metrics_assign(api_client, create_orders_and_couriers):
+    labels = {'endpoint': 'orders_assign', 'method': 'POST'}
+    before = {
+        'latency': sample('candy_delivery_request_duration_seconds_count', **labels, status='200'),
+        'queries': sample('candy_delivery_request_db_queries_sum', **labels),
+        'candidates': sample('candy_delivery_assign_candidate_orders_sum'),
+        'selected': sample('candy_delivery_assign_selected_orders_sum'),
+    }
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
+    assert resp.status_code == 200
+
+    assert sample('candy_delivery_request_duration_seconds_count', **labels, status='200') == before['latency'] + 1
+    assert sample('candy_delivery_request_db_queries_sum', **labels) == before['queries'] + len(queries)
+    assert sample('candy_delivery_assign_candidate_orders_sum') == before['candidates'] + 2
+    assert sample('candy_delivery_assign_selected_orders_sum') == before['selected'] + 2
+
+
+def test_metrics_bulk_import_rows(api_client, payload_to_create_orders):
+    def rows(mode, result):
+        return sample('candy_delivery_bulk_import_rows_total', objects='orders', mode=mode, result=result)
+
+    before = {(mode, result): rows(mode, result) for mode in ('bulk', 'stream') for result in ('created', 'invalid')}
+
+    api_client.post(reverse('main:orders__create'), payload_to_create_orders)
+    api_client.post(reverse('main:orders__create'), {'data': [{'order_id': 10, 'weight': 100}]})
+    api_client.post(
+        reverse('main:orders__create', query_kwargs={'stream': 'true', 'atomic': 'false'}),
+        {'data': [
+            {'order_id': 11, 'weight': 1, 'region': 1, 'delivery_hours': ['09:00-18:00']},
+            {'order_id': 12, 'weight': -1},
+        ]},
+        format='json'
+    )
+
+    assert {key: rows(*key) - value for key, value in before.items()} == {
+        ('bulk', 'created'): 3, ('bulk', 'invalid'): 1, ('stream', 'created'): 1, ('stream', 'invalid'): 1
+    }
+
+
+def test_metrics_endpoint(api_client, create_orders_and_couriers):
+    api_client.get(reverse('main:courier', kwargs={'courier_id': 1}))
+    resp = api_client.get(reverse('main:metrics'))
+
+    assert resp.status_code == 200
+    assert resp['Content-Type'].startswith('text/plain')
+    body = resp.content.decode()
+    assert 'candy_delivery_request_duration_seconds_bucket{endpoint="courier"' in body
+    assert 'endpoint="metrics"' not in body
+
+
+def test_metrics_aggregate_across_processes(tmp_path):
+    env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path), 'PYTHONPATH': os.getcwd()}
+    worker = textwrap.dedent('''
+        from app.main.metrics import BULK_IMPORT_ROWS, SELECTED_ORDERS
+        BULK_IMPORT_ROWS.labels('orders', 'bulk', 'created').inc(5)
+        SELECTED_ORDERS.observe(3)
+    ''')
+    for _ in range(3):
+        subprocess.run([sys.executable, '-c', worker], env=env, check=True)
+
+    collector = textwrap.dedent('''
+        from app.main.metrics import collect
+        print(collect().decode())
+    ''')
+    body = subprocess.run(
+        [sys.executable, '-c', collector], env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+    assert 'candy_delivery_bulk_import_rows_total{mode="bulk",objects="orders",result="created"} 15.0' in body
+    assert 'candy_delivery_assign_selected_orders_count 3.0' in body
@@ -1,9 +1,18 @@
+import random
+
 import pytz
 import pytest
 
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
 from datetime import datetime
 from unittest.mock import patch
 
+from django.db import connection
+from rest_framework.test import APIClient
+
+from app.main.models import Courier, Order, OrderDeliveryInterval, Region
+from app.main.serializers.order import OrderSerializer
 from app.main.utils import reverse
 
 CURRENT_DATE = datetime(2021, 3, 29, 11, 0, 0, tzinfo=pytz.utc)
@@ -16,6 +25,7 @@ def test_orders_create_successful(api_client, payload_to_create_orders):
     resp = api_client.post(reverse('main:orders__create'), payload_to_create_orders)
     assert resp.data == {'orders': [{'id': 1}, {'id': 2}, {'id': 3}]}
     assert resp.status_code == 201
+    assert Order.objects.get(id=3).delivery_minutes == [[540, 720], [960, 1290]]
 
 
 @pytest.mark.parametrize('invalid_payload', argvalues=[
@@ -78,6 +88,90 @@ def test_orders_create_failed_properly_collect_invalid_items(api_client):
     assert resp.status_code == 400
 
 
+@pytest.mark.parametrize('stream', argvalues=[False, True])
+def test_orders_create_failed_validates_payload_once(stream, api_client):
+    payload = {
+        "data": [
+            {"order_id": order_id, "weight": 0.001 if order_id % 3 else 1, "region": 1, "delivery_hours": ["09:00-18:00"]}
+            for order_id in range(1, 10)
+        ]
+    }
+    with patch.object(
+            OrderSerializer, 'validate_delivery_hours', autospec=True, side_effect=OrderSerializer.validate_delivery_hours
+    ) as validate_delivery_hours:
+        resp = api_client.post(reverse('main:orders__create', query_kwargs={'stream': 'true'} if stream else None), payload)
+
+    assert resp.status_code == 400
+    assert resp.data.get('validation_error') == {"orders": [{"id": 1}, {"id": 2}, {"id": 4}, {"id": 5}, {"id": 7}, {"id": 8}]}
+    # каждый заказ валидируется не больше одного раза (валидные заказы потоковой загрузки - без DRF)
+    assert validate_delivery_hours.call_count <= len(payload['data'])
+
+
+@pytest.mark.parametrize('invalid_payload', argvalues=[
+    {}, {"data": None}, {"data": {"order_id": 1}}, {"data": [1, {"weight": 1}]}
+])
+def test_orders_create_failed_invalid_payload_structure(invalid_payload, api_client):
+    resp = api_client.post(reverse('main:orders__create'), invalid_payload)
+    assert resp.status_code == 400
+
+
+def test_orders_stream_create_matches_bulk_create(api_client, settings):
+    settings.BULK_IMPORT_CHUNK_SIZE = 2
+    orders = [
+        {"order_id": order_id, "weight": 0.01 * order_id, "region": order_id % 3,
+         "delivery_hours": ["16:00-21:30", "09:00-12:00"] if order_id % 2 else ['10:00-11:00']}
+        for order_id in range(1, 6)
+    ]
+    api_client.post(reverse('main:orders__create'), {"data": orders})
+    resp = api_client.post(
+        reverse('main:orders__create', query_kwargs={'stream': 'true'}),
+        {"data": [{**order, "order_id": order["order_id"] + 100} for order in orders]}
+    )
+    assert resp.status_code == 201
+    assert resp.data == {'orders': [{'id': order["order_id"] + 100} for order in orders]}
+
+    fields = ('weight', 'region_id', 'delivery_hours', 'delivery_minutes', 'courier_id', 'assign_time', 'complete_time')
+    assert (
+        list(Order.objects.filter(id__lt=100).order_by('id').values_list(*fields))
+        == list(Order.objects.filter(id__gt=100).order_by('id').values_list(*fields))
+    )
+    assert (
+        list(OrderDeliveryInterval.objects.filter(order_id__lt=100).order_by('order_id', 'minutes').values_list('minutes'))
+        == list(OrderDeliveryInterval.objects.filter(order_id__gt=100).order_by('order_id', 'minutes').values_list('minutes'))
+    )
+
+
+def test_orders_stream_create_failed_atomic(api_client, settings):
+    settings.BULK_IMPORT_CHUNK_SIZE = 2
+    payload = {
+        "data": [
+            {"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["09:00-18:00"]},
+            {"order_id": 2, "weight": 1, "region": 1, "delivery_hours": ["09:00-18:00"]},
+            {"order_id": 3, "weight": 0.001, "region": 1, "delivery_hours": ["09:00-18:00"]},
+            {"order_id": 4, "weight": 1, "region": 1, "delivery_hours": ["09:00-18:00"]},
+            {"order_id": 5, "region": 1, "delivery_hours": ["09:00-18:00"]},
+        ]
+    }
+    resp = api_client.post(reverse('main:orders__create', query_kwargs={'stream': 'true'}), payload)
+    assert resp.status_code == 400
+    assert resp.data.get('validation_error') == {"orders": [{"id": 3}, {"id": 5}]}
+    assert not Order.objects.exists()
+
+    resp = api_client.post(reverse('main:orders__create', query_kwargs={'stream': 'true', 'atomic': 'false'}), payload)
+    assert resp.status_code == 201
+    assert resp.data == {'orders': [{'id': 1}, {'id': 2}, {'id': 4}], 'validation_error': {"orders": [{"id": 3}, {"id": 5}]}}
+    assert list(Order.objects.order_by('id').values_list('id', flat=True)) == [1, 2, 4]
+
+
+def test_orders_stream_create_failed_invalid_json(api_client):
+    resp = api_client.post(
+        reverse('main:orders__create', query_kwargs={'stream': 'true'}),
+        data='{"data": [{"order_id": 1}', content_type='application/json'
+    )
+    assert resp.status_code == 400
+    assert not Order.objects.exists()
+
+
 def test_orders_assign_not_found_suitable_orders(api_client, payload_to_create_couriers, payload_to_create_orders):
     payload_to_create_orders.update(
         {
@@ -103,14 +197,169 @@ def test_orders_assign_not_found_courier(api_client, create_orders_and_couriers)
     assert resp.status_code == 400
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_orders_assign_successful(api_client, create_orders_and_couriers):
     resp = api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
     assert resp.status_code == 200
     assert resp.data == {"orders": [{"id": 1}, {"id": 3}], "assign_time": CURRENT_DATE}
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+def test_orders_assign_filters_delivery_hours_in_db(api_client, payload_to_create_couriers):
+    payload_to_create_orders = {
+        "data": [
+            {"order_id": 1, "weight": 1, "region": 1, "delivery_hours": ["09:00-10:30"]},
+            {"order_id": 2, "weight": 1, "region": 1, "delivery_hours": ["18:00-19:00"]},
+            {"order_id": 3, "weight": 1, "region": 1, "delivery_hours": ["07:00-08:00", "10:00-11:01"]},
+            {"order_id": 4, "weight": 1, "region": 12, "delivery_hours": ["17:59-20:00"]},
+            {"order_id": 5, "weight": 1, "region": 7, "delivery_hours": ["09:00-18:00"]},
+        ]
+    }
+    api_client.post(reverse('main:couriers__create'), payload_to_create_couriers)
+    api_client.post(reverse('main:orders__create'), payload_to_create_orders)
+
+    courier = Courier.objects.get(id=1)
+    assert courier.has_valid_working_hours(CURRENT_DATE)
+    assert sorted(order.id for order in courier._get_ini_orders(CURRENT_DATE)) == [3, 4]
+
+
+@pytest.mark.parametrize('packing,expected_orders', argvalues=[
+    ('greedy', [{"id": 1}, {"id": 2}]),
+    ('optimal', [{"id": 2}, {"id": 3}, {"id": 4}]),
+])
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_orders_assign_packing_modes(packing, expected_orders, api_client):
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [{"courier_id": 1, "courier_type": "foot", "regions": [1, 2], "working_hours": ["09:00-18:00"]}]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {"order_id": 1, "weight": 6, "region": 1, "delivery_hours": ["09:00-18:00"]},
+            {"order_id": 2, "weight": 3, "region": 2, "delivery_hours": ["09:00-18:00"]},
+            {"order_id": 3, "weight": 3, "region": 2, "delivery_hours": ["09:00-18:00"]},
+            {"order_id": 4, "weight": 3, "region": 2, "delivery_hours": ["09:00-18:00"]},
+        ]
+    })
+    resp = api_client.post(reverse('main:orders_assign'), {'courier_id': 1, 'packing': packing})
+    assert resp.status_code == 200
+    assert resp.data['orders'] == expected_orders
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_orders_assign_batch_matches_sequential_assign(api_client):
+    rnd = random.Random(42)
+    courier_types, hours = ['foot', 'bike', 'car'], ['09:00-12:00', '10:30-11:30', '12:00-18:00', '07:00-10:00']
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [
+            {
+                "courier_id": courier_id,
+                "courier_type": rnd.choice(courier_types),
+                "regions": rnd.sample(range(1, 5), rnd.randint(1, 3)),
+                "working_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for courier_id in range(1, 7)
+        ]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {
+                "order_id": order_id,
+                "weight": rnd.randint(1, 1500) / 100,
+                "region": rnd.randint(1, 4),
+                "delivery_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for order_id in range(1, 80)
+        ]
+    })
+    courier_ids = [4, 1, 6, 2, 5, 3]
+
+    resp = api_client.post(reverse('main:orders_assign_batch'), {'courier_ids': courier_ids})
+    assert resp.status_code == 200
+    batch_orders = {item['courier_id']: item['orders'] for item in resp.data['couriers']}
+    assert [item['courier_id'] for item in resp.data['couriers']] == courier_ids
+    assert sum(map(bool, batch_orders.values())) > 1
+
+    Order.objects.update(courier_id=None, assign_time=None)
+    for courier_id in courier_ids:
+        resp = api_client.post(reverse('main:orders_assign'), {'courier_id': courier_id})
+        assert resp.data['orders'] == batch_orders[courier_id]
+
+
+def test_orders_assign_batch_takes_assign_time_per_request(api_client, create_orders_and_couriers):
+    with patch('app.main.views.timezone.now', return_value=CURRENT_DATE):
+        resp = api_client.post(reverse('main:orders_assign_batch'), {'courier_ids': [1]})
+    assert resp.data['couriers'][0]['assign_time'] == CURRENT_DATE
+
+
+def test_orders_assign_batch_not_found_courier(api_client, create_orders_and_couriers):
+    resp = api_client.post(reverse('main:orders_assign_batch'), {'courier_ids': [1, 8]})
+    assert resp.status_code == 400
+    assert Order.objects.filter(courier_id__isnull=False).count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_orders_assign_concurrent_couriers_get_disjoint_orders(api_client):
+    couriers_count, orders_count = 8, 200
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [
+            {"courier_id": courier_id, "courier_type": "car", "regions": [1], "working_hours": ["09:00-18:00"]}
+            for courier_id in range(1, couriers_count + 1)
+        ]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {"order_id": order_id, "weight": 1, "region": 1, "delivery_hours": ["09:00-18:00"]}
+            for order_id in range(1, orders_count + 1)
+        ]
+    })
+
+    def assign(courier_id):
+        try:
+            resp = APIClient().post(reverse('main:orders_assign'), {'courier_id': courier_id})
+            assert resp.status_code == 200
+            return [order['id'] for order in resp.data['orders']]
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=couriers_count) as executor:
+        assigned = [
+            order_id
+            for orders in executor.map(assign, range(1, couriers_count + 1))
+            for order_id in orders
+        ]
+
+    assert len(assigned) == len(set(assigned)) == orders_count
+    assert Order.objects.filter(courier_id__isnull=True).count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_orders_create_concurrent_imports_with_same_new_regions():
+    imports_count, rounds = 8, 5
+    barrier = Barrier(imports_count)
+
+    def create_orders(import_id, region_ids):
+        try:
+            barrier.wait()
+            resp = APIClient().post(reverse('main:orders__create'), {
+                "data": [
+                    {"order_id": import_id * 1000 + region_id, "weight": 1, "region": region_id,
+                     "delivery_hours": ["09:00-18:00"]}
+                    for region_id in region_ids
+                ]
+            }, format='json')
+            return resp.status_code
+        finally:
+            connection.close()
+
+    for round_id in range(rounds):
+        region_ids = range(round_id * 10 + 1, round_id * 10 + 11)
+        with ThreadPoolExecutor(max_workers=imports_count) as executor:
+            statuses = list(executor.map(create_orders, range(1, imports_count + 1), [region_ids] * imports_count))
+        assert statuses == [201] * imports_count
+
+    assert Order.objects.count() == imports_count * rounds * 10
+    assert Region.objects.count() == rounds * 10
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_orders_complete_successful(api_client, create_orders_and_couriers):
     api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
     complete_data = {"courier_id": 1, "order_id": 1, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
@@ -119,7 +368,7 @@ def test_orders_complete_successful(api_client, create_orders_and_couriers):
     assert resp.data == {"order_id": 1}
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_orders_complete_failed_not_found_order(api_client, create_orders_and_couriers):
     api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
     complete_data = {"courier_id": 1, "order_id": 4, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
@@ -127,7 +376,7 @@ def test_orders_complete_failed_not_found_order(api_client, create_orders_and_co
     assert resp.status_code == 400
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_orders_complete_failed_assign_to_another_courier(api_client, create_orders_and_couriers):
     api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
     complete_data = {"courier_id": 2, "order_id": 1, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
@@ -135,7 +384,7 @@ def test_orders_complete_failed_assign_to_another_courier(api_client, create_ord
     assert resp.status_code == 400
 
 
-@patch('app.main.views.OrdersAssignView.current_date', new=CURRENT_DATE)
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
 def test_orders_complete_failed_not_assigned_order(api_client, create_orders_and_couriers):
     complete_data = {"courier_id": 1, "order_id": 1, "complete_time": COMPLETE_TIME.strftime('%Y-%m-%dT%H:%M:%S')}
     resp = api_client.post(reverse('main:orders_complete'), complete_data)
@@ -0,0 +1,205 @@
+import random
+import time
+
+from decimal import Decimal
+
+import pytest
+
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+
+from app.main import order_pool
+from app.main.models import Courier, Order, Region
+from app.main.order_pool import _RegionOrders
+from app.main.tests.test_order import CURRENT_DATE
+from app.main.utils import reverse
+
+# уведомления доставляются только после коммита, поэтому нужны настоящие транзакции
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+@pytest.fixture(autouse=True)
+def order_pool_cache(settings):
+    settings.ORDER_POOL_CACHE = 1
+    call_command('order_pool_triggers', 'install', stdout=StringIO())
+    order_pool.reset_index()
+    yield
+    order_pool.reset_index()
+    call_command('order_pool_triggers', 'drop', stdout=StringIO())
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'notification was not applied in time'
+        time.sleep(0.01)
+
+
+def assigned_ids(assign_results):
+    return {order['id'] for result in assign_results.values() for order in result['orders']}
+
+
+def cached_order_ids(courier_id):
+    courier = Courier.objects.get(pk=courier_id)
+    assert courier.has_valid_working_hours(CURRENT_DATE)
+    return sorted(order.id for order in courier._get_cached_ini_orders(CURRENT_DATE))
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_cached_candidates_match_db(api_client):
+    rnd = random.Random(7)
+    courier_types, hours = ['foot', 'bike', 'car'], ['09:00-12:00', '10:30-11:30', '12:00-18:00', '07:00-10:00']
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [
+            {
+                "courier_id": courier_id,
+                "courier_type": rnd.choice(courier_types),
+                "regions": rnd.sample(range(1, 5), rnd.randint(1, 3)),
+                "working_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for courier_id in range(1, 7)
+        ]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {
+                "order_id": order_id,
+                "weight": rnd.randint(1, 1500) / 100,
+                "region": rnd.randint(1, 4),
+                "delivery_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for order_id in range(1, 80)
+        ]
+    })
+
+    for courier in Courier.objects.order_by('id'):
+        if not courier.has_valid_working_hours(CURRENT_DATE):
+            continue
+        assert cached_order_ids(courier.id) == sorted(order.id for order in courier._get_ini_orders(CURRENT_DATE))
+
+    cached_assign = {}
+    for courier_id in range(1, 7):
+        cached_assign[courier_id] = api_client.post(reverse('main:orders_assign'), {'courier_id': courier_id}).data
+    # назначенные заказы пропадают из кеша по уведомлениям
+    wait_for(lambda: all(
+        not set(cached_order_ids(courier_id)) & assigned_ids(cached_assign) for courier_id in range(1, 7)
+    ))
+
+    Order.objects.update(courier_id=None, assign_time=None)
+    order_pool.reset_index()
+    with patch('django.conf.settings.ORDER_POOL_CACHE', 0):
+        for courier_id in range(1, 7):
+            resp = api_client.post(reverse('main:orders_assign'), {'courier_id': courier_id})
+            assert resp.data == cached_assign[courier_id]
+
+
+def test_new_orders_are_picked_up_from_notifications(api_client, create_orders_and_couriers):
+    assert cached_order_ids(1) == [1, 3]
+
+    api_client.post(reverse('main:orders__create'), {
+        "data": [{"order_id": 4, "weight": 1, "region": 12, "delivery_hours": ["10:00-12:00"]}]
+    })
+    wait_for(lambda: cached_order_ids(1) == [1, 3, 4])
+
+    Order.objects.filter(pk=1).update(complete_time=CURRENT_DATE)
+    wait_for(lambda: cached_order_ids(1) == [3, 4])
+
+    Order.objects.filter(pk=4).update(region_id=23)
+    wait_for(lambda: cached_order_ids(1) == [3])
+
+    Order.objects.filter(pk=1).update(complete_time=None)
+    wait_for(lambda: cached_order_ids(1) == [1, 3])
+
+
+def test_imported_orders_are_added_without_reloading_region(api_client, create_orders_and_couriers):
+    assert cached_order_ids(1) == [1, 3]
+    index = order_pool.get_index()
+    region = index._regions[12]
+
+    # заказов больше, чем помещается в одно уведомление
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {"order_id": order_id, "weight": 1.5, "region": 12, "delivery_hours": ["10:00-12:00", "14:00-15:30"]}
+            for order_id in range(4, 304)
+        ]
+    })
+    wait_for(lambda: len(region.orders) == 301)
+    assert index._regions[12] is region
+    assert region.orders[303] == (303, Decimal('1.50'), [[600, 720], [840, 930]])
+    assert cached_order_ids(1) == [1, 3] + list(range(4, 304))
+
+
+def test_update_of_many_regions_does_not_exceed_notify_limit(api_client, create_orders_and_couriers):
+    assert cached_order_ids(1) == [1, 3]
+    index = order_pool.get_index()
+
+    # районов больше, чем помещается в одно уведомление reload
+    regions = Region.objects.bulk_create([Region(id=region_id) for region_id in range(100000, 101500)])
+    Order.objects.bulk_create([
+        Order(id=1000 + region.id, region=region, weight=1, delivery_minutes=[[600, 720]], assign_time=CURRENT_DATE)
+        for region in regions
+    ])
+    index._regions[101499] = _RegionOrders([])
+
+    # заказы снимаются с курьеров, районы перечитываются
+    Order.objects.filter(region_id__gte=100000).update(assign_time=None)
+    wait_for(lambda: 101499 not in index._regions)
+    assert cached_order_ids(1) == [1, 3]
+
+
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_stale_cache_never_assigns_taken_order(api_client, create_orders_and_couriers):
+    assert cached_order_ids(1) == [1, 3]
+
+    Order.objects.filter(pk=1).update(courier_id=2, assign_time=CURRENT_DATE)
+    wait_for(lambda: cached_order_ids(1) == [3])
+    # кеш отстал от базы: уведомление о назначении заказа 1 еще не дошло
+    order = Order.objects.get(pk=1)
+    order_pool.get_index()._regions[order.region_id].add((order.id, order.weight, order.delivery_minutes))
+    assert cached_order_ids(1) == [1, 3]
+
+    resp = api_client.post(reverse('main:orders_assign'), {'courier_id': 1})
+    assert resp.data['orders'] == [{'id': 3}]
+    assert Order.objects.get(pk=1).courier_id == 2
+
+
+def test_dead_listener_is_restarted_without_waiting(create_orders_and_couriers):
+    index = order_pool.get_index()
+    assert index.start()
+    # слушатель завершился (например, из-за ошибки не базы данных)
+    index._stopped.set()
+    index._listener.join()
+    index._stopped.clear()
+
+    started = time.monotonic()
+    index.start()
+    assert time.monotonic() - started < index.listen_timeout
+    wait_for(index.start)
+    assert cached_order_ids(1) == [1, 3]
+
+
+def test_cache_requires_triggers():
+    call_command('order_pool_triggers', 'drop', stdout=StringIO())
+    assert not order_pool.triggers_installed()
+    with pytest.raises(ImproperlyConfigured):
+        order_pool.get_index()
+
+    out = StringIO()
+    call_command('order_pool_triggers', 'install', stdout=out)
+    assert out.getvalue().strip() == 'Open orders triggers installed'
+    assert order_pool.triggers_installed()
+    assert order_pool.get_index().start()
+
+
+def test_region_orders_select_by_weight_bucket():
+    region = _RegionOrders([(1, 12, [[600, 700]]), (2, 3, [[500, 900]]), (3, 11, [[540, 600]]), (4, 40, [])])
+    assert [row[0] for row in region.select(10)] == [2]
+    assert [row[0] for row in region.select(15)] == [2, 3, 1]
+    assert [row[0] for row in region.select(50)] == [2, 3, 1, 4]
+
+    region.remove(3)
+    region.add((5, 0.5, [[540, 600]]))
+    region.add((1, 2, [[600, 700]]))
+    assert [row[0] for row in region.select(10)] == [5, 1, 2]
+    assert set(region.orders) == {1, 2, 4, 5}
@@ -0,0 +1,37 @@
+import itertools
+import random
+
+import pytest
+
+from app.main.packing import optimal_pack, to_weight_units
+
+
+@pytest.mark.parametrize('weight,expected', argvalues=[
+    ('0.01', 1), (0.23, 23), (15, 1500), ('50.00', 5000),
+])
+def test_to_weight_units(weight, expected):
+    assert to_weight_units(weight) == expected
+
+
+def test_optimal_pack_prefers_more_orders_then_more_weight():
+    items = [600, 300, 300, 300, 450]
+    assert sorted(optimal_pack(items, capacity=1000, weight=lambda x: x)) == [300, 300, 300]
+    assert sorted(optimal_pack(items, capacity=1100, weight=lambda x: x)) == [300, 300, 450]
+
+
+def test_optimal_pack_matches_brute_force():
+    rnd = random.Random(42)
+    for _ in range(300):
+        capacity = rnd.randint(1, 60)
+        items = [(i, rnd.randint(1, 25)) for i in range(rnd.randint(0, 8))]
+
+        packed = optimal_pack(items, capacity, weight=lambda x: x[1])
+
+        best = max(
+            (len(combination), sum(item[1] for item in combination))
+            for size in range(len(items) + 1)
+            for combination in itertools.combinations(items, size)
+            if sum(item[1] for item in combination) <= capacity
+        )
+        assert len(set(packed)) == len(packed)
+        assert (len(packed), sum(item[1] for item in packed)) == best
@@ -0,0 +1,99 @@
+import json
+import os
+import pstats
+from unittest.mock import patch
+
+import pytest
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+
+from app.main import middleware
+from app.main.tests.test_order import CURRENT_DATE
+from app.main.utils import reverse
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def profiling_settings(settings, tmp_path):
+    settings.PROFILING_SAMPLE_RATE = 0
+    settings.PROFILING_HEADER_ENABLED = 1
+    settings.PROFILING_DUMP_DIR = str(tmp_path)
+    return settings
+
+
+def logged_profiles(log_info):
+    return [json.loads(call.args[0]) for call in log_info.call_args_list]
+
+
+@pytest.mark.parametrize('packing', argvalues=['greedy', 'optimal'])
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_profiling_records_db_queries_and_stages(packing, api_client, create_orders_and_couriers, profiling_settings):
+    with patch.object(middleware.logger, 'info') as log_info:
+        resp = api_client.post(
+            reverse('main:orders_assign'), {'courier_id': 1, 'packing': packing}, HTTP_X_PROFILE='1'
+        )
+
+    assert resp.status_code == 200
+    assert 'X-Profile-Dump' not in resp
+    [profile] = logged_profiles(log_info)
+    assert (profile['view'], profile['method'], profile['status'], profile['dump']) == (
+        'main:orders_assign', 'POST', 200, None
+    )
+    assert profile['db_queries'] > 0
+    assert 0 < profile['db_ms'] < profile['wall_ms']
+    assert set(profile['stages_ms']) == {'parsing', 'candidate_fetch', 'overlap_check', 'packing', 'bulk_update'}
+
+
+def test_profiling_is_off_without_sampling(api_client, create_orders_and_couriers, profiling_settings):
+    with patch.object(middleware.logger, 'info') as log_info:
+        api_client.get('/couriers/1')
+        profiling_settings.PROFILING_HEADER_ENABLED = 0
+        api_client.get('/couriers/1', HTTP_X_PROFILE='cprofile')
+
+    assert not log_info.called
+    assert not os.listdir(profiling_settings.PROFILING_DUMP_DIR)
+
+
+def test_profiling_samples_requests(api_client, create_orders_and_couriers, profiling_settings):
+    profiling_settings.PROFILING_SAMPLE_RATE = 1
+    with patch.object(middleware.logger, 'info') as log_info:
+        api_client.get('/couriers/1')
+        api_client.get('/couriers/2')
+
+    assert [profile['path'] for profile in logged_profiles(log_info)] == ['/couriers/1', '/couriers/2']
+
+
+def test_profiling_attaches_cprofile_dump(api_client, create_orders_and_couriers, profiling_settings):
+    resp = api_client.get('/couriers/1', HTTP_X_PROFILE='cprofile')
+
+    path = os.path.join(profiling_settings.PROFILING_DUMP_DIR, resp['X-Profile-Dump'])
+    stats = pstats.Stats(path)
+    assert any(func_name == 'get' for _, _, func_name in stats.stats)
+
+
+def test_profiling_attaches_stack_samples(api_client, create_orders_and_couriers, profiling_settings):
+    resp = api_client.get('/couriers/1', HTTP_X_PROFILE='stack')
+
+    path = os.path.join(profiling_settings.PROFILING_DUMP_DIR, resp['X-Profile-Dump'])
+    with open(path) as f:
+        for line in f.read().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            assert int(count) > 0 and ':' in stack
+
+
+@pytest.mark.django_db(transaction=True)
+def test_profiling_under_asgi(create_orders_and_couriers, profiling_settings):
+    profiling_settings.PROFILING_SAMPLE_RATE = 1
+
+    async def get_courier():
+        return await AsyncClient().get('/couriers/1')
+
+    with patch.object(middleware.logger, 'info') as log_info:
+        resp = async_to_sync(get_courier)()
+
+    assert resp.status_code == 200
+    [profile] = logged_profiles(log_info)
+    assert profile['view'] == 'main:courier'
+    assert profile['db_queries'] > 0
@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+
+from app.main.streaming import JSONStreamError, chunked, iter_json_array
+
+
+PAYLOAD = {
+    "meta": {"source": "upstream", "tags": ["a", {"b": "ё\"]"}]},
+    "data": [{"order_id": order_id, "weight": 1.25, "delivery_hours": ["09:00-18:00"]} for order_id in range(100)],
+    "total": 12345,
+}
+
+
+@pytest.mark.parametrize('read_size', argvalues=[1, 2, 7, 64, 1024 * 1024])
+def test_iter_json_array_reads_items_across_chunk_boundaries(read_size):
+    stream = io.BytesIO(json.dumps(PAYLOAD, ensure_ascii=False).encode())
+    assert list(iter_json_array(stream, 'data', read_size=read_size)) == PAYLOAD['data']
+
+
+def test_iter_json_array_does_not_split_numbers():
+    stream = io.BytesIO(b' { "data" : [ 12 , 345, 6.75 ] } ')
+    assert list(iter_json_array(stream, 'data', read_size=1)) == [12, 345, 6.75]
+
+
+@pytest.mark.parametrize('raw', argvalues=[
+    b'', b'[]', b'{"data": 1}', b'{"data": [1,]}', b'{"items": []}', b'{"data": []} []', b'{"data": [1}', b'{"data": ["\xff"]}'
+])
+def test_iter_json_array_failed_invalid_json(raw):
+    with pytest.raises(JSONStreamError):
+        list(iter_json_array(io.BytesIO(raw), 'data', read_size=2))
+
+
+def test_chunked():
+    assert list(chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(chunked([], 3)) == []
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from rest_framework.test import APIClient
+
+from app.main.utils import reverse
+from benchmarks.replay import load_records, replay, summarize
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def capture_settings(settings, tmp_path):
+    settings.TRAFFIC_CAPTURE = 1
+    settings.TRAFFIC_CAPTURE_FILE = str(tmp_path / 'traffic.jsonl')
+    settings.TRAFFIC_CAPTURE_MAX_BODY = 1024 * 1024
+    settings.TRAFFIC_CAPTURE_REDACT_FIELDS = {'working_hours'}
+    return settings
+
+
+def test_capture_is_off_by_default(settings, tmp_path, api_client, create_orders_and_couriers):
+    settings.TRAFFIC_CAPTURE_FILE = str(tmp_path / 'traffic.jsonl')
+
+    api_client.get(reverse('main:courier', kwargs={'courier_id': 1}))
+
+    assert not (tmp_path / 'traffic.jsonl').exists()
+
+
+def test_capture_records_sanitized_requests(capture_settings, payload_to_create_couriers):
+    client = APIClient()
+    client.post(reverse('main:couriers__create'), payload_to_create_couriers, format='json')
+    client.get(reverse('main:courier', kwargs={'courier_id': 1}))
+    client.get(reverse('main:couriers_leaderboard'), {'limit': 5})
+    client.get(reverse('main:metrics'))
+
+    records = load_records(capture_settings.TRAFFIC_CAPTURE_FILE)
+
+    assert [(r['method'], r['path'], r['query'], r['endpoint'], r['status']) for r in records] == [
+        ('POST', '/couriers', '', 'couriers__create', 201),
+        ('GET', '/couriers/1', '', 'courier', 200),
+        ('GET', '/couriers/leaderboard', 'limit=5', 'couriers_leaderboard', 200),
+    ]
+    assert records[0]['body']['data'][0] == {
+        'courier_id': 1, 'courier_type': 'foot', 'regions': [1, 12, 22], 'working_hours': '***'
+    }
+    assert records[1]['body'] is None
+    assert all(r['duration_ms'] > 0 for r in records)
+
+
+def test_capture_skips_large_bodies(capture_settings, payload_to_create_couriers):
+    capture_settings.TRAFFIC_CAPTURE_MAX_BODY = 10
+
+    resp = APIClient().post(
+        reverse('main:couriers__create', query_kwargs={'stream': 'true'}), payload_to_create_couriers, format='json'
+    )
+
+    assert resp.status_code == 201
+    [record] = load_records(capture_settings.TRAFFIC_CAPTURE_FILE)
+    assert (record['body'], record['body_skipped'], record['query']) == (None, 'too_large', 'stream=true')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_replay_reports_per_endpoint_stats(capture_settings, live_server, payload_to_create_couriers):
+    capture_settings.TRAFFIC_CAPTURE_REDACT_FIELDS = set()
+    client = APIClient()
+    client.post(reverse('main:couriers__create'), payload_to_create_couriers, format='json')
+    for courier_id in (1, 2, 3, 100):
+        client.get(reverse('main:courier', kwargs={'courier_id': courier_id}))
+
+    records = load_records(capture_settings.TRAFFIC_CAPTURE_FILE)
+    results = asyncio.run(replay(records, live_server.url, speed=0, concurrency=2))
+    summary = summarize(results, elapsed=1)
+
+    # курьеры уже созданы, поэтому повторная загрузка падает на уникальности id вместо записанного 201
+    assert {
+        endpoint: (stats['requests'], stats['errors'], stats['mismatched']) for endpoint, stats in summary.items()
+    } == {
+        'couriers__create': (1, 1, 1),
+        'courier': (4, 0, 0),
+        'total': (5, 1, 1),
+    }
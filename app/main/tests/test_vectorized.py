@@ -0,0 +1,125 @@
+import random
+
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from app.main.intervals import merge_intervals, to_bitmap
+from app.main.models import Courier, Order
+from app.main.packing import to_weight_units
+from app.main.tests.test_order import CURRENT_DATE
+from app.main.utils import reverse
+from app.main.vectorized import OrderColumns, pack_orders
+
+
+def random_intervals(rnd, count):
+    intervals = []
+    for _ in range(count):
+        start = rnd.randrange(0, 1400, 15)
+        intervals.append([start, min(1440, start + rnd.randrange(15, 480, 15))])
+    return merge_intervals(intervals)
+
+
+def python_add_order(courier, rows, assigned_weight, packing_mode):
+    orders = [
+        Order(id=order_id, region_id=region_id, weight=weight, delivery_minutes=delivery_minutes)
+        for order_id, region_id, weight, delivery_minutes in rows
+    ]
+    orders = [order for order in orders if order.is_possible_to_deliver(CURRENT_DATE)]
+    assigned = [Order(id=0, weight=assigned_weight)] if assigned_weight else []
+    result = courier.add_order(
+        courier._group_orders_by_region(orders), list(assigned), CURRENT_DATE, packing_mode=packing_mode
+    )
+    return [order.id for order in result[len(assigned):]]
+
+
+@pytest.mark.parametrize('packing_mode', ['greedy', 'optimal'])
+def test_pack_orders_matches_add_order(packing_mode):
+    rnd = random.Random(42)
+    for _ in range(200):
+        courier = Courier(
+            courier_type=rnd.choice(['foot', 'bike', 'car']),
+            working_minutes=random_intervals(rnd, rnd.randint(1, 3)),
+        )
+        if not courier.has_valid_working_hours(CURRENT_DATE):
+            continue
+        rows = [
+            (
+                order_id,
+                rnd.randint(1, 4),
+                # одинаковые веса и промежутки, чтобы проверить порядок при равенстве
+                Decimal(rnd.choice([rnd.randint(1, 5000), 100, 250])) / 100,
+                random_intervals(rnd, rnd.randint(0, 3)) if rnd.random() < 0.7 else [[540, 720]],
+            )
+            for order_id in rnd.sample(range(1, 1000), rnd.randint(0, 60))
+        ]
+        assigned_weight = Decimal(rnd.choice([0, 0, rnd.randint(1, 1500)])) / 100
+
+        columns = OrderColumns.from_rows(rows).possible_to_deliver(CURRENT_DATE)
+        capacity = to_weight_units(courier.max_weight - assigned_weight)
+        packed = columns.to_orders(pack_orders(columns, courier.working_intervals, capacity, packing_mode), CURRENT_DATE)
+
+        expected = python_add_order(courier, rows, assigned_weight, packing_mode)
+        assert [order.id for order in packed] == expected
+        for order in packed:
+            python_order = Order(delivery_minutes=order.delivery_minutes)
+            python_order.is_possible_to_deliver(CURRENT_DATE)
+            assert order.delivery_intervals == python_order.delivery_intervals
+            assert to_bitmap(order.delivery_intervals) & courier.working_bitmap
+
+
+def test_order_columns_exclude_keeps_intervals():
+    rows = [(1, 1, 1, [[540, 600]]), (2, 1, 2, [[600, 660], [700, 760]]), (3, 2, 3, [[800, 900]])]
+    columns = OrderColumns.from_rows(rows).exclude({1})
+
+    assert columns.ids.tolist() == [2, 3]
+    assert [order.delivery_intervals for order in columns.to_orders(columns.ids.argsort(), CURRENT_DATE)] == [
+        [[600, 660], [700, 760]], [[800, 900]]
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('packing', ['greedy', 'optimal'])
+@patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE)
+def test_orders_assign_numpy_engine_matches_python(packing, api_client, settings):
+    rnd = random.Random(7)
+    hours = ['09:00-12:00', '10:30-11:30', '12:00-18:00', '07:00-10:00', '10:55-11:00']
+    api_client.post(reverse('main:couriers__create'), {
+        "data": [
+            {
+                "courier_id": courier_id,
+                "courier_type": rnd.choice(['foot', 'bike', 'car']),
+                "regions": rnd.sample(range(1, 5), rnd.randint(1, 3)),
+                "working_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for courier_id in range(1, 7)
+        ]
+    })
+    api_client.post(reverse('main:orders__create'), {
+        "data": [
+            {
+                "order_id": order_id,
+                "weight": rnd.randint(1, 1500) / 100,
+                "region": rnd.randint(1, 4),
+                "delivery_hours": rnd.sample(hours, rnd.randint(1, 2))
+            } for order_id in range(1, 120)
+        ]
+    })
+
+    def assign_all():
+        return [
+            api_client.post(reverse('main:orders_assign'), {'courier_id': courier_id, 'packing': packing}).data
+            for courier_id in range(1, 7)
+        ]
+
+    settings.ORDERS_ENGINE = 'numpy'
+    numpy_result = assign_all()
+    # повторное назначение возвращает уже назначенные заказы (в порядке базы)
+    assert [sorted(result['orders'], key=lambda x: x['id']) for result in assign_all()] == [
+        sorted(result['orders'], key=lambda x: x['id']) for result in numpy_result
+    ]
+    assert any(result['orders'] for result in numpy_result)
+
+    Order.objects.update(courier_id=None, assign_time=None)
+    settings.ORDERS_ENGINE = 'python'
+    assert assign_all() == numpy_result
@@ -1,16 +1,27 @@
+from django.conf import settings
 from django.urls import path
 
 from .views import (
-    CouriersCreateView, OrdersCreateView,
-    OrdersAssignView, OrdersCompleteView, CourierView
+    CouriersCreateView, CouriersLeaderboardView, OrdersCreateView,
+    OrdersAssignView, OrdersBatchAssignView, OrdersCompleteView, CourierView, metrics_view
 )
 
 app_name = 'main'
 
+courier_view = CourierView.as_view()
+orders_assign_view = OrdersAssignView.as_view()
+orders_complete_view = OrdersCompleteView.as_view()
+
+if settings.ASYNC_VIEWS:
+    from .async_views import courier_view, orders_assign_view, orders_complete_view  # noqa: F811
+
 urlpatterns = [
     path('couriers', CouriersCreateView.as_view(), name='couriers__create'),
-    path('couriers/<int:courier_id>', CourierView.as_view(), name='courier'),
+    path('couriers/leaderboard', CouriersLeaderboardView.as_view(), name='couriers_leaderboard'),
+    path('couriers/<int:courier_id>', courier_view, name='courier'),
     path('orders', OrdersCreateView.as_view(), name='orders__create'),
-    path('orders/assign', OrdersAssignView.as_view(), name='orders_assign'),
-    path('orders/complete', OrdersCompleteView.as_view(), name='orders_complete'),
+    path('orders/assign', orders_assign_view, name='orders_assign'),
+    path('orders/assign/batch', OrdersBatchAssignView.as_view(), name='orders_assign_batch'),
+    path('orders/complete', orders_complete_view, name='orders_complete'),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -1,7 +1,10 @@
+from contextlib import nullcontext
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List
 
 import django.urls
+from django.conf import settings
+from django.db import transaction
 from django.utils.datastructures import MultiValueDict
 from django.utils.http import urlencode
 
@@ -9,7 +12,11 @@ from rest_framework.validators import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
 
+from .base_serializers import BulkImportArgsSerializer
 from .exceptions import APIError, Http400
+from .metrics import BULK_IMPORT_ROWS
+from .profiling import stage
+from .streaming import JSONStreamError, chunked, iter_json_array
 
 
 def get_object_or_400(klass, *args, **kwargs):
@@ -20,17 +27,22 @@ def get_object_or_400(klass, *args, **kwargs):
     return obj
 
 
-def collect_invalid_objects(request, serializer_cls, obj_key: str):
+def get_invalid_object(item: Any, obj_key: str) -> Dict[str, Any]:
+    """Объект, не прошедший валидацию, в формате response body: {'id': <значение obj_key>}"""
+    return {'id': item.get(obj_key) if isinstance(item, dict) else None}
+
+
+def collect_invalid_objects(items: Any, errors: Any, obj_key: str) -> List[Dict[str, Any]]:
     """
     Утилита для сбора объектов, которые не прошли валидацию.
-    Используется для отдачи в response body, когда кидается Http400
+    Используется для отдачи в response body, когда кидается Http400.
+    errors - ошибки ListSerializer, уже посчитанные при валидации payload (по одному элементу на каждый объект),
+    поэтому объекты повторно не валидируются
     """
-    invalid_objects = []
-    for item in request.data.get('data'):
-        serializer = serializer_cls(data=item)
-        if not serializer.is_valid():
-            invalid_objects.append({'id': serializer.data.get(obj_key)})
-    return invalid_objects
+    if not isinstance(items, list) or not isinstance(errors, list) or len(items) != len(errors):
+        # например, payload без data или data не является списком
+        return []
+    return [get_invalid_object(item, obj_key) for item, item_errors in zip(items, errors) if item_errors]
 
 
 def validate_time_intervals(time_intervals: List[str]):
@@ -48,54 +60,6 @@ def validate_time_intervals(time_intervals: List[str]):
     return time_intervals
 
 
-def cast_objects_to_hours(inst, attr_name: str):
-    """Функция преобразует время из объектов типа OrderDeliveryHours или CourierWorkingHours в строку HH:MM-HH:MM"""
-    time_format = '%H:%M'
-    casted_hours = []
-    for time_interval in getattr(inst, attr_name):
-        start, end = time_interval.start, time_interval.end
-        casted_hours.append(f'{start.strftime(time_format)}-{end.strftime(time_format)}')
-    setattr(inst, attr_name, casted_hours)
-
-
-def cast_hours_to_objects(
-        inst,
-        attr_name: str,
-        to_obj,
-        today: datetime
-):
-    """
-    Функция преобразует время из строки в объекты типа OrderDeliveryHours или CourierWorkingHours.
-    Благодаря данной функции удобно проводить пересечение дат у заказов и курьеров,
-    и тем самым подбирать подходящие для курьеров заказы.
-    """
-    casted_hours = []
-    time_format = '%H:%M'
-    for time_interval in getattr(inst, attr_name):
-        start, end = time_interval.split('-')
-        start, end = datetime.strptime(start, time_format), datetime.strptime(end, time_format)
-        casted_hours.append(
-            to_obj(
-                start=today.replace(
-                    hour=start.hour, minute=start.minute, second=0, microsecond=0
-                ),
-                end=today.replace(
-                    hour=end.hour, minute=end.minute, second=0, microsecond=0
-                )
-            )
-        )
-    setattr(inst, attr_name, sorted(casted_hours, key=lambda x: x.start))
-
-
-def remove_time_intervals_over_current_time(inst, attr_time_interval: str, today):
-    """Убирает временной промежуток, если время окончания (доставки зказа/работы курьера) < текущего времени"""
-    valid_time_intervals = [
-        time_interval for time_interval in getattr(inst, attr_time_interval)
-        if time_interval.end.time() > today.time()
-    ]
-    setattr(inst, attr_time_interval, valid_time_intervals)
-
-
 class CreateViewMixin:
     obj_key = None
     objects_name = None
@@ -104,15 +68,24 @@ class CreateViewMixin:
     serializer_out = None
 
     def post(self, request):
+        import_args = BulkImportArgsSerializer(data=request.query_params).load()
+        if import_args['stream']:
+            return self.stream_create(request, atomic=import_args['atomic'])
+
         try:
             created_objects = self.serializer_list(data=request.data).load_and_save()
         except ValidationError as e:
+            items = request.data.get('data') if isinstance(request.data, dict) else None
+            errors = e.detail.get('data') if isinstance(e.detail, dict) else None
+            invalid_objects = collect_invalid_objects(items, errors, obj_key=self.obj_key)
+            BULK_IMPORT_ROWS.labels(self.objects_name, 'bulk', 'invalid').inc(len(invalid_objects))
             raise APIError(
                 objects_name=self.objects_name,
-                invalid_objects=collect_invalid_objects(request, self.serializer, obj_key=self.obj_key),
+                invalid_objects=invalid_objects,
                 details=e.get_full_details()
             )
 
+        BULK_IMPORT_ROWS.labels(self.objects_name, 'bulk', 'created').inc(len(created_objects))
         return Response(
             {
                 self.objects_name: self.serializer_out(created_objects, many=True).data
@@ -120,6 +93,61 @@ class CreateViewMixin:
             status=status.HTTP_201_CREATED
         )
 
+    def _validate_chunk(self, chunk: List[Any], invalid_objects: List[Dict], details: List[Dict]) -> List[Dict]:
+        """
+        Валидирует кусок payload за один проход (так же, как ListSerializer, но без отказа от всего куска):
+        сначала быстрой проверкой serializer_list.fast_item_validator, а не прошедшие ее объекты - сериализатором DRF.
+        Невалидные объекты добавляются в invalid_objects и details, возвращаются валидные
+        """
+        item_serializer = self.serializer()
+        validated_items = []
+        for item in chunk:
+            validated_item = self.serializer_list.fast_item_validator(item)
+            if validated_item is not None:
+                validated_items.append(validated_item)
+                continue
+            try:
+                validated_items.append(item_serializer.run_validation(item))
+            except ValidationError as e:
+                invalid_objects.append(get_invalid_object(item, self.obj_key))
+                details.append(e.get_full_details())
+        return validated_items
+
+    def stream_create(self, request, atomic: bool = True):
+        """
+        Потоковая загрузка объектов: массив data разбирается из тела запроса по мере чтения, валидируется
+        кусками по settings.BULK_IMPORT_CHUNK_SIZE объектов и записывается в базу через COPY (serializer_list.copy_create),
+        поэтому память не зависит от размера payload.
+        При atomic=True поведение такое же, как у обычной загрузки: если есть невалидные объекты, то в базу ничего
+        не записывается и отдается 400. При atomic=False каждый кусок записывается в своей транзакции,
+        невалидные объекты пропускаются и перечисляются в ответе
+        """
+        created_ids, invalid_objects, details = [], [], []
+
+        with transaction.atomic() if atomic else nullcontext():
+            try:
+                for chunk in chunked(iter_json_array(request.stream, 'data'), settings.BULK_IMPORT_CHUNK_SIZE):
+                    with stage('parsing'):
+                        validated_items = self._validate_chunk(chunk, invalid_objects, details)
+                    # в режиме atomic после первого невалидного объекта payload дочитывается только ради ошибок
+                    if validated_items and not (atomic and invalid_objects):
+                        with stage('copy'):
+                            created_ids.extend(self.serializer_list.copy_create(validated_items))
+            except JSONStreamError as e:
+                raise Http400(details=f'Invalid JSON: {e}')
+
+            BULK_IMPORT_ROWS.labels(self.objects_name, 'stream', 'invalid').inc(len(invalid_objects))
+            if atomic and invalid_objects:
+                raise APIError(objects_name=self.objects_name, invalid_objects=invalid_objects, details={'data': details})
+
+        BULK_IMPORT_ROWS.labels(self.objects_name, 'stream', 'created').inc(len(created_ids))
+        # объекты не загружаются из базы, поэтому ответ собирается по id, в том же формате, что и serializer_out
+        resp = {self.objects_name: [{'id': created_id} for created_id in created_ids]}
+        if invalid_objects:
+            resp.update({'validation_error': {self.objects_name: invalid_objects}})
+
+        return Response(resp, status=status.HTTP_201_CREATED)
+
 
 def reverse(view, urlconf=None, args=None, kwargs=None, current_app=None, query_kwargs=None):
     base_url = django.urls.reverse(view, urlconf=urlconf, args=args, kwargs=kwargs, current_app=current_app)
@@ -0,0 +1,177 @@
+"""
+Векторизованный выбор заказов курьеру для больших пулов заказов (settings.ORDERS_ENGINE=numpy).
+Кандидаты хранятся столбцами numpy: id, район, вес в целых сотых долях кг (см. to_weight_units)
+и промежутки доставки всех заказов подряд с номером заказа для каждого промежутка.
+Проверка срока доставки, пересечения с рабочими часами курьера и ключи сортировки считаются сразу для всех заказов,
+а выбранный набор заказов (и их порядок) совпадает с Courier.add_order при той же упаковке
+"""
+from datetime import datetime
+from typing import Any, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from .intervals import minute_of_day
+from .models.enums import PackingMode
+from .models.order import Order
+from .packing import WEIGHT_UNITS_IN_KG, optimal_pack
+
+
+__all__ = ['OrderColumns', 'pack_orders']
+
+
+# id, район, вес в кг, промежутки доставки в минутах
+OrderRow = Tuple[int, int, Any, List[List[int]]]
+
+
+class OrderColumns:
+    """
+    Заказы-кандидаты столбцами:
+        ids, region_ids, weights - по заказу (вес в сотых долях кг)
+        owners, starts, ends - по промежутку доставки: номер заказа в столбцах, начало и конец промежутка
+    Промежутки одного заказа идут подряд и в порядке заказов, rows - исходные строки для создания Order
+    """
+
+    def __init__(self, rows: List[OrderRow], positions, ids, region_ids, weights, owners, starts, ends):
+        self.rows = rows
+        self.positions = positions
+        self.ids = ids
+        self.region_ids = region_ids
+        self.weights = weights
+        self.owners = owners
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[OrderRow]) -> 'OrderColumns':
+        rows = list(rows)
+        count = len(rows)
+        intervals_counts = np.fromiter((len(row[3]) for row in rows), dtype=np.int64, count=count)
+        bounds = np.fromiter(
+            (minute for row in rows for interval in row[3] for minute in interval),
+            dtype=np.int64, count=2 * int(intervals_counts.sum())
+        )
+        # вес хранится с точностью до 0.01 кг, поэтому округление float до целых сотых дает тот же результат,
+        # что и to_weight_units
+        weights = np.fromiter((row[2] for row in rows), dtype=np.float64, count=count)
+        return cls(
+            rows=rows,
+            positions=np.arange(count),
+            ids=np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+            region_ids=np.fromiter((row[1] for row in rows), dtype=np.int64, count=count),
+            weights=np.rint(weights * WEIGHT_UNITS_IN_KG).astype(np.int64),
+            owners=np.repeat(np.arange(count), intervals_counts),
+            starts=bounds[0::2],
+            ends=bounds[1::2],
+        )
+
+    def _take(self, orders_mask: np.ndarray, intervals_mask: np.ndarray) -> 'OrderColumns':
+        # номера заказов в новых столбцах
+        new_numbers = np.cumsum(orders_mask) - 1
+        intervals_mask = intervals_mask & orders_mask[self.owners]
+        return OrderColumns(
+            rows=self.rows,
+            positions=self.positions[orders_mask],
+            ids=self.ids[orders_mask],
+            region_ids=self.region_ids[orders_mask],
+            weights=self.weights[orders_mask],
+            owners=new_numbers[self.owners[intervals_mask]],
+            starts=self.starts[intervals_mask],
+            ends=self.ends[intervals_mask],
+        )
+
+    def possible_to_deliver(self, today: datetime) -> 'OrderColumns':
+        """
+        То же, что и Order.is_possible_to_deliver для всех заказов: остаются заказы, у которых есть незакончившийся
+        промежуток доставки, и только такие промежутки (Order.delivery_intervals)
+        """
+        alive = self.ends > minute_of_day(today)
+        orders_mask = np.bincount(self.owners[alive], minlength=len(self)) > 0
+        return self._take(orders_mask, alive)
+
+    def exclude(self, order_ids: Set[int]) -> 'OrderColumns':
+        orders_mask = ~np.isin(self.ids, list(order_ids))
+        return self._take(orders_mask, np.ones(len(self.owners), dtype=bool))
+
+    def to_orders(self, numbers: np.ndarray, today: datetime) -> List[Order]:
+        """Заказы с номерами numbers, назначенные в момент today"""
+        orders = []
+        for number in numbers.tolist():
+            order_id, region_id, weight, delivery_minutes = self.rows[self.positions[number]]
+            order = Order(id=order_id, region_id=region_id, weight=weight, delivery_minutes=delivery_minutes)
+            first, last = np.searchsorted(self.owners, [number, number + 1])
+            order.delivery_intervals = [
+                [start, end] for start, end in zip(self.starts[first:last].tolist(), self.ends[first:last].tolist())
+            ]
+            order.assign_time = today
+            orders.append(order)
+        return orders
+
+
+def _overlap_mask(columns: OrderColumns, working_intervals: Iterable[List[int]]) -> np.ndarray:
+    """Заказы, промежутки доставки которых пересекаются с рабочими часами хотя бы на 1 минуту (как is_overlap)"""
+    intervals_overlap = np.zeros(len(columns.owners), dtype=bool)
+    for start, end in working_intervals:
+        intervals_overlap |= np.maximum(columns.starts, start) < np.minimum(columns.ends, end)
+    return np.bincount(columns.owners[intervals_overlap], minlength=len(columns)) > 0
+
+
+def pack_orders(
+        columns: OrderColumns,
+        working_intervals: Iterable[List[int]],
+        capacity: int,
+        packing_mode: str
+) -> np.ndarray:
+    """
+    Номера заказов, которые Courier.add_order добавил бы курьеру с рабочими часами working_intervals
+    и свободным местом capacity (в сотых долях кг), в том же порядке.
+    columns - заказы после possible_to_deliver, ключ упаковки - конец первого промежутка доставки
+    """
+    if not len(columns) or capacity <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    keys = columns.ends[np.searchsorted(columns.owners, np.arange(len(columns)))]
+    suitable = _overlap_mask(columns, working_intervals)
+
+    if packing_mode == PackingMode.optimal.name:
+        return _optimal_pack(columns, keys, suitable, capacity)
+
+    # жадная упаковка: районы по возрастанию id, внутри района от легких к тяжелым (при равном весе - по ключу).
+    # Неподходящие заказы пропускаются, а в районе после первого непоместившегося заказа не поместится ни один
+    order = np.lexsort((keys, columns.weights, columns.region_ids))
+    order = order[suitable[order]]
+    regions_bounds = np.flatnonzero(np.diff(columns.region_ids[order])) + 1
+
+    packed = []
+    for region_orders in np.split(order, regions_bounds):
+        if capacity <= 0:
+            break
+        count = np.searchsorted(np.cumsum(columns.weights[region_orders]), capacity, side='right')
+        packed.append(region_orders[:count])
+        capacity -= int(columns.weights[region_orders[:count]].sum())
+    return np.concatenate(packed) if packed else np.empty(0, dtype=np.int64)
+
+
+def _optimal_pack(columns: OrderColumns, keys: np.ndarray, suitable: np.ndarray, capacity: int) -> np.ndarray:
+    # порядок, в котором заказы сортирует optimal_pack: по весу и ключу, при равенстве - по району (как в add_order)
+    order = np.lexsort((columns.region_ids, keys, columns.weights))
+    order = order[suitable[order] & (columns.weights[order] <= capacity)]
+    if not len(order):
+        return order
+
+    # optimal_pack берет из каждого веса не больше max_count первых заказов, остальные можно не передавать
+    weights = columns.weights[order]
+    max_count = int(np.searchsorted(np.cumsum(weights), capacity, side='right'))
+    rank_in_weight = np.arange(len(order)) - np.searchsorted(weights, weights, side='left')
+    order = order[rank_in_weight < max_count]
+
+    weights = columns.weights[order].tolist()
+    packed = optimal_pack(
+        list(range(len(order))),
+        capacity=capacity,
+        weight=weights.__getitem__,
+        key=lambda x: x
+    )
+    return order[packed]
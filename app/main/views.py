@@ -1,5 +1,7 @@
 from typing import Type
 
+from django.db import transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import status
@@ -7,14 +9,15 @@ from rest_framework.generics import GenericAPIView
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from . import base_serializers
+from . import base_serializers, courier_cache, metrics
 from .serializers.courier import (
     CourierListSerializer, CourierListSerializerOut, CourierSerializer,
-    UpdateCourierArgsSerializer, CourierSerializerOut, CourierSerializerIn
+    UpdateCourierArgsSerializer, CourierSerializerOut, CourierSerializerIn,
+    CouriersBatchSerializerIn, CouriersLeaderboardArgsSerializer, CourierLeaderboardSerializerOut
 )
 from .serializers.order import (
     OrderSerializer, OrderListSerializer,
-    OrderListSerializerOut, OrdersAssignSerializer,
+    OrderListSerializerOut, OrdersAssignSerializer, OrdersBatchAssignSerializer,
     OrderCompleteSerializer, OrderArgsSerializer
 )
 from .models import Courier, Order
@@ -36,17 +39,31 @@ class CourierView(GenericAPIView):
     queryset = Courier
 
     def get(self, request, courier_id):
-        courier = get_object_or_400(Courier, id=courier_id)
-        courier_info = CourierSerializerOut(courier).data
-
-        if courier.has_completed_orders:
-            courier_info = {
-                **courier_info, 'rating': courier.rating, 'earnings': courier.earnings
-            }
+        # с общим кешем, пока версия курьера в нем, ответ (и 304 на If-None-Match) отдается без запросов к базе.
+        # Без общего кеша версия читается из базы, иначе воркер не узнает об изменениях курьера в других воркерах
+        version = None
+        if not courier_cache.has_shared_tier():
+            version = Courier.objects.filter(pk=courier_id).values_list('version', flat=True).first()
+        version, courier_info = courier_cache.get_courier_info(courier_id, version)
+        if courier_info is None:
+            courier = get_object_or_400(Courier, id=courier_id)
+            courier_info = dict(CourierSerializerOut(courier).data)
+
+            if courier.has_completed_orders:
+                courier_info = {
+                    **courier_info, 'rating': courier.rating, 'earnings': courier.earnings
+                }
+            version = courier.version
+            courier_cache.set_courier_info(courier_id, version, courier_info)
+
+        etag = courier_cache.courier_etag(courier_id, version)
+        if courier_cache.etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
 
         return Response(
             courier_info,
-            status=status.HTTP_200_OK
+            status=status.HTTP_200_OK,
+            headers={'ETag': etag}
         )
 
     def patch(self, request, courier_id):
@@ -59,6 +76,19 @@ class CourierView(GenericAPIView):
         )
 
 
+class CouriersLeaderboardView(APIView):
+    """View для получения рейтинга курьеров (опционально - только по району) с заработком"""
+
+    def get(self, request):
+        args = CouriersLeaderboardArgsSerializer(data=request.query_params).load()
+        leaderboard = Courier.get_leaderboard(region_id=args.get('region'), limit=args.get('limit'))
+
+        return Response(
+            {'couriers': CourierLeaderboardSerializerOut(leaderboard, many=True).data},
+            status=status.HTTP_200_OK
+        )
+
+
 class OrdersCreateView(CreateViewMixin, APIView):
     """View для создания заказов"""
     obj_key = 'order_id'
@@ -72,17 +102,26 @@ class OrdersAssignView(GenericAPIView):
     """View для назначения курьеру максимального количества заказов, подходящих по весу, району и графику работы"""
     serializer_class = OrdersAssignSerializer
     queryset = Order
-    current_date = timezone.now()
+
+    @property
+    def current_date(self):
+        # время назначения берется на каждый запрос
+        return timezone.now()
 
     def post(self, request):
         validated_courier_data = CourierSerializerIn(data=request.data).load()
-        courier_orders = (
-            Courier.objects
-            .get(id=validated_courier_data['courier_id'])
-            .get_suitable_orders(today=self.current_date)
-        )
 
-        assigned_orders = self.get_serializer(courier_orders, data=request.data, partial=True).load_and_save()
+        # блокировка курьера не дает параллельно назначить ему заказы сверх грузоподъемности,
+        # а выбранные заказы блокируются в Courier._lock_orders (его вызывает Courier.get_suitable_orders)
+        with transaction.atomic():
+            courier_orders = (
+                Courier.objects
+                .select_for_update(of=('self',))
+                .get(id=validated_courier_data['courier_id'])
+                .get_suitable_orders(today=self.current_date, packing_mode=validated_courier_data.get('packing'))
+            )
+
+            assigned_orders = self.get_serializer(courier_orders, data=request.data, partial=True).load_and_save()
 
         resp = {'orders': OrderListSerializerOut(assigned_orders, many=True).data}
         if courier_orders:
@@ -91,6 +130,50 @@ class OrdersAssignView(GenericAPIView):
         return Response(resp, status=status.HTTP_200_OK)
 
 
+class OrdersBatchAssignView(GenericAPIView):
+    """
+    View для назначения заказов сразу нескольким курьерам (например, в начале смены).
+    Курьеры набирают заказы по очереди из общего пула, для каждого курьера результат такой же, как у OrdersAssignView
+    """
+    serializer_class = OrdersBatchAssignSerializer
+    queryset = Order
+
+    @property
+    def current_date(self):
+        # время назначения берется на каждый запрос
+        return timezone.now()
+
+    def post(self, request):
+        validated_data = CouriersBatchSerializerIn(data=request.data).load()
+        courier_ids = validated_data['courier_ids']
+
+        with transaction.atomic():
+            # курьеры блокируются в порядке id, чтобы параллельные назначения не попадали в deadlock
+            couriers = {
+                courier.pk: courier
+                for courier in Courier.objects.select_for_update(of=('self',)).filter(id__in=courier_ids).order_by('pk')
+            }
+            couriers_orders = Courier.get_suitable_orders_batch(
+                [couriers[courier_id] for courier_id in courier_ids],
+                today=self.current_date,
+                packing_mode=validated_data.get('packing')
+            )
+
+            self.get_serializer(couriers_orders, data=request.data, partial=True).load_and_save()
+
+        resp = []
+        for courier_id in courier_ids:
+            courier_resp = {
+                'courier_id': courier_id,
+                'orders': OrderListSerializerOut(couriers_orders[courier_id], many=True).data
+            }
+            if couriers_orders[courier_id]:
+                courier_resp.update({'assign_time': couriers_orders[courier_id][-1].assign_time})
+            resp.append(courier_resp)
+
+        return Response({'couriers': resp}, status=status.HTTP_200_OK)
+
+
 class OrdersCompleteView(GenericAPIView):
     """View отмечает заказ выполненным"""
     serializer_class = OrderCompleteSerializer
@@ -119,3 +202,8 @@ class OrdersCompleteView(GenericAPIView):
             {'order_id': completed_order.pk},
             status=status.HTTP_200_OK
         )
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате prometheus (см. app.main.metrics)"""
+    return HttpResponse(metrics.collect(), content_type=metrics.CONTENT_TYPE_LATEST)
@@ -0,0 +1,147 @@
+"""
+Нагрузочный бенчмарк WSGI против ASGI: один и тот же проект запускается под gunicorn с sync-воркерами
+(синхронные view) и под gunicorn с uvicorn-воркерами (ASYNC_VIEWS=1, асинхронные view поверх пула asyncpg).
+Клиент держит --concurrency одновременных запросов GET /couriers/<id> и POST /orders/assign
+и показывает пропускную способность и задержки (p50, p99)
+
+Запуск:
+    $ python -m benchmarks.asgi --couriers 100 --orders 2000 --requests 1000 --concurrency 32 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from benchmarks.assign_concurrency import create_data
+from benchmarks.db import benchmark_database, setup_django, truncate_tables
+
+HOST = '127.0.0.1'
+
+MODES = {
+    'wsgi': {'GUNICORN_WORKER_CLASS': 'sync', 'ASYNC_VIEWS': '0', 'APP': 'app.candy_delivery.wsgi'},
+    'asgi': {
+        'GUNICORN_WORKER_CLASS': 'uvicorn.workers.UvicornWorker', 'ASYNC_VIEWS': '1', 'APP': 'app.candy_delivery.asgi'
+    },
+}
+
+
+@contextmanager
+def server(mode: str, port: int, workers: int):
+    from django.db import connection
+
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE='app.candy_delivery.settings.base',
+        DB_NAME=connection.settings_dict['NAME'],
+        DEBUG='0',
+        **MODES[mode]
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf', env['APP'],
+            '--bind', f'{HOST}:{port}', '--workers', str(workers), '--log-level', 'warning',
+        ],
+        env=env
+    )
+    try:
+        wait_for_server(port)
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def wait_for_server(port: int, timeout: float = 30):
+    async def ping():
+        return await request(port, 'GET', '/couriers/1')
+
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        try:
+            asyncio.run(ping())
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def request(port: int, method: str, path: str, data: dict = None, host: str = HOST) -> int:
+    body = json.dumps(data).encode() if data is not None else b''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def load(port: int, couriers_count: int, requests_count: int, concurrency: int, seed: int):
+    rnd = random.Random(seed)
+    queue = asyncio.Queue()
+    for _ in range(requests_count):
+        courier_id = rnd.randint(1, couriers_count)
+        if rnd.random() < 0.5:
+            queue.put_nowait(('GET', f'/couriers/{courier_id}', None))
+        else:
+            queue.put_nowait(('POST', '/orders/assign', {'courier_id': courier_id}))
+
+    latencies, failed = [], 0
+
+    async def worker():
+        nonlocal failed
+        while not queue.empty():
+            method, path, data = queue.get_nowait()
+            started = time.perf_counter()
+            status = await request(port, method, path, data)
+            latencies.append(time.perf_counter() - started)
+            failed += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, sorted(latencies), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=7790)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        from django.db import connections
+
+        print(f'{"mode":>6} {"time, s":>10} {"req/s":>10} {"p50, ms":>10} {"p99, ms":>10} {"failed":>8}')
+        for mode in MODES:
+            truncate_tables()
+            create_data(args.couriers, args.orders, args.seed)
+            connections.close_all()
+            with server(mode, args.port, args.workers):
+                elapsed, latencies, failed = asyncio.run(
+                    load(args.port, args.couriers, args.requests, args.concurrency, args.seed)
+                )
+            p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+            print(
+                f'{mode:>6} {elapsed:>10.2f} {args.requests / elapsed:>10.1f} '
+                f'{p50 * 1000:>10.1f} {p99 * 1000:>10.1f} {failed:>8}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Нагрузочный бенчмарк параллельного назначения заказов (POST /orders/assign).
+Курьеры одного района одновременно забирают заказы из общего пула, бенчмарк проверяет,
+что ни один заказ не назначен дважды, и показывает, как пропускная способность зависит от числа процессов
+(как у воркеров gunicorn)
+
+Запуск:
+    $ python -m benchmarks.assign_concurrency --couriers 64 --orders 5000 --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from unittest.mock import patch
+
+import pytz
+
+from benchmarks.db import benchmark_database, setup_django, truncate_tables
+
+CURRENT_DATE = datetime(2021, 3, 29, 11, 0, 0, tzinfo=pytz.utc)
+
+
+def create_data(couriers_count: int, orders_count: int, seed: int):
+    from django.db import connection
+
+    from app.main.serializers.courier import CourierListSerializer
+    from app.main.serializers.order import OrderListSerializer
+
+    rnd = random.Random(seed)
+    CourierListSerializer(data={'data': [
+        {'courier_id': courier_id, 'courier_type': 'foot', 'regions': [1], 'working_hours': ['09:00-18:00']}
+        for courier_id in range(1, couriers_count + 1)
+    ]}).load_and_save()
+    OrderListSerializer(data={'data': [
+        {
+            'order_id': order_id,
+            'weight': rnd.randint(50, 300) / 100,
+            'region': 1,
+            'delivery_hours': [rnd.choice(['09:00-12:00', '10:00-14:00', '12:00-18:00'])]
+        } for order_id in range(1, orders_count + 1)
+    ]}).load_and_save()
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def assign(courier_id: int):
+    from rest_framework.test import APIClient
+
+    from app.main.utils import reverse
+
+    with patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE):
+        resp = APIClient().post(reverse('main:orders_assign'), {'courier_id': courier_id}, format='json')
+    return [order['id'] for order in resp.data['orders']]
+
+
+def run(couriers_count: int, workers: int):
+    from django.db import connections
+
+    # соединения не должны наследоваться дочерними процессами
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # прогрев процессов, чтобы не учитывать время их запуска
+        list(executor.map(time.sleep, [0.1] * workers))
+
+        started = time.perf_counter()
+        assigned = [
+            order_id
+            for orders in executor.map(assign, range(1, couriers_count + 1))
+            for order_id in orders
+        ]
+        elapsed = time.perf_counter() - started
+
+    assert len(assigned) == len(set(assigned)), 'order was assigned twice'
+    return elapsed, len(assigned)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=64)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(f'{"workers":>8} {"time, s":>10} {"assigns/s":>10} {"orders":>8}')
+        for workers in args.workers:
+            truncate_tables()
+            create_data(args.couriers, args.orders, args.seed)
+            elapsed, assigned_count = run(args.couriers, workers)
+            print(f'{workers:>8} {elapsed:>10.2f} {args.couriers / elapsed:>10.1f} {assigned_count:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Бенчмарк загрузки заказов (POST /orders): обычная загрузка (весь payload в памяти, bulk_create)
+против потоковой (POST /orders?stream=true: разбор и валидация кусками, запись через COPY).
+Показывает время загрузки и пиковую память python (tracemalloc) на обработку запроса
+
+Запуск:
+    $ python -m benchmarks.bulk_import --orders 10000 100000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from benchmarks.db import benchmark_database, setup_django, truncate_tables
+
+
+def make_payload(orders_count: int, seed: int) -> bytes:
+    rnd = random.Random(seed)
+    return json.dumps({'data': [
+        {
+            'order_id': order_id,
+            'weight': rnd.randint(1, 5000) / 100,
+            'region': rnd.randint(1, 100),
+            'delivery_hours': rnd.sample(['09:00-12:00', '10:00-14:00', '12:00-18:00', '19:00-21:30'], 2)
+        } for order_id in range(1, orders_count + 1)
+    ]}).encode()
+
+
+def run(payload: bytes, stream: bool):
+    from rest_framework.test import APIClient
+
+    from app.main.utils import reverse
+
+    url = reverse('main:orders__create', query_kwargs={'stream': 'true'} if stream else None)
+    client = APIClient()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    resp = client.post(url, data=payload, content_type='application/json')
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert resp.status_code == 201, resp.data
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(f'{"orders":>8} {"mode":>8} {"time, s":>10} {"orders/s":>10} {"peak, MB":>10}')
+        for orders_count in args.orders:
+            payload = make_payload(orders_count, args.seed)
+            for stream in (False, True):
+                truncate_tables()
+                elapsed, peak = run(payload, stream)
+                print(
+                    f'{orders_count:>8} {"stream" if stream else "bulk":>8} {elapsed:>10.2f} '
+                    f'{orders_count / elapsed:>10.0f} {peak / 1024 / 1024:>10.1f}'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Подготовка Django и отдельной базы для бенчмарков.
+Бенчмарки никогда не трогают рабочую базу: создается база benchmark_<DB_NAME>, которая удаляется после запуска
+"""
+import contextlib
+import os
+
+import django
+import dotenv
+
+
+def setup_django():
+    dotenv.load_dotenv()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.candy_delivery.settings.test')
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database(keepdb: bool = False):
+    from django.db import connection
+    from django.test.utils import setup_databases, teardown_databases
+
+    connection.settings_dict['TEST']['NAME'] = f'benchmark_{connection.settings_dict["NAME"]}'
+
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+
+
+def truncate_tables():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'TRUNCATE main_orderdeliveryinterval, main_order, main_region_m2m_courier, main_courier, main_region CASCADE'
+        )
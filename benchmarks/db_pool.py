@@ -0,0 +1,49 @@
+"""
+Бенчмарк пула соединений: цикл "открыть соединение, выполнить запрос, закрыть" (как один запрос к API
+при CONN_MAX_AGE = 0) со стандартным бэкендом postgresql и с app.main.db_backends.postgresql_pool
+
+Запуск:
+    $ python -m benchmarks.db_pool --requests 1000
+"""
+import argparse
+import time
+
+from benchmarks.db import benchmark_database, setup_django
+
+
+def run(engine: str, requests_count: int) -> float:
+    from django.db import connections
+    from django.db.utils import load_backend
+
+    settings_dict = {**connections['default'].settings_dict, 'ENGINE': engine}
+    wrapper_class = load_backend(engine).DatabaseWrapper
+
+    started = time.perf_counter()
+    for _ in range(requests_count):
+        wrapper = wrapper_class(settings_dict, alias='default')
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        wrapper.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        from app.main.db_backends.postgresql_pool.pool import close_pools, pools_stats
+
+        print(f'{"backend":>10} {"time, s":>10} {"ms/request":>12}')
+        for name, engine in (('postgresql', 'django.db.backends.postgresql'),
+                             ('pool', 'app.main.db_backends.postgresql_pool')):
+            elapsed = run(engine, args.requests)
+            print(f'{name:>10} {elapsed:>10.2f} {elapsed / args.requests * 1000:>12.2f}')
+        print(pools_stats())
+        close_pools()
+
+
+if __name__ == '__main__':
+    main()
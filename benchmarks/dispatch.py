@@ -0,0 +1,89 @@
+"""
+Бенчмарк массового назначения заказов (app.main.dispatch) в зависимости от числа процессов.
+Нагрузка из benchmarks.generator, но районы курьеров ограничены округами по --district соседних районов,
+как в городе, где курьер работает в соседних районах. Тогда компонент связности районов - примерно
+по числу округов. Перед каждым прогоном назначения сбрасываются, результат всех прогонов должен совпадать
+
+Запуск:
+    $ python -m benchmarks.dispatch --couriers 5000 --orders 200000 --regions 200 --district 5 --workers 1 2 4 8
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+import pytz
+
+from benchmarks.db import benchmark_database, setup_django
+from benchmarks.generator import Workload, load
+
+CURRENT_DATE = datetime(2021, 3, 29, 6, 0, 0, tzinfo=pytz.utc)
+
+
+def split_into_districts(regions_count: int, district: int, seed: int):
+    """Оставляет каждому курьеру районы одного округа (district соседних районов)"""
+    from django.db import connection
+
+    rnd = random.Random(seed)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT id FROM main_courier ORDER BY id')
+        couriers_ids = [row[0] for row in cursor.fetchall()]
+        districts_count = max(1, regions_count // district)
+        regions = []
+        for _ in couriers_ids:
+            first_region = rnd.randrange(districts_count) * district + 1
+            district_regions = range(first_region, min(first_region + district, regions_count + 1))
+            regions.append('{%s}' % ','.join(map(str, rnd.sample(district_regions, rnd.randint(1, len(district_regions))))))
+        cursor.execute(
+            'UPDATE main_courier c SET region_ids = r.region_ids::int[] '
+            'FROM unnest(%s::int[], %s::text[]) AS r(id, region_ids) WHERE c.id = r.id',
+            [couriers_ids, regions]
+        )
+
+
+def reset_assignments():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('UPDATE main_order SET courier_id = NULL, assign_time = NULL WHERE complete_time IS NULL')
+        cursor.execute('VACUUM ANALYZE main_order')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--regions', type=int, default=200)
+    parser.add_argument('--district', type=int, default=5)
+    parser.add_argument('--density', type=float, default=Workload.density)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workload = Workload(args.couriers, args.orders, args.regions, args.density, completed=0, seed=args.seed)
+    setup_django()
+    from app.main.dispatch import dispatch_orders
+
+    with benchmark_database():
+        load(workload)
+        split_into_districts(args.regions, args.district, args.seed)
+
+        print(f'{"workers":>8} {"time, s":>8} {"speedup":>8} {"couriers":>9} {"orders":>8}')
+        baseline_time, baseline_result = None, None
+        for workers in args.workers:
+            reset_assignments()
+            started = time.perf_counter()
+            result = dispatch_orders(today=CURRENT_DATE, workers=workers)
+            elapsed = time.perf_counter() - started
+
+            result = {courier_id: [order.id for order in orders] for courier_id, orders in result.items()}
+            baseline_time, baseline_result = baseline_time or elapsed, baseline_result or result
+            assert result == baseline_result, f'dispatch result differs with {workers} workers'
+            print(
+                f'{workers:>8} {elapsed:>8.2f} {baseline_time / elapsed:>7.1f}x {len(result):>9} '
+                f'{sum(map(len, result.values())):>8}'
+            )
+
+
+if __name__ == '__main__':
+    main()
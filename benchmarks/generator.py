@@ -0,0 +1,163 @@
+"""
+Генератор синтетической нагрузки: N курьеров, M заказов в R районах с заданной плотностью промежутков
+(среднее количество промежутков рабочих часов / часов доставки на объект). Генерация детерминирована (seed).
+Часть заказов (--completed) генерируется уже выполненными, чтобы у курьеров были рейтинг и заработок.
+
+Как библиотека используется в benchmarks.suite, как скрипт - пишет payload для POST /couriers и POST /orders
+(например, для ручной загрузки через curl или для benchmarks.replay)
+
+Запуск:
+    $ python -m benchmarks.generator --couriers 10000 --orders 1000000 --regions 100 --density 2 --output /tmp/workload
+"""
+import argparse
+import json
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+import pytz
+
+COURIER_TYPES = ('foot', 'bike', 'car')
+# грузоподъемность курьеров в кг (см. app.main.models.enums.CourierType)
+MAX_ORDER_WEIGHT = 50
+
+HISTORY_START = datetime(2021, 3, 1, 9, 0, 0, tzinfo=pytz.utc)
+
+
+@dataclass
+class Workload:
+    couriers: int = 1000
+    orders: int = 20000
+    regions: int = 50
+    density: float = 2
+    completed: float = 0.1
+    seed: int = 42
+
+
+def random_hours(rnd: random.Random, density: float) -> List[str]:
+    """Промежутки HH:MM-HH:MM, в среднем density штук (промежутки могут пересекаться, как и в реальных данных)"""
+    count = rnd.randint(1, max(1, round(2 * density) - 1))
+    hours = []
+    for _ in range(count):
+        start = rnd.randrange(6 * 60, 22 * 60)
+        end = min(start + rnd.randrange(30, 8 * 60), 24 * 60 - 1)
+        hours.append(f'{start // 60:02}:{start % 60:02}-{end // 60:02}:{end % 60:02}')
+    return hours
+
+
+def generate_couriers(workload: Workload) -> Iterator[Dict]:
+    """Курьеры в формате POST /couriers"""
+    rnd = random.Random(f'{workload.seed}-couriers')
+    for courier_id in range(1, workload.couriers + 1):
+        yield {
+            'courier_id': courier_id,
+            'courier_type': rnd.choice(COURIER_TYPES),
+            'regions': rnd.sample(range(1, workload.regions + 1), rnd.randint(1, min(5, workload.regions))),
+            'working_hours': random_hours(rnd, workload.density),
+        }
+
+
+def generate_orders(workload: Workload, first_id: int = 1) -> Iterator[Dict]:
+    """Заказы в формате POST /orders"""
+    rnd = random.Random(f'{workload.seed}-orders-{first_id}')
+    for order_id in range(first_id, first_id + workload.orders):
+        yield {
+            'order_id': order_id,
+            # в основном легкие заказы, как в реальной доставке, но встречаются и тяжелые
+            'weight': round(min(rnd.expovariate(1 / 3) + 0.01, MAX_ORDER_WEIGHT), 2),
+            'region': rnd.randint(1, workload.regions),
+            'delivery_hours': random_hours(rnd, workload.density),
+        }
+
+
+def generate_history(workload: Workload, couriers: List[Dict]) -> Dict[int, tuple]:
+    """
+    Выполненные заказы: id заказа -> (id курьера, assign_time, complete_time).
+    Заказ выполняет курьер, который работает в районе заказа, если такого нет - заказ остается свободным
+    """
+    rnd = random.Random(f'{workload.seed}-history')
+    region_couriers = {}
+    for courier in couriers:
+        for region in courier['regions']:
+            region_couriers.setdefault(region, []).append(courier['courier_id'])
+
+    history = {}
+    for order in generate_orders(workload):
+        if rnd.random() >= workload.completed or order['region'] not in region_couriers:
+            continue
+        assign_time = HISTORY_START + timedelta(minutes=rnd.randrange(0, 30 * 24 * 60))
+        complete_time = assign_time + timedelta(seconds=rnd.randrange(60, 2 * 60 * 60))
+        history[order['order_id']] = (rnd.choice(region_couriers[order['region']]), assign_time, complete_time)
+    return history
+
+
+def load(workload: Workload, chunk_size: int = 10000):
+    """
+    Загружает нагрузку в текущую базу тем же путем, что и потоковая загрузка (быстрая валидация + COPY),
+    затем отмечает часть заказов выполненными и пересчитывает статистику курьеров
+    """
+    from django.db import connection
+
+    from app.main.fast_validation import validate_courier, validate_items, validate_order
+    from app.main.models import CourierRegionStats
+    from app.main.serializers.courier import CourierListSerializer
+    from app.main.serializers.order import OrderListSerializer
+    from app.main.streaming import chunked
+
+    couriers = list(generate_couriers(workload))
+    for items, validate, serializer in (
+        (couriers, validate_courier, CourierListSerializer),
+        (generate_orders(workload), validate_order, OrderListSerializer),
+    ):
+        for chunk in chunked(items, chunk_size):
+            validated_items = validate_items(chunk, validate)
+            assert validated_items is not None, 'generated payload must be valid'
+            serializer.copy_create(validated_items)
+
+    history = generate_history(workload, couriers)
+    if history:
+        orders_ids = list(history)
+        couriers_ids, assign_times, complete_times = zip(*history.values())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                '''
+                UPDATE main_order o
+                SET courier_id = h.courier_id, assign_time = h.assign_time, complete_time = h.complete_time
+                FROM unnest(%s::int[], %s::int[], %s::timestamptz[], %s::timestamptz[])
+                    AS h(id, courier_id, assign_time, complete_time)
+                WHERE o.id = h.id
+                ''',
+                [orders_ids, list(couriers_ids), list(assign_times), list(complete_times)]
+            )
+        CourierRegionStats.rebuild()
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=Workload.couriers)
+    parser.add_argument('--orders', type=int, default=Workload.orders)
+    parser.add_argument('--regions', type=int, default=Workload.regions)
+    parser.add_argument('--density', type=float, default=Workload.density)
+    parser.add_argument('--seed', type=int, default=Workload.seed)
+    parser.add_argument('--output', required=True, help='каталог для couriers.json и orders.json')
+    args = parser.parse_args()
+
+    workload = Workload(args.couriers, args.orders, args.regions, args.density, seed=args.seed)
+    os.makedirs(args.output, exist_ok=True)
+    for name, items in (('couriers', generate_couriers(workload)), ('orders', generate_orders(workload))):
+        path = os.path.join(args.output, f'{name}.json')
+        with open(path, 'w') as f:
+            f.write('{"data": [')
+            for i, item in enumerate(items):
+                f.write((',' if i else '') + json.dumps(item))
+            f.write(']}')
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
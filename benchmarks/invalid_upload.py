@@ -0,0 +1,67 @@
+"""
+Бенчмарк стоимости отклоненной загрузки заказов (POST /orders) по сравнению с успешной.
+Невалидный payload отличается от валидного одним заказом в конце, поэтому оба проходят валидацию целиком.
+Отклоненная загрузка не должна стоить дороже успешной (раньше payload валидировался повторно ради id ошибочных заказов)
+
+Запуск:
+    $ python -m benchmarks.invalid_upload --orders 10000 50000
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.db import benchmark_database, setup_django, truncate_tables
+
+
+def make_orders(orders_count: int, seed: int):
+    rnd = random.Random(seed)
+    return [
+        {
+            'order_id': order_id,
+            'weight': rnd.randint(1, 5000) / 100,
+            'region': rnd.randint(1, 100),
+            'delivery_hours': rnd.sample(['09:00-12:00', '10:00-14:00', '12:00-18:00', '19:00-21:30'], 2)
+        } for order_id in range(1, orders_count + 1)
+    ]
+
+
+def run(orders, expected_status: int) -> float:
+    from rest_framework.test import APIClient
+
+    from app.main.utils import reverse
+
+    payload = json.dumps({'data': orders}).encode()
+    started = time.perf_counter()
+    resp = APIClient().post(reverse('main:orders__create'), data=payload, content_type='application/json')
+    elapsed = time.perf_counter() - started
+
+    assert resp.status_code == expected_status, resp.status_code
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(f'{"orders":>8} {"valid, s":>10} {"invalid, s":>10} {"ratio":>6}')
+        for orders_count in args.orders:
+            orders = make_orders(orders_count, args.seed)
+            invalid_orders = orders[:-1] + [{**orders[-1], 'weight': 0.001}]
+
+            truncate_tables()
+            valid_elapsed = run(orders, expected_status=201)
+            truncate_tables()
+            invalid_elapsed = run(invalid_orders, expected_status=400)
+            print(
+                f'{orders_count:>8} {valid_elapsed:>10.2f} {invalid_elapsed:>10.2f} '
+                f'{invalid_elapsed / valid_elapsed:>6.2f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
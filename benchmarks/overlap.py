@@ -0,0 +1,88 @@
+"""
+Микро-бенчмарк проверки пересечения рабочих часов курьера с часами доставки заказов.
+Сравнивает прежнюю реализацию на DateTimeRange с битовыми масками из app.main.intervals
+
+Запуск:
+    $ python -m benchmarks.overlap --orders 5000
+"""
+import argparse
+import random
+import timeit
+from collections import namedtuple
+from datetime import datetime
+
+from datetimerange import DateTimeRange
+
+from app.main.intervals import is_overlap, merge_intervals, to_bitmap
+
+TimeInterval = namedtuple('TimeInterval', 'start end')
+
+
+def legacy_is_overlap(courier_intervals, order_intervals) -> bool:
+    """Прежняя реализация Courier._is_working_hours_overlap"""
+    for order_interval in order_intervals:
+        for courier_interval in courier_intervals:
+            courier_time = DateTimeRange(courier_interval.start, courier_interval.end)
+            order_time = DateTimeRange(order_interval.start, order_interval.end)
+            time_delta = courier_time.intersection(order_time)
+            if time_delta.is_valid_timerange():
+                if time_delta.timedelta.seconds:
+                    return True
+    return False
+
+
+def random_intervals(rnd: random.Random, count: int):
+    intervals = []
+    for _ in range(count):
+        start = rnd.randrange(0, 23 * 60)
+        intervals.append([start, rnd.randrange(start + 1, 24 * 60)])
+    return merge_intervals(intervals)
+
+
+def to_datetimes(intervals, today: datetime):
+    return [
+        TimeInterval(
+            start=today.replace(hour=start // 60, minute=start % 60),
+            end=today.replace(hour=end // 60, minute=end % 60)
+        ) for start, end in intervals
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=5000, help='количество заказов-кандидатов')
+    parser.add_argument('--intervals', type=int, default=3, help='максимальное количество интервалов у заказа')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    today = datetime(2021, 3, 29, 0, 0)
+    courier = random_intervals(rnd, 3)
+    orders = [random_intervals(rnd, rnd.randint(1, args.intervals)) for _ in range(args.orders)]
+
+    courier_objects = to_datetimes(courier, today)
+    orders_objects = [to_datetimes(order, today) for order in orders]
+    courier_bitmap = to_bitmap(courier)
+
+    legacy_result = [legacy_is_overlap(courier_objects, order) for order in orders_objects]
+    bitmap_result = [is_overlap(courier_bitmap, to_bitmap(order)) for order in orders]
+    assert legacy_result == bitmap_result, 'results of implementations differ'
+
+    legacy_time = min(timeit.repeat(
+        lambda: [legacy_is_overlap(courier_objects, order) for order in orders_objects],
+        number=1, repeat=args.repeat
+    ))
+    bitmap_time = min(timeit.repeat(
+        lambda: [is_overlap(courier_bitmap, to_bitmap(order)) for order in orders],
+        number=1, repeat=args.repeat
+    ))
+
+    print(f'orders: {args.orders}, matched: {sum(bitmap_result)}')
+    print(f'DateTimeRange: {legacy_time * 1000:.2f} ms')
+    print(f'bitmap:        {bitmap_time * 1000:.2f} ms')
+    print(f'speedup:       x{legacy_time / bitmap_time:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Бенчмарк способов упаковки заказов курьеру: жадного (greedy_pack) и оптимального (optimal_pack).
+Для каждого размера пула кандидатов и типа курьера выводится время упаковки и количество/вес выбранных заказов
+
+Запуск:
+    $ python -m benchmarks.packing --pools 100 1000 10000 100000
+"""
+import argparse
+import random
+import timeit
+
+from app.main.packing import WEIGHT_UNITS_IN_KG, greedy_pack, optimal_pack
+
+# грузоподъемность курьеров в кг (см. app.main.models.enums.CourierType)
+COURIER_CAPACITIES = {'foot': 10, 'bike': 15, 'car': 50}
+
+
+def generate_pool(rnd: random.Random, size: int, regions: int):
+    """Заказы-кандидаты: (регион, вес в сотых долях кг, окончание первого промежутка доставки)"""
+    return [
+        (rnd.randint(1, regions), rnd.randint(1, 50 * WEIGHT_UNITS_IN_KG), rnd.randint(600, 1440))
+        for _ in range(size)
+    ]
+
+
+def group_by_region(pool):
+    grouped = {}
+    for item in sorted(pool):
+        grouped.setdefault(item[0], []).append(item)
+    return grouped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pools', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--regions', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    weight, key = (lambda x: x[1]), (lambda x: x[2])
+
+    print(f'{"pool":>8} {"courier":>8} {"greedy, ms":>11} {"optimal, ms":>12} {"greedy n/kg":>14} {"optimal n/kg":>14}')
+    for size in args.pools:
+        pool = generate_pool(rnd, size, args.regions)
+        grouped = group_by_region(pool)
+        for courier_type, max_weight in COURIER_CAPACITIES.items():
+            capacity = max_weight * WEIGHT_UNITS_IN_KG
+
+            greedy = greedy_pack(grouped, capacity, weight=weight, key=key)
+            optimal = optimal_pack(pool, capacity, weight=weight, key=key)
+            greedy_time = min(timeit.repeat(
+                lambda: greedy_pack(grouped, capacity, weight=weight, key=key), number=1, repeat=args.repeat
+            ))
+            optimal_time = min(timeit.repeat(
+                lambda: optimal_pack(pool, capacity, weight=weight, key=key), number=1, repeat=args.repeat
+            ))
+
+            greedy_stats = f'{len(greedy)}/{sum(map(weight, greedy)) / WEIGHT_UNITS_IN_KG:.2f}'
+            optimal_stats = f'{len(optimal)}/{sum(map(weight, optimal)) / WEIGHT_UNITS_IN_KG:.2f}'
+            print(
+                f'{size:>8} {courier_type:>8} {greedy_time * 1000:>11.2f} {optimal_time * 1000:>12.2f} '
+                f'{greedy_stats:>14} {optimal_stats:>14}'
+            )
+
+
+if __name__ == '__main__':
+    main()
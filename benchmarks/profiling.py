@@ -0,0 +1,87 @@
+"""
+Накладные расходы ProfilingMiddleware: одни и те же запросы (GET /couriers/<id> и POST /orders/assign)
+без middleware, с middleware без профилирования (PROFILING_SAMPLE_RATE=0), с семплированием 1% и с профилированием
+каждого запроса (запись в лог отключена, чтобы мерить только сбор данных)
+
+Запуск:
+    $ python -m benchmarks.profiling --couriers 50 --orders 2000 --requests 200 --rounds 5
+"""
+import argparse
+import logging
+import time
+from unittest.mock import patch
+
+from benchmarks.assign_concurrency import CURRENT_DATE, create_data
+from benchmarks.db import benchmark_database, setup_django
+
+MIDDLEWARE = 'app.main.middleware.ProfilingMiddleware'
+
+
+def run(couriers_count: int, requests_count: int, middleware: list, sample_rate: float) -> float:
+    from django.db import connection
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    from app.main.utils import reverse
+
+    with override_settings(MIDDLEWARE=middleware, PROFILING_SAMPLE_RATE=sample_rate), \
+            patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE):
+        # повторные назначения перезаписывают одни и те же заказы, мертвые строки убираются перед каждым прогоном
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM ANALYZE main_order')
+
+        client = APIClient()
+        started = time.perf_counter()
+        for i in range(requests_count):
+            courier_id = i % couriers_count + 1
+            if i % 2:
+                resp = client.get(reverse('main:courier', kwargs={'courier_id': courier_id}))
+            else:
+                resp = client.post(reverse('main:orders_assign'), {'courier_id': courier_id}, format='json')
+            assert resp.status_code == 200
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    logging.getLogger('app.main.middleware').disabled = True
+    without_middleware = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+    modes = [
+        ('off', without_middleware, 0),
+        ('rate=0', [MIDDLEWARE, *without_middleware], 0),
+        ('rate=0.01', [MIDDLEWARE, *without_middleware], 0.01),
+        ('rate=1', [MIDDLEWARE, *without_middleware], 1),
+    ]
+
+    with benchmark_database():
+        create_data(args.couriers, args.orders, args.seed)
+        # прогрев: первые назначения записывают заказы, дальше запросы одинаковые
+        run(args.couriers, args.couriers * 2, without_middleware, 0)
+
+        best = {}
+        for _ in range(args.rounds):
+            for name, middleware, sample_rate in modes:
+                elapsed = run(args.couriers, args.requests, middleware, sample_rate)
+                best[name] = min(best.get(name, elapsed), elapsed)
+
+        print(f'{"mode":>10} {"time, s":>10} {"ms/request":>12} {"overhead":>10}')
+        baseline = best['off']
+        for name, elapsed in best.items():
+            print(
+                f'{name:>10} {elapsed:>10.2f} {elapsed / args.requests * 1000:>12.3f} '
+                f'{(elapsed / baseline - 1) * 100:>9.1f}%'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Воспроизведение записанного трафика (TrafficCaptureMiddleware, TRAFFIC_CAPTURE=1) на запущенном сервере.
+Запросы отправляются с записанными интервалами между ними, ускоренными в --speed раз (--speed 0 - без пауз),
+не больше --concurrency одновременных клиентов. Результат по каждому endpoint'у: пропускная способность,
+задержки (p50, p90, p99), ошибки (5xx, ошибки соединения и ответы без статуса) и ответы со статусом,
+отличным от записанного. Ответы совпадают с записанными, только если база перед воспроизведением в том же состоянии,
+что и перед записью. Запросы, тело которых не записано (body_skipped: слишком большое или не json),
+не воспроизводятся и выводятся отдельно
+
+Запуск:
+    $ python -m benchmarks.replay --file traffic.jsonl --url http://127.0.0.1:8000 --speed 2 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from benchmarks.asgi import request
+
+
+class Result(NamedTuple):
+    endpoint: str
+    latency: float
+    status: Optional[int]
+    expected_status: int
+
+
+def load_records(path: str, limit: int = None) -> List[Dict]:
+    """Записи в порядке времени запроса (воркеры gunicorn пишут в файл вперемешку)"""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda record: record['ts'])
+    return records[:limit] if limit else records
+
+
+async def replay(records: List[Dict], url: str, speed: float, concurrency: int) -> List[Result]:
+    address = urlsplit(url)
+    host, port = address.hostname, address.port or 80
+    queue = asyncio.Queue()
+    for record in records:
+        queue.put_nowait(record)
+
+    results = []
+    first_ts = records[0]['ts'] if records else 0
+    started = time.monotonic()
+
+    async def client():
+        while not queue.empty():
+            record = queue.get_nowait()
+            if speed:
+                delay = started + (record['ts'] - first_ts) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            path = f'{record["path"]}?{record["query"]}' if record['query'] else record['path']
+            request_started = time.perf_counter()
+            try:
+                status = await request(port, record['method'], path, record['body'], host=host)
+            except (OSError, IndexError, ValueError):
+                # ошибка соединения или ответ без строки статуса
+                status = None
+            results.append(Result(record['endpoint'], time.perf_counter() - request_started, status, record['status']))
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return results
+
+
+def percentile(latencies: List[float], q: float) -> float:
+    return latencies[min(int(len(latencies) * q), len(latencies) - 1)]
+
+
+def summarize(results: List[Result], elapsed: float) -> Dict[str, Dict]:
+    """Статистика по endpoint'ам и итог по всем запросам (total)"""
+    grouped = {}
+    for result in results:
+        grouped.setdefault(result.endpoint, []).append(result)
+    if results:
+        grouped['total'] = results
+
+    summary = {}
+    for endpoint, endpoint_results in grouped.items():
+        latencies = sorted(result.latency for result in endpoint_results)
+        summary[endpoint] = {
+            'requests': len(endpoint_results),
+            'rps': len(endpoint_results) / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p90_ms': percentile(latencies, 0.9) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'errors': sum(result.status is None or result.status >= 500 for result in endpoint_results),
+            'mismatched': sum(result.status != result.expected_status for result in endpoint_results),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--file', default='traffic.jsonl')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--speed', type=float, default=1, help='во сколько раз быстрее записи, 0 - без пауз')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--limit', type=int, default=None, help='воспроизвести только первые --limit запросов')
+    parser.add_argument('--output', default=None, help='json с результатами')
+    args = parser.parse_args()
+
+    records = load_records(args.file, args.limit)
+    # без записанного тела запрос воспроизвелся бы с пустым телом и всегда расходился бы с записью
+    skipped = Counter(record['body_skipped'] for record in records if record.get('body_skipped'))
+    records = [record for record in records if not record.get('body_skipped')]
+    started = time.perf_counter()
+    results = asyncio.run(replay(records, args.url, args.speed, args.concurrency))
+    elapsed = time.perf_counter() - started
+    summary = summarize(results, elapsed)
+
+    print(
+        f'{"endpoint":<24} {"requests":>9} {"req/s":>9} {"p50, ms":>9} {"p90, ms":>9} {"p99, ms":>9} '
+        f'{"errors":>7} {"mismatched":>11}'
+    )
+    for endpoint, stats in summary.items():
+        print(
+            f'{endpoint:<24} {stats["requests"]:>9} {stats["rps"]:>9.1f} {stats["p50_ms"]:>9.1f} '
+            f'{stats["p90_ms"]:>9.1f} {stats["p99_ms"]:>9.1f} {stats["errors"]:>7} {stats["mismatched"]:>11}'
+        )
+    if skipped:
+        print('skipped (body not recorded): ' + ', '.join(f'{reason} {count}' for reason, count in skipped.items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(
+                {
+                    'file': args.file, 'speed': args.speed, 'elapsed': elapsed, 'endpoints': summary,
+                    'skipped': dict(skipped)
+                },
+                f, indent=2
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Набор бенчмарков всего API и основных функций движка назначения на синтетической нагрузке (см. benchmarks.generator).
+Каждый случай выполняется --repeat раз, в результатах - время одной операции (min, median, mean).
+Результаты пишутся в json (--output), чтобы сравнивать коммиты между собой (--compare)
+
+Запуск:
+    $ python -m benchmarks.suite --couriers 1000 --orders 20000 --regions 50 --density 2 --output results.json
+    $ python -m benchmarks.suite --output new.json --compare results.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple
+from unittest.mock import patch
+
+import pytz
+
+from benchmarks.db import benchmark_database, setup_django
+from benchmarks.generator import Workload, generate_couriers, generate_orders, load
+
+# начало рабочего дня: у всех сгенерированных промежутков еще есть время впереди
+CURRENT_DATE = datetime(2021, 3, 29, 6, 0, 0, tzinfo=pytz.utc)
+
+
+class Case(NamedTuple):
+    name: str
+    # количество операций за один прогон (время в результатах делится на него)
+    ops: int
+    run: Callable[[], None]
+
+
+def engine_cases(workload: Workload, rnd: random.Random) -> List[Case]:
+    from app.main.intervals import parse_time_intervals
+    from app.main.models import Courier
+
+    couriers = list(Courier.objects.order_by('pk')[:1000])
+    working_hours = [courier.working_hours for courier in couriers]
+
+    # курьер с самым большим пулом кандидатов среди первых 50 - худший случай для упаковки
+    def candidates(courier):
+        courier.has_valid_working_hours(CURRENT_DATE)
+        return [order for order in courier._get_ini_orders(CURRENT_DATE) if order.is_possible_to_deliver(CURRENT_DATE)]
+
+    courier, pool = max(((courier, candidates(courier)) for courier in couriers[:50]), key=lambda x: len(x[1]))
+    grouped_pool = courier._group_orders_by_region(pool)
+    delivery_intervals = [order.delivery_intervals for order in pool]
+
+    rated_couriers = [courier for courier in Courier.objects.order_by('pk')[:1000] if courier.completed_orders_stats]
+
+    def overlap():
+        for intervals in delivery_intervals:
+            courier._is_working_hours_overlap(intervals)
+
+    def rating():
+        for rated_courier in rated_couriers:
+            rated_courier.rating
+
+    return [
+        Case('engine.parse_time_intervals', len(working_hours), lambda: [parse_time_intervals(h) for h in working_hours]),
+        Case('engine.is_working_hours_overlap', max(len(pool), 1), overlap),
+        Case('engine.add_order.greedy', 1, lambda: courier.add_order(grouped_pool, [], CURRENT_DATE, 'greedy')),
+        Case('engine.add_order.optimal', 1, lambda: courier.add_order(grouped_pool, [], CURRENT_DATE, 'optimal')),
+        Case('engine.rating', max(len(rated_couriers), 1), rating),
+    ]
+
+
+def api_cases(workload: Workload, rnd: random.Random, batch: int) -> List[Case]:
+    from rest_framework.test import APIClient
+
+    from app.main.models import Order
+    from app.main.utils import reverse
+
+    client = APIClient()
+    courier_ids = list(range(1, workload.couriers + 1))
+    next_ids = {'couriers': workload.couriers + 1, 'orders': workload.orders + 1}
+
+    def post(url, data, expected_status=200):
+        resp = client.post(url, data, format='json')
+        assert resp.status_code == expected_status, (url, resp.status_code, resp.content[:500])
+        return resp
+
+    def create(objects_name, stream=False):
+        first_id = next_ids[objects_name]
+        next_ids[objects_name] += batch
+        items = (
+            generate_couriers(Workload(couriers=first_id + batch - 1, regions=workload.regions, seed=first_id))
+            if objects_name == 'couriers'
+            else generate_orders(Workload(orders=batch, regions=workload.regions, seed=first_id), first_id=first_id)
+        )
+        if objects_name == 'couriers':
+            items = [item for item in items if item['courier_id'] >= first_id]
+        url = reverse(f'main:{objects_name}__create', query_kwargs={'stream': 'true'} if stream else None)
+        post(url, {'data': list(items)}, expected_status=201)
+
+    def get_couriers():
+        for courier_id in rnd.sample(courier_ids, min(batch, len(courier_ids))):
+            assert client.get(reverse('main:courier', kwargs={'courier_id': courier_id})).status_code == 200
+
+    def patch_couriers():
+        for courier_id in rnd.sample(courier_ids, min(batch, len(courier_ids))):
+            resp = client.patch(
+                reverse('main:courier', kwargs={'courier_id': courier_id}),
+                {'working_hours': ['06:00-23:00']}, format='json'
+            )
+            assert resp.status_code == 200
+
+    def assign():
+        for courier_id in rnd.sample(courier_ids, min(batch, len(courier_ids))):
+            post(reverse('main:orders_assign'), {'courier_id': courier_id})
+
+    def assign_batch():
+        post(reverse('main:orders_assign_batch'), {'courier_ids': rnd.sample(courier_ids, min(batch, len(courier_ids)))})
+
+    def complete():
+        assigned_orders = (
+            Order.objects
+            .filter(assign_time__isnull=False, complete_time__isnull=True)
+            .values_list('id', 'courier_id')[:batch]
+        )
+        for order_id, courier_id in assigned_orders:
+            post(reverse('main:orders_complete'), {
+                'courier_id': courier_id, 'order_id': order_id, 'complete_time': '2021-03-29T07:00:00Z'
+            })
+
+    return [
+        Case('api.couriers__create', batch, lambda: create('couriers')),
+        Case('api.couriers__create.stream', batch, lambda: create('couriers', stream=True)),
+        Case('api.orders__create', batch, lambda: create('orders')),
+        Case('api.orders__create.stream', batch, lambda: create('orders', stream=True)),
+        Case('api.courier.get', batch, get_couriers),
+        Case('api.orders_assign', batch, assign),
+        Case('api.orders_assign_batch', batch, assign_batch),
+        Case('api.orders_complete', batch, complete),
+        Case('api.courier.patch', batch, patch_couriers),
+        Case('api.couriers_leaderboard', 1, lambda: client.get(reverse('main:couriers_leaderboard'), {'limit': 10})),
+    ]
+
+
+def measure(case: Case, repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        case.run()
+        timings.append((time.perf_counter() - started) / case.ops)
+    return {
+        'min': min(timings), 'median': statistics.median(timings), 'mean': statistics.mean(timings),
+        'ops': case.ops, 'repeat': repeat,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Печатает сравнение с baseline по медиане и возвращает случаи, которые стали медленнее больше чем на threshold"""
+    regressions = []
+    print(f'\n{"case":<36} {"baseline, ms":>14} {"current, ms":>14} {"change":>9}')
+    for name, result in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:<36} {"-":>14} {result["median"] * 1000:>14.4f}')
+            continue
+        change = result['median'] / base['median'] - 1
+        mark = ' !' if change > threshold else ''
+        print(f'{name:<36} {base["median"] * 1000:>14.4f} {result["median"] * 1000:>14.4f} {change * 100:>8.1f}%{mark}')
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=Workload.couriers)
+    parser.add_argument('--orders', type=int, default=Workload.orders)
+    parser.add_argument('--regions', type=int, default=Workload.regions)
+    parser.add_argument('--density', type=float, default=Workload.density)
+    parser.add_argument('--completed', type=float, default=Workload.completed)
+    parser.add_argument('--seed', type=int, default=Workload.seed)
+    parser.add_argument('--batch', type=int, default=20, help='объектов/запросов на один прогон API-случая')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', default=None, help='префиксы имен случаев, например engine api.orders')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None, help='json с результатами другого прогона')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    workload = Workload(args.couriers, args.orders, args.regions, args.density, args.completed, args.seed)
+    setup_django()
+
+    with benchmark_database():
+        started = time.perf_counter()
+        load(workload)
+        print(f'loaded {workload} in {time.perf_counter() - started:.1f} s')
+
+        rnd = random.Random(args.seed)
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'date': datetime.now(pytz.utc).isoformat(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'workload': workload.__dict__,
+                'batch': args.batch,
+            },
+            'results': {},
+        }
+        with patch('app.main.views.timezone.now', new=lambda: CURRENT_DATE):
+            cases = engine_cases(workload, rnd) + api_cases(workload, rnd, args.batch)
+            print(f'{"case":<36} {"min, ms":>12} {"median, ms":>12} {"mean, ms":>12}')
+            for case in cases:
+                if args.only and not any(case.name.startswith(prefix) for prefix in args.only):
+                    continue
+                result = results['results'][case.name] = measure(case, args.repeat)
+                print(
+                    f'{case.name:<36} {result["min"] * 1000:>12.4f} '
+                    f'{result["median"] * 1000:>12.4f} {result["mean"] * 1000:>12.4f}'
+                )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f'\nregressions (> {args.threshold:.0%}): {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Бенчмарк валидации payload загрузки курьеров и заказов: поля DRF (CourierSerializer/OrderSerializer с many=True)
+против CourierListSerializer/OrderListSerializer с быстрой проверкой (app.main.fast_validation).
+База не нужна
+
+Запуск:
+    $ python -m benchmarks.validation --items 1000 10000 50000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.db import setup_django
+
+TIME_INTERVALS = ['09:00-12:00', '10:00-14:00', '12:00-18:00', '19:00-21:30']
+
+
+def make_orders(rnd: random.Random, count: int):
+    return [
+        {
+            'order_id': order_id,
+            'weight': rnd.randint(1, 5000) / 100,
+            'region': rnd.randint(1, 100),
+            'delivery_hours': rnd.sample(TIME_INTERVALS, 2)
+        } for order_id in range(1, count + 1)
+    ]
+
+
+def make_couriers(rnd: random.Random, count: int):
+    return [
+        {
+            'courier_id': courier_id,
+            'courier_type': rnd.choice(['foot', 'bike', 'car']),
+            'regions': rnd.sample(range(1, 100), 3),
+            'working_hours': rnd.sample(TIME_INTERVALS, 2)
+        } for courier_id in range(1, count + 1)
+    ]
+
+
+def measure(serializer, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        assert serializer().is_valid()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    from app.main.serializers.courier import CourierListSerializer, CourierSerializer
+    from app.main.serializers.order import OrderListSerializer, OrderSerializer
+
+    rnd = random.Random(args.seed)
+    print(f'{"payload":>9} {"items":>8} {"drf, items/s":>14} {"fast, items/s":>14} {"speedup":>8}')
+    for name, make_items, serializer_cls, serializer_list_cls in [
+        ('orders', make_orders, OrderSerializer, OrderListSerializer),
+        ('couriers', make_couriers, CourierSerializer, CourierListSerializer),
+    ]:
+        for count in args.items:
+            items = make_items(rnd, count)
+            drf_elapsed = measure(lambda: serializer_cls(data=items, many=True), args.repeat)
+            fast_elapsed = measure(lambda: serializer_list_cls(data={'data': items}), args.repeat)
+            print(
+                f'{name:>9} {count:>8} {count / drf_elapsed:>14.0f} {count / fast_elapsed:>14.0f} '
+                f'{drf_elapsed / fast_elapsed:>8.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
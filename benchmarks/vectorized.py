@@ -0,0 +1,96 @@
+"""
+Бенчмарк выбора заказов курьеру на пуле кандидатов: объектами Order (is_possible_to_deliver,
+группировка по районам и Courier.add_order) и столбцами numpy (app.main.vectorized).
+Пул - строки, как они приходят из базы (id, район, вес, промежутки доставки), курьер на машине (50 кг),
+для каждого размера пула и способа упаковки выводится время обеих реализаций и проверяется совпадение результата
+
+Запуск:
+    $ python -m benchmarks.vectorized --pools 100 1000 10000 100000 1000000
+"""
+import argparse
+import random
+import timeit
+from datetime import datetime
+from decimal import Decimal
+
+import pytz
+
+from benchmarks.db import setup_django
+
+CURRENT_DATE = datetime(2021, 3, 29, 11, 0, 0, tzinfo=pytz.utc)
+
+
+def generate_rows(rnd: random.Random, size: int, regions: int):
+    """Заказы-кандидаты: (id, район, вес, промежутки доставки) с 1-3 промежутками, часть уже закончилась"""
+    from app.main.intervals import merge_intervals
+
+    rows = []
+    for order_id in range(1, size + 1):
+        intervals = []
+        for _ in range(rnd.randint(1, 3)):
+            start = rnd.randrange(6 * 60, 22 * 60, 15)
+            intervals.append([start, start + rnd.randrange(30, 6 * 60, 15)])
+        rows.append(
+            (order_id, rnd.randint(1, regions), Decimal(rnd.randint(1, 50 * 100)) / 100, merge_intervals(intervals))
+        )
+    return rows
+
+
+def python_engine(courier, rows, packing_mode):
+    from app.main.models import Order
+
+    orders = [
+        Order(id=order_id, region_id=region_id, weight=weight, delivery_minutes=delivery_minutes)
+        for order_id, region_id, weight, delivery_minutes in rows
+    ]
+    orders = [order for order in orders if order.is_possible_to_deliver(CURRENT_DATE)]
+    grouped_orders = courier._group_orders_by_region(orders)
+    return courier.add_order(grouped_orders, [], CURRENT_DATE, packing_mode=packing_mode)
+
+
+def numpy_engine(courier, rows, packing_mode):
+    from app.main.packing import to_weight_units
+    from app.main.vectorized import OrderColumns, pack_orders
+
+    columns = OrderColumns.from_rows(rows).possible_to_deliver(CURRENT_DATE)
+    packed = pack_orders(columns, courier.working_intervals, to_weight_units(courier.max_weight), packing_mode)
+    return columns.to_orders(packed, CURRENT_DATE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pools', type=int, nargs='+', default=[100, 1000, 10000, 100000, 1000000])
+    parser.add_argument('--regions', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup_django()
+    from app.main.models import Courier
+
+    rnd = random.Random(args.seed)
+    courier = Courier(courier_type='car', working_minutes=[[9 * 60, 13 * 60], [14 * 60, 20 * 60]])
+    courier.has_valid_working_hours(CURRENT_DATE)
+
+    print(f'{"pool":>8} {"packing":>8} {"python, ms":>11} {"numpy, ms":>10} {"speedup":>8} {"orders":>7}')
+    for size in args.pools:
+        rows = generate_rows(rnd, size, args.regions)
+        for packing_mode in ('greedy', 'optimal'):
+            python_result = [order.id for order in python_engine(courier, rows, packing_mode)]
+            numpy_result = [order.id for order in numpy_engine(courier, rows, packing_mode)]
+            assert python_result == numpy_result, f'results differ for pool {size} ({packing_mode})'
+
+            python_time = min(timeit.repeat(
+                lambda: python_engine(courier, rows, packing_mode), number=1, repeat=args.repeat
+            ))
+            numpy_time = min(timeit.repeat(
+                lambda: numpy_engine(courier, rows, packing_mode), number=1, repeat=args.repeat
+            ))
+            print(
+                f'{size:>8} {packing_mode:>8} {python_time * 1000:>11.2f} {numpy_time * 1000:>10.2f} '
+                f'{python_time / numpy_time:>7.1f}x {len(numpy_result):>7}'
+            )
+
+
+if __name__ == '__main__':
+    main()